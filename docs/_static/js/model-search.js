@@ -0,0 +1,181 @@
+// Model search box, backed by the prebuilt index in _static/search (see search_index.py)
+(function () {
+    var script = document.currentScript;
+    var root = script ? script.src.replace(/_static\/js\/model-search\.js(\?.*)?$/, '') : '';
+    var indexUrl = root + '_static/search/';
+    var manifest = null;
+    var documents = null;
+    var shards = {};
+    var searchNumber = 0;
+
+    function fetchJson(name) {
+        return fetch(indexUrl + name).then(function (response) {
+            if (!response.ok) {
+                throw new Error(name + ': ' + response.status);
+            }
+            return response.json();
+        });
+    }
+
+    // The index is only downloaded once the search box is used
+    function loadManifest() {
+        if (!manifest) {
+            manifest = fetchJson('manifest.json');
+            documents = manifest.then(function () { return fetchJson('documents.json'); });
+        }
+        return manifest;
+    }
+
+    function loadShard(char) {
+        return loadManifest().then(function (loaded) {
+            var name = loaded.shards[char];
+            if (!name) {
+                return null;
+            }
+            if (!shards[char]) {
+                shards[char] = fetchJson(name);
+            }
+            return shards[char];
+        });
+    }
+
+    // Same terms as search_index.tokenize()
+    function tokenize(text) {
+        return text.normalize('NFKD').replace(/[^\x00-\x7f]/g, '').toLowerCase()
+            .match(/[a-z0-9]+/g) || [];
+    }
+
+    // Scores of the documents containing term, or terms starting with it
+    function lookup(term) {
+        return loadShard(term[0]).then(function (trie) {
+            var scores = {};
+            var node = trie;
+            for (var i = 1; node && i < term.length; i++) {
+                node = node[term[i]];
+            }
+            if (!node) {
+                return scores;
+            }
+            var stack = [[node, 2]];  // Exact matches count double
+            while (stack.length) {
+                var item = stack.pop();
+                for (var key in item[0]) {
+                    if (key === '$') {
+                        item[0][key].forEach(function (posting) {
+                            var score = posting[1] * item[1];
+                            scores[posting[0]] = Math.max(scores[posting[0]] || 0, score);
+                        });
+                    } else {
+                        stack.push([item[0][key], 1]);
+                    }
+                }
+            }
+            return scores;
+        });
+    }
+
+    // Documents matching every term of a query, best first
+    function search(query) {
+        var terms = tokenize(query);
+        if (!terms.length) {
+            return Promise.resolve([]);
+        }
+        return Promise.all(terms.map(lookup).concat([loadManifest().then(function () {
+            return documents;
+        })])).then(function (results) {
+            var records = results.pop();
+            var total = results[0];
+            results.slice(1).forEach(function (scores) {
+                var combined = {};
+                for (var number in total) {
+                    if (number in scores) {
+                        combined[number] = total[number] + scores[number];
+                    }
+                }
+                total = combined;
+            });
+            return Object.keys(total).map(Number).sort(function (a, b) {
+                return total[b] - total[a] || a - b;
+            }).map(function (number) { return records[number]; });
+        });
+    }
+
+    function describe(record) {
+        var parts = [record.category];
+        if (record.size) {
+            parts.push(record.size.map(function (value) { return value.toFixed(1); }).join(' × ') + ' mm');
+        }
+        if (record.file_types.length) {
+            parts.push(record.file_types.map(function (type) { return '.' + type; }).join(' '));
+        }
+        return parts.join(' · ');
+    }
+
+    function showResults(list, records) {
+        list.innerHTML = '';
+        records.slice(0, 10).forEach(function (record) {
+            var item = document.createElement('li');
+            var link = document.createElement('a');
+            link.href = root + record.url;
+            var image = document.createElement('img');
+            image.src = root + record.image;
+            image.alt = '';
+            image.loading = 'lazy';
+            var title = document.createElement('strong');
+            title.textContent = record.id;
+            var details = document.createElement('span');
+            details.textContent = describe(record);
+            link.appendChild(image);
+            link.appendChild(title);
+            link.appendChild(details);
+            item.appendChild(link);
+            list.appendChild(item);
+        });
+        list.hidden = !records.length;
+    }
+
+    function createSearchBox() {
+        var container = document.querySelector('div[role="search"]') ||
+            document.querySelector('div[role="main"]');
+        if (!container) {
+            return;
+        }
+        var form = document.createElement('form');
+        form.className = 'model-search';
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.placeholder = 'Find a model';
+        input.setAttribute('aria-label', 'Find a model by ID, description, file type or size');
+        var list = document.createElement('ul');
+        list.className = 'model-search-results';
+        list.hidden = true;
+        form.appendChild(input);
+        form.appendChild(list);
+        container.appendChild(form);
+
+        input.addEventListener('focus', loadManifest);
+        input.addEventListener('input', function () {
+            var number = ++searchNumber;
+            search(input.value).then(function (records) {
+                if (number === searchNumber) {
+                    showResults(list, records);
+                }
+            }).catch(function (error) {
+                console.error('Model search:', error);
+            });
+        });
+        form.addEventListener('submit', function (event) {
+            event.preventDefault();
+            var first = list.querySelector('a');
+            if (first) {
+                window.location.href = first.href;
+            }
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', createSearchBox);
+    } else {
+        createSearchBox();
+    }
+})();
@@ -0,0 +1,11 @@
+// Load the interactive 3D viewer of a catalog entry only when it is opened
+document.addEventListener('toggle', function (event) {
+    var details = event.target;
+    if (!details.classList || !details.classList.contains('model-viewer-3d') || !details.open) {
+        return;
+    }
+    var frame = details.querySelector('iframe[data-src]');
+    if (frame && !frame.getAttribute('src')) {
+        frame.setAttribute('src', frame.getAttribute('data-src'));
+    }
+}, true);
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Benchmark the stages of the catalog build
+
+Times, separately and offline (no network access needed):
+
+- scan: indexing the repository's files (repo_index.RepoFileIndex)
+- git: building the last-modified index from the git history
+- markdown: generating the Markdown of all category pages
+- parse, render, write: loading each STL file, rendering its preview and
+  writing the PNG, for the repository's models and for generated meshes
+  of 1k to 5M triangles stored as both binary and ASCII STL; the render
+  is timed once per render quality profile (render-draft, render-final)
+
+Results are saved as JSON; comparing them with a previous run (e.g. on
+another commit) reports the stages and files that became slower than a
+threshold and exits with status 1 if any did:
+
+    python benchmark_catalog.py --output before.json
+    git checkout my-branch
+    python benchmark_catalog.py --output after.json --compare before.json
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from catalog_cache import GitMetadataIndex, read_git_head
+from repo_index import RepoFileIndex
+from stl_loader import StlMesh, is_binary_stl, load_stl, write_ascii_stl, write_binary_stl
+
+BENCHMARK_VERSION = 2
+
+# Triangle counts of the generated meshes
+SYNTHETIC_SIZES = (1_000, 10_000, 100_000, 1_000_000, 5_000_000)
+
+# Timings below this (seconds) are too noisy to count as regressions
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def best_time(function, repeat):
+    """Return the best wall time of several calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse_size(text: str) -> int:
+    """Parse a triangle count such as '5000', '10k' or '5M'"""
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def synthetic_mesh(triangles: int) -> StlMesh:
+    """
+    Generate a torus with exactly the given number of triangles
+
+    The torus is a closed, smoothly curved surface, so rendering it exercises
+    shading and depth peeling like a real model of that size would.
+    """
+    # A u x v grid of quads gives 2uv triangles; the surplus is dropped
+    v = max(3, int(np.sqrt(triangles / 8)))
+    u = max(3, -(-triangles // (2 * v)))
+    theta = np.linspace(0, 2 * np.pi, u + 1)
+    phi = np.linspace(0, 2 * np.pi, v + 1)
+    radius, tube = 40.0, 15.0
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    points = np.stack([(radius + tube * np.cos(p)) * np.cos(t),
+                       (radius + tube * np.cos(p)) * np.sin(t),
+                       tube * np.sin(p)], axis=-1).astype(np.float32)
+
+    a = points[:-1, :-1].reshape(-1, 3)
+    b = points[1:, :-1].reshape(-1, 3)
+    c = points[1:, 1:].reshape(-1, 3)
+    d = points[:-1, 1:].reshape(-1, 3)
+    tri = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])[:triangles]
+
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    return StlMesh(np.ascontiguousarray(tri), normals.astype(np.float32), True, 'torus')
+
+
+def generate_synthetic_stls(sizes, directory: Path) -> List[Dict]:
+    """
+    Write binary and ASCII STL files of generated meshes (reusing existing ones)
+
+    Returns:
+    --------
+    List[Dict]
+        'path', 'name', 'format' and 'triangles' of each file
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    files = []
+    for size in sizes:
+        mesh = None
+        for stl_format in ('binary', 'ascii'):
+            path = directory / f"torus_{size}_{stl_format}.stl"
+            if not path.exists():
+                if mesh is None:
+                    mesh = synthetic_mesh(size)
+                print(f"Writing {path.name}...")
+                if stl_format == 'binary':
+                    write_binary_stl(mesh, path, b'benchmark torus')
+                else:
+                    write_ascii_stl(mesh, path, 'torus')
+            files.append({'path': path, 'name': f"synthetic/torus_{size}",
+                          'format': stl_format, 'triangles': size})
+    return files
+
+
+def benchmark_repository_stages(repo_root: Path, docs_dir: Path, repeat: int) -> Dict[str, float]:
+    """Time the repository scan, the git index build and the Markdown generation"""
+    from generate_catalog import ModelCatalogGenerator
+    from catalog_emitters import MarkdownEmitter
+
+    stages = {}
+    stages['scan'] = best_time(lambda: RepoFileIndex(repo_root, exclude=[docs_dir]), repeat)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        def build_git_index():
+            cache_file = Path(temp_dir) / 'git-metadata.json'
+            if cache_file.exists():
+                cache_file.unlink()  # Always time a cold build
+            GitMetadataIndex(repo_root, cache_file).load()
+        stages['git'] = best_time(build_git_index, repeat)
+
+        # Plan the pages once (untimed, this reads every model), then time
+        # generating their Markdown
+        generator = ModelCatalogGenerator(repo_root, temp_dir,
+                                          'https://github.com/PlusToolkit/PlusModelCatalog',
+                                          export_web_models=False)
+        pages = [generator.plan_catalog_page(repo_root / directory, output_filename=output_filename)
+                 for directory, output_filename in generator.CATEGORY_PAGES]
+        emitter = MarkdownEmitter(Path(temp_dir))
+        stages['markdown'] = best_time(
+            lambda: ["".join(emitter.fragments(page)) for page in pages], repeat)
+    return stages
+
+
+def file_stages(qualities) -> List[str]:
+    """Names of the per-file stages timed for the given render qualities"""
+    return ['parse'] + [f'render-{quality}' for quality in qualities] + ['write']
+
+
+def benchmark_file(session, stl_file: Path, output_image: Path, repeat: int,
+                   qualities) -> Dict[str, float]:
+    """Time parsing, rendering (in each quality profile) and writing the preview of one STL file"""
+    timing = {}
+    timing['parse'] = best_time(lambda: session.load(stl_file), repeat)
+    polydata = session.load(stl_file)
+    frames = []
+
+    def render():
+        session.render_polydata(polydata)
+        frames[:] = [session.capture()]
+    for quality in qualities:
+        session.set_quality(quality)
+        timing[f'render-{quality}'] = best_time(render, repeat)
+    timing['write'] = best_time(lambda: session.write_png(frames, output_image), repeat)
+    return timing
+
+
+def run_benchmark(repo_root: Path, docs_dir: Path, sizes, synthetic_dir: Path,
+                  backend: str, repeat: int, include_models: bool = True,
+                  qualities=None) -> Dict:
+    """
+    Run all stage benchmarks
+
+    Returns:
+    --------
+    Dict
+        JSON-serialisable results: run information, 'stages' (seconds per
+        stage, per-file stages summed over all files) and 'files'
+    """
+    from render_stl import RENDER_QUALITIES, create_render_session
+    qualities = list(qualities or RENDER_QUALITIES)
+
+    results = {
+        'version': BENCHMARK_VERSION,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_head': read_git_head(repo_root),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend,
+        'qualities': qualities,
+        'repeat': repeat,
+        'stages': {},
+        'files': [],
+    }
+    print("Timing repository scan, git metadata and Markdown generation...")
+    results['stages'].update(benchmark_repository_stages(repo_root, docs_dir, repeat))
+
+    files = []
+    if include_models:
+        files.extend({'path': path, 'name': path.relative_to(repo_root).as_posix(),
+                      'format': 'binary' if is_binary_stl(path) else 'ascii'}
+                     for path in sorted(RepoFileIndex(repo_root, exclude=[docs_dir])
+                                        .with_extension('.stl')))
+    files.extend(generate_synthetic_stls(sizes, synthetic_dir))
+
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            create_render_session(backend=backend, width=400, height=300) as session:
+        for entry in files:
+            path = entry['path']
+            timing = benchmark_file(session, path, Path(temp_dir) / 'preview.png', repeat,
+                                    qualities)
+            triangles = entry.get('triangles') or load_stl(path).triangle_count
+            results['files'].append({
+                'name': entry['name'],
+                'format': entry['format'],
+                'triangles': triangles,
+                'bytes': path.stat().st_size,
+                **timing,
+            })
+            renders = ", ".join(f"{quality} {timing[f'render-{quality}'] * 1000:>8.1f} ms"
+                                for quality in qualities)
+            print(f"{entry['name'][-40:]:<40} {entry['format']:<6} {triangles:>9} tri "
+                  f"parse {timing['parse'] * 1000:>8.1f} ms, render {renders}, "
+                  f"write {timing['write'] * 1000:>6.1f} ms")
+
+    for stage in file_stages(qualities):
+        results['stages'][stage] = sum(entry[stage] for entry in results['files'])
+    return results
+
+
+def print_quality_summary(results: Dict) -> None:
+    """Print the mean per-model render time of each quality profile"""
+    count = len(results['files'])
+    if not count:
+        return
+    qualities = results['qualities']
+    means = {quality: results['stages'][f'render-{quality}'] / count for quality in qualities}
+    slowest = max(means.values())
+    print(f"\nMean render time per model ({count} models):")
+    for quality in qualities:
+        speedup = f" ({slowest / means[quality]:.1f}x faster)" if 0 < means[quality] < slowest else ""
+        print(f"  {quality:<8} {means[quality] * 1000:>8.1f} ms{speedup}")
+
+
+def compare_results(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compare results with a baseline run
+
+    Returns:
+    --------
+    List[str]
+        Descriptions of the stages and files that took more than
+        (1 + threshold) times their baseline time
+    """
+    regressions = []
+
+    def check(label, new, old):
+        if old is None or new is None:
+            return
+        change = (new - old) / old if old > 0 else 0.0
+        marker = ''
+        if new > old * (1 + threshold) and new - old > MIN_REGRESSION_SECONDS:
+            marker = '  <-- regression'
+            regressions.append(f"{label}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms ({change:+.0%})")
+        print(f"{label[-60:]:<60} {old * 1000:>10.1f} {new * 1000:>10.1f} {change:>+8.0%}{marker}")
+
+    print(f"\n{'Stage / file':<60} {'base [ms]':>10} {'new [ms]':>10} {'change':>8}")
+    for stage, new in results['stages'].items():
+        check(stage, new, baseline.get('stages', {}).get(stage))
+    baseline_files = {(entry['name'], entry['format']): entry for entry in baseline.get('files', [])}
+    for entry in results['files']:
+        old = baseline_files.get((entry['name'], entry['format']))
+        if old is None:
+            continue
+        for stage in file_stages(results['qualities']):
+            check(f"{entry['name']} ({entry['format']}) {stage}", entry[stage], old.get(stage))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the catalog build')
+    parser.add_argument('--repo-root', default='..',
+                       help='Root directory of PlusModelCatalog repository')
+    parser.add_argument('--docs-dir', default='.',
+                       help='Documentation directory (excluded from the model search)')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SYNTHETIC_SIZES),
+                       help='Comma-separated triangle counts of the generated meshes, '
+                            'e.g. 1k,100k,5M (default: 1k to 5M)')
+    parser.add_argument('--synthetic-dir',
+                       help='Keep the generated STL files in this directory and reuse them '
+                            'in later runs (default: a temporary directory)')
+    parser.add_argument('--no-models', action='store_true',
+                       help="Only benchmark the generated meshes, not the repository's models")
+    parser.add_argument('--backend', choices=['vtk', 'numpy'], default='vtk',
+                       help='Rendering backend (default: vtk)')
+    parser.add_argument('--qualities', nargs='+', choices=['draft', 'final'],
+                       help='Render quality profiles to time (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Timing repetitions, best is reported (default: 3)')
+    parser.add_argument('--output', default='benchmark-results.json',
+                       help='JSON file for the results (default: benchmark-results.json)')
+    parser.add_argument('--compare',
+                       help='Results of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                       help='Relative slowdown counted as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    repo_root = Path(args.repo_root).resolve()
+    docs_dir = Path(args.docs_dir).resolve()
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        synthetic_dir = Path(args.synthetic_dir) if args.synthetic_dir else Path(temp_dir)
+        results = run_benchmark(repo_root, docs_dir, sizes, synthetic_dir, args.backend,
+                                args.repeat, not args.no_models, args.qualities)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print("\nStage totals: " + ", ".join(f"{stage} {seconds:.3f}s"
+                                         for stage, seconds in results['stages'].items()))
+    print_quality_summary(results)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('backend') != results['backend']:
+            print(f"Warning: comparing with results of the {baseline.get('backend')} backend")
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
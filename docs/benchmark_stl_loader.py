@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy STL loader against vtkSTLReader on the repository's models
+
+Also checks that the geometric fingerprint (stl_stream.geometry_digest) of
+every model is unchanged by exporting it as ASCII or reordering its
+triangles.
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import vtk
+
+from stl_loader import StlMesh, load_stl, write_ascii_stl, write_binary_stl
+from stl_stream import geometry_digest
+
+
+def best_time(function, repeat):
+    """Return the best wall time of several calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def read_with_vtk(stl_file):
+    reader = vtk.vtkSTLReader()
+    reader.SetFileName(str(stl_file))
+    reader.Update()
+    return reader.GetOutput()
+
+
+def read_with_numpy(stl_file):
+    mesh = load_stl(stl_file)
+    mesh.bounds()  # Touch the data, memory-mapped files are read lazily
+    return mesh
+
+
+def benchmark_files(stl_files, repeat):
+    """
+    Time both loaders on each file
+
+    Returns:
+    --------
+    List of (file, triangles, vtk time, numpy load time, numpy to-polydata time
+    with merged points, numpy to-polydata time without merging as used for rendering)
+    """
+    results = []
+    for stl_file in stl_files:
+        polydata = read_with_vtk(stl_file)
+        mesh = load_stl(stl_file)
+        if mesh.to_polydata().GetNumberOfCells() != polydata.GetNumberOfCells():
+            print(f"Warning: cell count mismatch for {stl_file}")
+
+        results.append((
+            stl_file,
+            mesh.triangle_count,
+            best_time(lambda: read_with_vtk(stl_file), repeat),
+            best_time(lambda: read_with_numpy(stl_file), repeat),
+            best_time(lambda: load_stl(stl_file).to_polydata(), repeat),
+            best_time(lambda: load_stl(stl_file).to_polydata(merge_points=False), repeat),
+        ))
+    return results
+
+
+def check_fingerprints(stl_files, temp_dir):
+    """
+    Compare the geometric fingerprint of each file with those of re-encoded copies
+
+    The copies are ASCII exports with '%e' (7 significant digits) and
+    '%.9g' numbers, and a binary file with the triangles in reverse order
+    and the vertices of each triangle rotated.
+
+    Returns:
+    --------
+    List of (file, copy) pairs whose fingerprints differ
+    """
+    mismatches = []
+    for stl_file in stl_files:
+        mesh = load_stl(stl_file)
+        expected = geometry_digest(stl_file)
+        reordered = StlMesh(mesh.triangles[::-1][:, [1, 2, 0]], mesh.normals[::-1], True)
+        copies = {
+            "ASCII %e": lambda path: write_ascii_stl(mesh, path, stl_file.stem, 'e'),
+            "ASCII %.9g": lambda path: write_ascii_stl(mesh, path, stl_file.stem),
+            "reordered binary": lambda path: write_binary_stl(reordered, path),
+        }
+        for label, write in copies.items():
+            copy_file = Path(temp_dir) / 'fingerprint.stl'
+            write(copy_file)
+            if geometry_digest(copy_file) != expected:
+                mismatches.append((stl_file, label))
+    return mismatches
+
+
+def print_results(title, results, root):
+    print(f"\n{title}")
+    print(f"{'File':<50} {'Triangles':>10} {'vtk [ms]':>9} {'np [ms]':>9} "
+          f"{'merged [ms]':>12} {'unmerged [ms]':>14}")
+    for stl_file, triangles, vtk_time, numpy_time, merged_time, unmerged_time in results:
+        name = str(Path(stl_file).relative_to(root)) if Path(stl_file).is_relative_to(root) else Path(stl_file).name
+        print(f"{name[-50:]:<50} {triangles:>10} {vtk_time * 1000:>9.2f} {numpy_time * 1000:>9.2f} "
+              f"{merged_time * 1000:>12.2f} {unmerged_time * 1000:>14.2f}")
+
+    totals = [sum(r[i] for r in results) for i in range(1, 6)]
+    print(f"{'Total':<50} {totals[0]:>10} {totals[1] * 1000:>9.1f} {totals[2] * 1000:>9.1f} "
+          f"{totals[3] * 1000:>12.1f} {totals[4] * 1000:>14.1f}")
+    if all(totals[2:]):
+        print(f"Speed-up over vtkSTLReader: {totals[1] / totals[2]:.1f}x (load), "
+              f"{totals[1] / totals[3]:.1f}x (vtkPolyData, merged points), "
+              f"{totals[1] / totals[4]:.1f}x (vtkPolyData, unmerged)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark NumPy STL loading against vtkSTLReader')
+    parser.add_argument('--repo-root', default='..',
+                       help='Root directory of PlusModelCatalog repository')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Timing repetitions per file, best is reported (default: 3)')
+    parser.add_argument('--no-ascii', action='store_true',
+                       help='Skip the benchmark of ASCII exports of the models')
+    parser.add_argument('--no-fingerprints', action='store_true',
+                       help='Skip the check of the geometric fingerprints of re-encoded models')
+    args = parser.parse_args()
+
+    root = Path(args.repo_root).resolve()
+    stl_files = sorted(p for p in root.rglob('*') if p.suffix.lower() == '.stl' and 'docs' not in p.parts)
+    if not stl_files:
+        print(f"No STL files found in {root}")
+        return 1
+
+    vtk.vtkObject.GlobalWarningDisplayOff()
+    print_results("Repository STL files", benchmark_files(stl_files, args.repeat), root)
+
+    if not args.no_ascii:
+        # The repository's STL files are all binary, so also compare ASCII exports of them
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ascii_files = []
+            for stl_file in stl_files:
+                ascii_file = Path(temp_dir) / f"{len(ascii_files):03d}_{stl_file.name}"
+                write_ascii_stl(load_stl(stl_file), ascii_file, stl_file.stem)
+                ascii_files.append(ascii_file)
+            print_results("ASCII exports of repository STL files",
+                          benchmark_files(ascii_files, args.repeat), root)
+
+    if not args.no_fingerprints:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            mismatches = check_fingerprints(stl_files, temp_dir)
+        for stl_file, label in mismatches:
+            print(f"Fingerprint mismatch: {stl_file.relative_to(root)} ({label})")
+        print(f"\nGeometric fingerprints: {len(stl_files) * 3 - len(mismatches)} of "
+              f"{len(stl_files) * 3} re-encoded copies match their original")
+        if mismatches:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,19 +28,10 @@ if errorlevel 1 (
     exit /b 1
 )
 
-REM Generate catalog pages
-echo.
-echo Generating catalog pages from STL files...
-python generate_catalog.py --repo-root .. --docs-dir .
-if errorlevel 1 (
-    echo Failed to generate catalog
-    exit /b 1
-)
-
-REM Build documentation
+REM Build documentation (the catalog pages are generated by the catalog_sphinx extension)
 echo.
 echo Building Sphinx documentation...
-sphinx-build -b html . _build/html
+sphinx-build -b html -j auto -D catalog_render_quality=draft . _build/html
 if errorlevel 1 (
     echo Failed to build documentation
     exit /b 1
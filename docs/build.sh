@@ -22,15 +22,10 @@ echo "Installing requirements..."
 pip install -q --upgrade pip
 pip install -q -r requirements.txt
 
-# Generate catalog pages
-echo ""
-echo "Generating catalog pages from STL files..."
-python generate_catalog.py --repo-root .. --docs-dir .
-
-# Build documentation
+# Build documentation (the catalog pages are generated by the catalog_sphinx extension)
 echo ""
 echo "Building Sphinx documentation..."
-sphinx-build -b html . _build/html
+sphinx-build -b html -j auto -D catalog_render_quality=draft . _build/html
 
 echo ""
 echo "========================================"
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Pipelined build of the catalog pages
+
+The stages of ModelCatalogGenerator.generate_pages() overlap instead of
+running one after the other:
+
+- git: the repository-wide git log (GitMetadataIndex) is loaded in a
+  thread while the pages are planned; the dates of the downloads of a page
+  are filled in just before it is written,
+- plan: the categories are planned in order (repository scan, content
+  hashing, mesh statistics); the renders, custom images and web model
+  exports of a page are submitted as soon as it is planned,
+- render: renders and exports run in a process pool (jobs != 1) or in one
+  render thread that keeps its render session,
+- write: pages go through a bounded queue to the writer, which takes them in
+  page order, waits for their images and models, then creates the preview
+  variants and writes the page files while later pages are still rendering.
+
+The generator is only ever called from one thread, the generator thread:
+planning, publishing rendered files and writing pages are queued on it, so
+they take turns and its indexes and manifests need no locks. Only the
+renders and exports themselves, and the git log, run elsewhere.
+
+Every generated file has a fixed name and the pages are finished in order,
+so the output does not depend on the order in which renders complete.
+"""
+
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from build_trace import file_size, get_tracer, span, start_tracing, stop_tracing
+from catalog_cache import copy_if_changed, replace_if_changed
+from gltf_export import export_stl_to_glb
+
+# Planned pages waiting for the writer
+PAGE_QUEUE_SIZE = 2
+
+# Render and export tasks handed to the executor at a time, per worker
+TASKS_PER_WORKER = 2
+
+
+def _export_task(stl_path: Path, staging_dir: Path, model_name: str, traced: bool = False):
+    """
+    Export the web models of an STL file into the staging directory
+
+    traced records the spans in this (worker) process and returns them.
+
+    Returns:
+    --------
+    (staged, error, events)
+        The staged .glb files, an error message (or None on success) and
+        the recorded trace events
+    """
+    tracer = start_tracing() if traced else None
+    try:
+        with span(stl_path.name, 'model'), span('export glb') as args:
+            staged = export_stl_to_glb(stl_path, staging_dir, model_name)
+            args['bytes'] = sum(file_size(path) or 0 for path in staged)
+        return staged, None, tracer.events if tracer else []
+    except Exception as e:
+        return [], str(e), tracer.events if tracer else []
+    finally:
+        if tracer:
+            stop_tracing()
+
+
+class CatalogPipeline:
+    """
+    Generates catalog pages with overlapping planning, rendering and writing
+
+    Parameters:
+    -----------
+    generator : ModelCatalogGenerator
+        Generator whose pages are built; all its methods are called on the
+        generator thread
+    page_queue_size : int
+        Number of planned pages that may wait for the writer
+    """
+
+    def __init__(self, generator, page_queue_size: int = PAGE_QUEUE_SIZE):
+        self.generator = generator
+        self.page_queue_size = page_queue_size
+        self.jobs = generator.jobs or os.cpu_count() or 1
+        self.executor = None
+        self.generator_thread = None  # Runs every call into the generator
+        self.traced = False      # Worker processes send their spans back
+        self.slots = None        # Bounds the tasks handed to the executor
+        self.image_tasks = {}    # image path -> task creating it
+        self.model_tasks = {}    # web model name -> task exporting it
+
+    def run(self, category_pages: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Plan and write the given category pages
+
+        Parameters:
+        -----------
+        category_pages : List[Tuple[str, str]]
+            (directory relative to repo_root, output filename) pairs
+
+        Returns:
+        --------
+        List[Dict]
+            The pages, in the order of category_pages
+        """
+        return asyncio.run(self._run(category_pages))
+
+    def run_pending(self) -> None:
+        """Run the renders, image copies and exports planned so far, without writing pages"""
+        asyncio.run(self._run_pending())
+
+    async def _run_pending(self) -> None:
+        self._start()
+        try:
+            self._submit(await self._on_generator(self._take_planned_work))
+            await asyncio.gather(*self.image_tasks.values(), *self.model_tasks.values())
+        finally:
+            await self._shutdown()
+
+    def _start(self) -> None:
+        generator = self.generator
+        self.generator_thread = ThreadPoolExecutor(1, thread_name_prefix='generator')
+        if self.jobs > 1:
+            import multiprocessing
+            # Spawned workers get their own VTK/OpenGL context (see render_stl_files)
+            self.executor = ProcessPoolExecutor(self.jobs,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            self.traced = get_tracer() is not None
+        else:
+            # A single thread, so the render session and its OpenGL context stay on it
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix='render')
+        self.slots = asyncio.Semaphore(TASKS_PER_WORKER * self.jobs)
+        generator.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    async def _on_generator(self, function, *args):
+        """Call a function on the generator thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.generator_thread,
+                                                                function, *args)
+
+    async def _run(self, category_pages) -> List[Dict]:
+        generator = self.generator
+        self._start()
+        generator.defer_git_dates = True
+
+        queue = asyncio.Queue(self.page_queue_size)
+        git = asyncio.ensure_future(asyncio.to_thread(generator.git_index.load))
+        stages = [asyncio.ensure_future(self._plan_pages(category_pages, queue)),
+                  asyncio.ensure_future(self._write_pages(queue, len(category_pages), git))]
+        try:
+            with span('pipeline', 'build'):
+                _, pages = await asyncio.gather(*stages)
+        finally:
+            generator.defer_git_dates = False
+            for task in stages + list(self.image_tasks.values()) + list(self.model_tasks.values()):
+                task.cancel()
+            await git
+            await self._shutdown()
+        return pages
+
+    async def _shutdown(self) -> None:
+        if isinstance(self.executor, ThreadPoolExecutor):
+            from render_stl import close_render_sessions
+            await asyncio.get_running_loop().run_in_executor(self.executor, close_render_sessions)
+        self.executor.shutdown(cancel_futures=True)
+        self.generator_thread.shutdown()
+
+    async def _plan_pages(self, category_pages, queue: asyncio.Queue) -> None:
+        """Plan the pages in order, handing their work to the executor"""
+        for directory, output_filename in category_pages:
+            page, work = await self._on_generator(self._plan_page, directory, output_filename)
+            self._submit(work)
+            await queue.put(page)
+
+    def _plan_page(self, directory, output_filename):
+        """Plan a page and take its work (on the generator thread)"""
+        page = self.generator.plan_page(directory, output_filename)
+        return page, self._take_planned_work()
+
+    def _take_planned_work(self):
+        """Take the renders, image copies and exports planned so far (on the generator thread)"""
+        generator = self.generator
+        renders, generator.pending_renders = generator.pending_renders, {}
+        copies, generator.pending_copies = generator.pending_copies, []
+        exports, generator.pending_exports = generator.pending_exports, []
+        return renders, copies, exports
+
+    def _submit(self, work) -> None:
+        """Start the renders, image copies and exports taken by _take_planned_work()"""
+        renders, copies, exports = work
+        for (stl_path, quality), outputs in renders.items():
+            task = asyncio.ensure_future(self._render(stl_path, quality, outputs))
+            for views, image_path, key in outputs:
+                self.image_tasks[image_path] = task
+        for source_image, image_path in copies:
+            self.image_tasks[image_path] = asyncio.ensure_future(
+                asyncio.to_thread(copy_if_changed, source_image, image_path))
+        for stl_path, model_name, outputs, key in exports:
+            self.model_tasks[model_name] = asyncio.ensure_future(
+                self._export(stl_path, model_name, outputs, key))
+
+    async def _render(self, stl_path: Path, quality: str, outputs) -> None:
+        """Render the images of one STL file and publish the changed ones"""
+        from render_stl import run_render_task
+        generator = self.generator
+        task = (str(stl_path),
+                [(views, str(generator.staging_dir / image_path.name))
+                 for views, image_path, key in outputs],
+                dict(generator.render_kwargs, quality=quality))
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            print(f"Rendering {stl_path.name}...")
+            try:
+                error, events = await loop.run_in_executor(self.executor, run_render_task,
+                                                           task, self.traced)
+            except Exception as e:
+                error, events = str(e), []
+        if events:
+            get_tracer().add_events(events)
+        await self._on_generator(self._publish_renders, stl_path, outputs, error)
+
+    def _publish_renders(self, stl_path: Path, outputs, error) -> None:
+        """Replace the published images by the changed staged ones (on the generator thread)"""
+        generator = self.generator
+        generator.render_manifest.misses += len(outputs)
+        if error:
+            print(f"Error rendering {stl_path}: {error}")
+        for views, image_path, key in outputs:
+            staged_path = generator.staging_dir / image_path.name
+            if not error and staged_path.exists():
+                replace_if_changed(staged_path, image_path)
+                if key:
+                    generator.render_manifest.record(image_path, key, str(stl_path))
+            elif staged_path.exists():
+                staged_path.unlink()
+
+    async def _export(self, stl_path: Path, model_name: str, outputs, key) -> None:
+        """Export the web models of one STL file and publish the changed ones"""
+        generator = self.generator
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            try:
+                staged, error, events = await loop.run_in_executor(
+                    self.executor, _export_task, stl_path, generator.staging_dir, model_name,
+                    self.traced)
+            except Exception as e:
+                staged, error, events = [], str(e), []
+        if events:
+            get_tracer().add_events(events)
+        await self._on_generator(self._publish_export, stl_path, model_name, outputs, key,
+                                 staged, error)
+
+    def _publish_export(self, stl_path: Path, model_name: str, outputs, key, staged,
+                        error) -> None:
+        """Replace the published web models by the changed staged ones (on the generator thread)"""
+        generator = self.generator
+        generator.model_manifest.misses += 1
+        if error:
+            print(f"Error exporting {stl_path}: {error}")
+        if error or len(staged) != len(outputs):
+            # No viewer for this model (see ModelCatalogGenerator.drop_missing_web_models)
+            generator.failed_models.add(model_name)
+            for staged_file in staged:
+                staged_file.unlink()
+            return
+        for staged_file, output in zip(staged, outputs):
+            replace_if_changed(staged_file, output)
+        if key:
+            for output in outputs:
+                generator.model_manifest.record(output, key, str(stl_path))
+
+    async def _write_pages(self, queue: asyncio.Queue, count: int, git) -> List[Dict]:
+        """Finish the planned pages in order, once their images and models are done"""
+        generator = self.generator
+        pages = []
+        for _ in range(count):
+            page = await queue.get()
+            if not page.get('unchanged'):
+                await asyncio.gather(
+                    *(self.image_tasks[path] for path in page['images'] if path in self.image_tasks),
+                    *(self.model_tasks[name] for name in page['web_models']
+                      if name in self.model_tasks))
+                await git
+                await self._on_generator(generator.finish_page, page)
+            pages.append(page)
+        return pages
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Tracing of catalog builds in Chrome trace-event format
+
+Spans are nested, timed sections of the build: the whole build, each
+category page, each model and each stage (repository scan, git log, STL
+parsing, mesh statistics, rendering per view, PNG encoding, web model
+export, image optimisation, page writing). Every span records its wall
+time, the CPU time of its thread (stages of a pipelined build run on
+several threads at once), the peak resident set size at its end and, where
+it reads or writes a file, the file size. The CPU time of each whole
+process (the build and every render worker) is recorded as a 'process'
+span when tracing stops.
+
+Tracing is off unless started (generate_catalog.py / render_stl.py
+--trace out.json); span() then costs next to nothing. The saved file can
+be opened in chrome://tracing or https://ui.perfetto.dev. Spans recorded in
+render worker processes are sent back with their results and merged, so
+parallel builds show one track per worker.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_tracer = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None if unknown)"""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def file_size(path) -> Optional[int]:
+    """Size of a file in bytes, or None if it does not exist"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+class Tracer:
+    """Collects complete ('X') trace events of this process"""
+
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.pid = os.getpid()
+        self.start = time.time_ns()
+        self.cpu_start = time.process_time()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        """
+        Record a span around the body of a with statement
+
+        The yielded dict holds the span's arguments; values added to it
+        inside the body (e.g. the size of a written file) are recorded too.
+        cpu_ms is the CPU time of the calling thread only.
+        """
+        args = dict(args)
+        start = time.time_ns()
+        cpu_start = time.thread_time()
+        try:
+            yield args
+        finally:
+            end = time.time_ns()
+            args['cpu_ms'] = round((time.thread_time() - cpu_start) * 1000, 3)
+            args['peak_rss_mb'] = peak_rss_mb()
+            self.events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': start / 1000,
+                'dur': (end - start) / 1000,
+                'pid': self.pid,
+                'tid': threading.get_native_id(),
+                'args': args,
+            })
+
+    def finish(self) -> None:
+        """Record the wall and CPU time of the process since tracing started"""
+        end = time.time_ns()
+        self.events.append({
+            'name': 'process total',
+            'cat': 'process',
+            'ph': 'X',
+            'ts': self.start / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': self.pid,
+            'tid': threading.get_native_id(),
+            'args': {'cpu_ms': round((time.process_time() - self.cpu_start) * 1000, 3),
+                     'peak_rss_mb': peak_rss_mb()},
+        })
+
+    def process_cpu_ms(self) -> Dict[int, float]:
+        """CPU time of each traced process (pid -> ms), from the 'process' spans"""
+        totals = {}
+        for event in self.events:
+            if event['cat'] == 'process':
+                totals[event['pid']] = totals.get(event['pid'], 0.0) + event['args']['cpu_ms']
+        return totals
+
+    def add_events(self, events: List[Dict]) -> None:
+        """Merge events recorded by another process"""
+        self.events.extend(events)
+
+    def save(self, trace_file) -> None:
+        """Write the trace as a Chrome trace-event JSON file"""
+        names = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                  'args': {'name': 'build' if pid == self.pid else f'render worker {pid}'}}
+                 for pid in sorted({event['pid'] for event in self.events})]
+        Path(trace_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(trace_file, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': names + sorted(self.events, key=lambda e: e['ts']),
+                       'displayTimeUnit': 'ms'}, f)
+
+    def slowest(self, category: str = 'model', count: int = 10) -> List[Dict]:
+        """Spans of a category with the largest total wall time, summed by name"""
+        totals = {}
+        for event in self.events:
+            if event['cat'] != category:
+                continue
+            total = totals.setdefault(event['name'], {'name': event['name'], 'wall_ms': 0.0,
+                                                      'cpu_ms': 0.0, 'count': 0})
+            total['wall_ms'] += event['dur'] / 1000
+            total['cpu_ms'] += event['args'].get('cpu_ms') or 0.0
+            total['count'] += 1
+        return sorted(totals.values(), key=lambda t: -t['wall_ms'])[:count]
+
+    def print_summary(self, count: int = 10) -> None:
+        """Print the slowest models and the total time of each stage"""
+        slowest = self.slowest('model', count)
+        if slowest:
+            print(f"\nSlowest {len(slowest)} models:")
+            for total in slowest:
+                print(f"  {total['name'][-50:]:<50} {total['wall_ms']:>9.1f} ms wall "
+                      f"{total['cpu_ms']:>9.1f} ms CPU")
+        stages = self.slowest('stage', count)
+        if stages:
+            print("Time per stage:")
+            for total in stages:
+                print(f"  {total['name']:<20} {total['wall_ms']:>9.1f} ms ({total['count']}x)")
+        processes = self.process_cpu_ms()
+        if processes:
+            print("CPU time per process:")
+            for pid, cpu_ms in sorted(processes.items()):
+                name = 'build' if pid == self.pid else f'render worker {pid}'
+                print(f"  {name:<20} {cpu_ms:>9.1f} ms")
+
+
+class _NullSpan:
+    """Span used while tracing is off"""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def start_tracing() -> Tracer:
+    """Start recording spans in this process (discarding earlier ones)"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing() -> Optional[Tracer]:
+    """Stop recording spans; returns the tracer with the recorded events"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.finish()
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The active tracer, or None if tracing is off"""
+    return _tracer
+
+
+def span(name: str, category: str = 'stage', **args):
+    """
+    Context manager recording a span if tracing is on
+
+    Parameters:
+    -----------
+    name : str
+        Span name, e.g. a stage ('render') or a model file name
+    category : str
+        'build', 'category', 'model' or 'stage'
+    **args : dict
+        Extra values stored with the span (e.g. bytes=file size)
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, **args)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Persistent caches used by the catalog generator
+"""
+
+import os
+import json
+import shutil
+import filecmp
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional
+
+from build_trace import span
+
+
+def file_digest(file_path: Path, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_json(cache_file: Path, default=None):
+    """Load a JSON cache file, returning default if it is missing or unreadable"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(cache_file: Path, data) -> None:
+    """Atomically write a JSON cache file"""
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+
+class ContentHasher:
+    """
+    SHA-256 content digests of files, remembered by (size, mtime)
+
+    Digests are persisted in the cache directory so an unchanged file is not
+    re-read on the next build; any change of size or mtime forces a rehash.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, cache_file: Path):
+        self.cache_file = cache_file
+        self.entries = load_json(cache_file, {})
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def digest(self, file_path: Path) -> str:
+        """Return the content digest of file_path"""
+        stat = file_path.stat()
+        key = str(file_path)
+        entry = self.entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+
+        sha256 = file_digest(file_path)
+        with self._lock:
+            self.entries[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                 'sha256': sha256}
+            self.dirty = True
+        return sha256
+
+    def save(self) -> None:
+        with self._lock:
+            if self.dirty:
+                save_json(self.cache_file, self.entries)
+                self.dirty = False
+
+
+class MeshIndex:
+    """
+    Persistent index of values computed from STL files, keyed by content hash
+
+    Each mesh is processed once; as long as its content is unchanged the
+    value is served from the JSON sidecar in the cache directory. Subclasses
+    set version (bump it to invalidate the index when the computed values
+    change) and implement compute().
+    """
+
+    version = None
+
+    def __init__(self, cache_file: Path):
+        self.cache_file = cache_file
+        data = load_json(cache_file, {})
+        if data.get('version') != self.version:
+            data = {'version': self.version, 'meshes': {}}
+        self.meshes = data['meshes']
+        self.used = set()
+        self.dirty = False
+
+    def compute(self, stl_path: Path):
+        """Compute the value of an STL file, or None if it cannot be computed"""
+        raise NotImplementedError
+
+    def get(self, stl_path: Path, content_digest: str):
+        """Return the value of an STL file, computing it if not indexed yet"""
+        self.used.add(content_digest)
+        value = self.meshes.get(content_digest)
+        if value is None:
+            value = self.compute(stl_path)
+            if value is None:
+                return None
+            self.meshes[content_digest] = value
+            self.dirty = True
+        return value
+
+    def save(self, prune: bool = False) -> None:
+        """Write the index, optionally dropping meshes not used in this run"""
+        if prune:
+            for digest in list(self.meshes):
+                if digest not in self.used:
+                    del self.meshes[digest]
+                    self.dirty = True
+        if self.dirty:
+            save_json(self.cache_file, {'version': self.version, 'meshes': self.meshes})
+            self.dirty = False
+
+
+class RenderManifest:
+    """
+    Manifest of rendered preview images keyed by STL content and render settings
+
+    Each image in the rendered directory is recorded with a render key, the
+    hash of the source STL content together with every setting that affects
+    the output (size, camera, colours and renderer version). An image is
+    re-rendered only when its key changes.
+
+    The same manifest is used for other files generated from STL models
+    (e.g. the .glb exports), selected by the file name pattern.
+    """
+
+    def __init__(self, manifest_file: Path, image_dir: Path, pattern: str = '*.png'):
+        self.manifest_file = manifest_file
+        self.image_dir = image_dir
+        self.pattern = pattern
+        self.images = load_json(manifest_file, {})
+        self.hits = 0
+        self.misses = 0
+        self.kept = 0  # Files of unchanged pages, never looked up
+
+    @staticmethod
+    def render_key(content_digest: str, render_settings: Dict) -> str:
+        """Combine an STL content digest and render settings into a render key"""
+        settings = json.dumps(render_settings, sort_keys=True)
+        return hashlib.sha256(f"{content_digest}\n{settings}".encode('utf-8')).hexdigest()
+
+    def is_current(self, image_path: Path, key: str) -> bool:
+        """Check whether image_path exists and was rendered with the given key"""
+        entry = self.images.get(image_path.name)
+        current = entry is not None and entry['key'] == key and image_path.exists()
+        if current:
+            self.hits += 1
+        return current
+
+    def are_current(self, image_paths, key: str) -> bool:
+        """Check whether all files generated together with one key are current (one hit)"""
+        current = all(self.images.get(p.name, {}).get('key') == key and p.exists()
+                      for p in image_paths)
+        if current:
+            self.hits += 1
+        return current
+
+    def record(self, image_path: Path, key: str, source: str) -> None:
+        """Record a freshly rendered image"""
+        self.images[image_path.name] = {'key': key, 'source': source}
+
+    def prune(self, referenced_images) -> int:
+        """
+        Delete rendered images that are no longer referenced by any page
+
+        Returns:
+        --------
+        int
+            Number of deleted images
+        """
+        keep = {Path(p).name for p in referenced_images}
+        pruned = 0
+        for image_file in self.image_dir.glob(self.pattern):
+            if image_file.name not in keep:
+                image_file.unlink()
+                pruned += 1
+        for name in list(self.images):
+            if name not in keep:
+                del self.images[name]
+        return pruned
+
+    def save(self) -> None:
+        save_json(self.manifest_file, self.images)
+
+    def summary(self, action: str = 'rendered') -> str:
+        summary = f"{self.hits} cached, {self.misses} {action}"
+        if self.kept:
+            summary += f", {self.kept} kept from unchanged pages"
+        return summary
+
+
+def read_git_head(repo_root: Path) -> Optional[str]:
+    """
+    Resolve the commit hash of HEAD by reading the .git directory directly
+
+    Returns None if HEAD cannot be resolved this way (e.g. not a git checkout).
+    """
+    git_dir = repo_root / '.git'
+    try:
+        if git_dir.is_file():
+            # Worktree or submodule: .git is a "gitdir: <path>" pointer
+            pointer = git_dir.read_text().strip()
+            if not pointer.startswith('gitdir:'):
+                return None
+            git_dir = (repo_root / pointer[len('gitdir:'):].strip()).resolve()
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref:'):
+            return head  # Detached HEAD
+        ref = head[len('ref:'):].strip()
+
+        # Linked worktrees keep shared refs in the common directory
+        ref_dirs = [git_dir]
+        common_dir_file = git_dir / 'commondir'
+        if common_dir_file.exists():
+            ref_dirs.append((git_dir / common_dir_file.read_text().strip()).resolve())
+
+        for ref_dir in ref_dirs:
+            ref_file = ref_dir / ref
+            if ref_file.exists():
+                return ref_file.read_text().strip()
+        for ref_dir in ref_dirs:
+            packed_refs = ref_dir / 'packed-refs'
+            if packed_refs.exists():
+                for line in packed_refs.read_text().splitlines():
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+class GitMetadataIndex:
+    """
+    Last-modified dates of every file in the repository from a single git log walk
+
+    The index is built by one 'git log --name-only' pass over the history:
+    the first (most recent) commit that lists a path is the commit that last
+    modified it, which is what 'git log -1 -- <path>' would report. The result
+    is persisted keyed by the HEAD commit, so an unchanged checkout is served
+    without running git at all.
+    """
+
+    def __init__(self, repo_root: Path, cache_file: Path):
+        self.repo_root = repo_root
+        self.cache_file = cache_file
+        self._dates = None
+
+    def _build(self, head: Optional[str]) -> Dict[str, str]:
+        cached = load_json(self.cache_file, {})
+        if head and cached.get('head') == head:
+            return cached['dates']
+
+        # --relative reports paths relative to repo_root even if it is a
+        # subdirectory of the git work tree
+        result = subprocess.run(
+            ['git', '-c', 'core.quotePath=false', 'log', '--relative',
+             '--name-only', '--format=%x01%ad', '--date=short'],
+            cwd=self.repo_root,
+            capture_output=True,
+            text=True,
+            encoding='utf-8'
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+
+        dates = {}
+        date = None
+        for line in result.stdout.splitlines():
+            if line.startswith('\x01'):
+                date = line[1:]
+            elif line and line not in dates:
+                dates[line] = date
+
+        if head:
+            save_json(self.cache_file, {'head': head, 'dates': dates})
+        return dates
+
+    def load(self) -> None:
+        """Load the index from the cache, or rebuild it if HEAD moved"""
+        try:
+            with span('git log'):
+                self._dates = self._build(read_git_head(self.repo_root))
+        except Exception as e:
+            print(f"Git error building metadata index: {e}")
+            self._dates = {}
+
+    def last_modified(self, rel_path: Path) -> Optional[str]:
+        """Return the last commit date (YYYY-MM-DD) of a path relative to repo_root"""
+        if self._dates is None:
+            self.load()
+        return self._dates.get(Path(rel_path).as_posix())
+
+
+def write_if_changed(file_path: Path, content) -> bool:
+    """
+    Write text (UTF-8) or bytes to a file unless it already has exactly this content
+
+    Unchanged files keep their modification time, so incremental Sphinx
+    builds do not rebuild pages whose content did not change.
+
+    Returns:
+    --------
+    bool
+        True if the file was written
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    try:
+        if file_path.stat().st_size == len(data) and file_path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = file_path.with_name(file_path.name + '.tmp')
+    tmp_file.write_bytes(data)
+    os.replace(tmp_file, file_path)
+    return True
+
+
+def replace_if_changed(new_file: Path, file_path: Path) -> bool:
+    """
+    Move a freshly generated file to file_path unless that has the same content
+
+    new_file is removed either way.
+
+    Returns:
+    --------
+    bool
+        True if file_path was replaced
+    """
+    if file_path.exists() and filecmp.cmp(new_file, file_path, shallow=False):
+        new_file.unlink()
+        return False
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(new_file), str(file_path))
+    return True
+
+
+def copy_if_changed(source: Path, file_path: Path) -> bool:
+    """Copy source to file_path unless that has the same content; returns True if copied"""
+    if file_path.exists() and filecmp.cmp(source, file_path, shallow=False):
+        return False
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy(source, file_path)
+    return True
+
+
+def _stat_signature(path: Path) -> Optional[list]:
+    """(size, mtime) of a file or directory, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DependencyManifest:
+    """
+    Inputs and outputs of every generated catalog page
+
+    For each page the manifest records the settings it was generated with,
+    the size and mtime of every input file (catalog.json, models, custom
+    images, including files referenced from other directories; None for
+    referenced files that did not exist) and of every directory below the
+    page's category directory, whose mtime changes when files are added or
+    removed. A page whose entry still matches can be skipped without
+    listing its directories or hashing its files.
+
+    Input paths are stored relative to input_root (the repository) and
+    output paths relative to output_root (the docs directory), so the
+    manifest can be restored by CI into another checkout location.
+    """
+
+    def __init__(self, manifest_file: Path, input_root: Path, output_root: Path):
+        self.manifest_file = manifest_file
+        self.input_root = input_root
+        self.output_root = output_root
+        self.pages = load_json(manifest_file, {})
+        self.dirty = False
+
+    def _relative(self, path: Path, root: Path) -> str:
+        try:
+            return Path(path).relative_to(root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def record(self, page_name: str, settings_key: str, inputs, directories, outputs,
+               data: Dict = None) -> None:
+        """
+        Record the inputs and outputs of a freshly generated page
+
+        Parameters:
+        -----------
+        page_name : str
+            Page identifier (output file name)
+        settings_key : str
+            Hash of every setting the page content depends on
+        inputs : iterable of Path
+            Files the page was generated from
+        directories : iterable of Path
+            Directories that were searched for models
+        outputs : iterable of Path
+            Files generated for the page (markdown, images, models)
+        data : Dict (optional)
+            Extra information to keep with the entry
+        """
+        self.pages[page_name] = {
+            'settings': settings_key,
+            'inputs': {self._relative(p, self.input_root): _stat_signature(p) for p in inputs},
+            'directories': {self._relative(d, self.input_root): _stat_signature(d)
+                            for d in directories},
+            'outputs': sorted(self._relative(p, self.output_root) for p in outputs),
+            'data': data or {},
+        }
+        self.dirty = True
+
+    def current_entry(self, page_name: str, settings_key: str) -> Optional[Dict]:
+        """Return the page's entry if none of its inputs changed and its outputs exist"""
+        entry = self.pages.get(page_name)
+        if not entry or entry['settings'] != settings_key:
+            return None
+        for paths in (entry['inputs'], entry['directories']):
+            for rel_path, signature in paths.items():
+                if _stat_signature(self.input_root / rel_path) != signature:
+                    return None
+        if not all((self.output_root / rel_path).exists() for rel_path in entry['outputs']):
+            return None
+        return entry
+
+    def input_paths(self, entry: Dict):
+        return [self.input_root / rel_path for rel_path in entry['inputs']]
+
+    def save(self) -> None:
+        if self.dirty:
+            save_json(self.manifest_file, self.pages)
+            self.dirty = False
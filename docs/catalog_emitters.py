@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Streaming writers for the catalog pages in several output formats
+
+Each emitter turns a planned catalog page into a sequence of text
+fragments: one group for the page header, one per model and one for the
+footer. emit_page() makes a single pass over the models of a page and
+writes the fragments of every enabled format directly to its output file,
+so a page is never assembled as one string in memory and the model
+entries are only walked once however many formats are enabled.
+"""
+
+import os
+import json
+import html
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from catalog_cache import replace_if_changed
+from download_bundles import format_file_size
+from mesh_quality import QUALITY_LABELS, mesh_quality_issues
+from mesh_stats import format_mesh_stats, mesh_stats_items
+
+
+def bundle_link_html(bundle: Dict, label: str, url) -> str:
+    """HTML link to a zip bundle, with its size; url maps the site-absolute URL"""
+    return (f"<a class=\"download-bundle\" href=\"{html.escape(url(bundle['url']))}\" download>"
+            f"{html.escape(label)}</a> ({format_file_size(bundle['size'])})")
+
+
+def picture_html(preview: Dict, alt: str, url, line_end: str = "") -> str:
+    """
+    Responsive, lazily loaded <picture> markup of an optimised preview image
+
+    Parameters:
+    -----------
+    preview : Dict
+        'preview' of a model entry (see ModelCatalogGenerator.add_page_previews)
+    alt : str
+        Alternative text (already escaped)
+    url : Callable[[str], str]
+        Maps the site-absolute image URLs to URLs relative to the page
+    line_end : str
+        Separator between the elements
+    """
+    srcset = ", ".join(f"{url(image)} {width}w" for image, width in preview['srcset'])
+    width = preview['width']
+    return line_end.join([
+        "<picture>",
+        f"<source type=\"image/webp\" srcset=\"{html.escape(srcset)}\" "
+        f"sizes=\"(max-width: {width}px) 100vw, {width}px\">",
+        f"<img src=\"{html.escape(url(preview['image']))}\" alt=\"{alt}\" width=\"{width}\" "
+        f"height=\"{preview['height']}\" loading=\"lazy\" decoding=\"async\">",
+        "</picture>",
+    ])
+
+
+class CatalogEmitter:
+    """
+    Base class of the catalog output formats
+
+    Subclasses implement begin(), model() and end(), each yielding text
+    fragments, and output_file() giving the file a page is written to.
+    """
+
+    name = None
+
+    def __init__(self, docs_dir: Path):
+        self.docs_dir = Path(docs_dir)
+
+    def output_file(self, page: Dict) -> Path:
+        raise NotImplementedError
+
+    def begin(self, page: Dict) -> Iterable[str]:
+        """Fragments before the first model"""
+        return ()
+
+    def model(self, model: Dict, last: bool) -> Iterable[str]:
+        """Fragments of one model entry; last is True for the last model of the page"""
+        raise NotImplementedError
+
+    def end(self, page: Dict) -> Iterable[str]:
+        """Fragments after the last model"""
+        return ()
+
+    def fragments(self, page: Dict) -> Iterator[str]:
+        """All fragments of a page (for writing a single format)"""
+        yield from self.begin(page)
+        models = page['models']
+        for index, model in enumerate(models):
+            yield from self.model(model, index == len(models) - 1)
+        yield from self.end(page)
+
+
+class MarkdownEmitter(CatalogEmitter):
+    """MyST Markdown page with a grid per model, built into the Sphinx site"""
+
+    name = 'markdown'
+
+    # sphinx-design badge role of each mesh quality status
+    QUALITY_BADGES = {'ok': 'bdg-success', 'warning': 'bdg-warning', 'error': 'bdg-danger',
+                      'unchecked': 'bdg-secondary'}
+
+    def output_file(self, page: Dict) -> Path:
+        return page['output_file']
+
+    def begin(self, page: Dict) -> Iterable[str]:
+        yield f"# {page['title']}\n\n"
+        if page['description']:
+            yield f"{page['description']}\n\n"
+        if page.get('bundle'):
+            # Raw HTML, so the link is not resolved as a document
+            yield "<p>" + bundle_link_html(page['bundle'], "Download all files of this page (zip)",
+                                           lambda url: '..' + url) + "</p>\n\n"
+        yield "## Models\n\n"
+
+    def model(self, model: Dict, last: bool) -> Iterable[str]:
+        yield f"### {model['id']}\n\n"
+
+        # Image and description in columns
+        yield "::::{grid} 1 1 2 2\n:gutter: 3\n\n"
+
+        # Image column
+        yield ":::{grid-item}\n"
+        if model.get('preview'):
+            # Raw HTML block (ended by the blank line before the next block)
+            yield picture_html(model['preview'], html.escape(model['id']),
+                               lambda url: '..' + url, "\n") + "\n"
+            if not model.get('views'):
+                yield "\n"
+        else:
+            yield f"![{model['id']}]({model['image']})\n"
+        if model.get('views'):
+            view_class = 'model-views' if model['views'][0]['name'] == 'views' else 'model-view'
+            yield "\n" + " ".join(f"![{model['id']} {view['name']}]({view['image']}){{.{view_class}}}"
+                                  for view in model['views']) + "\n"
+        yield ":::\n\n"
+
+        # Info column
+        yield ":::{grid-item}\n"
+        if model['description']:
+            yield f"{model['description']}\n\n"
+
+        if model.get('stats'):
+            yield "**Model info:**\n\n"
+            yield format_mesh_stats(model['stats'])
+            yield "\n"
+
+        quality = model.get('quality')
+        if quality:
+            badge = self.QUALITY_BADGES[quality['status']]
+            yield f"**Print check:** {{{badge}}}`{QUALITY_LABELS[quality['status']]}`\n\n"
+            issues = mesh_quality_issues(quality)
+            if issues:
+                yield "".join(f"- {issue}\n" for issue in issues) + "\n"
+
+        yield "**Downloads:**\n\n"
+        for dl in model['downloads']:
+            yield f"- [{dl['filename']}]({dl['url']}) "
+            if dl['last_modified']:
+                yield f"*(Modified: {dl['last_modified']})*"
+            yield "\n"
+        if model.get('bundle'):
+            yield "- " + bundle_link_html(model['bundle'], "Download all files (zip)",
+                                          lambda url: '..' + url) + "\n"
+
+        yield f"\n[View source files on GitHub]({model['source_url']})\n"
+        if model.get('web_model'):
+            # The viewer page is only loaded when the section is opened (see model-viewer.js)
+            yield "\n<details class=\"model-viewer-3d\">\n"
+            yield "<summary>Interactive 3D view</summary>\n"
+            yield (f"<iframe data-src=\"../_static/viewer.html?model={model['web_model']}"
+                   f"&amp;lods={model['web_model_lods']}\" title=\"{html.escape(model['id'])} 3D view\"></iframe>\n")
+            yield "</details>\n"
+        yield ":::\n\n"
+        yield "::::\n\n"
+        if not last:
+            yield "---\n\n"
+
+
+class JsonEmitter(CatalogEmitter):
+    """Machine-readable catalog of a page, published as _static/catalog/<page>.json"""
+
+    name = 'json'
+
+    # Model entry fields written to the JSON catalog, in this order
+    FIELDS = ('id', 'description', 'image', 'preview', 'views', 'downloads', 'source_url',
+              'bundle', 'stats', 'quality', 'web_model', 'web_model_lods')
+
+    def output_file(self, page: Dict) -> Path:
+        return self.docs_dir / '_static' / 'catalog' / (page['output_file'].stem + '.json')
+
+    def begin(self, page: Dict) -> Iterable[str]:
+        yield "{\n"
+        yield f'  "title": {json.dumps(page["title"], ensure_ascii=False)},\n'
+        yield f'  "description": {json.dumps(page["description"], ensure_ascii=False)},\n'
+        yield f'  "page": {json.dumps(page["output_file"].stem + ".html")},\n'
+        yield f'  "bundle": {json.dumps(page.get("bundle"))},\n'
+        yield '  "models": ['
+
+    def model(self, model: Dict, last: bool) -> Iterable[str]:
+        entry = {field: model.get(field) for field in self.FIELDS}
+        yield "\n    " + json.dumps(entry, ensure_ascii=False)
+        if not last:
+            yield ","
+
+    def end(self, page: Dict) -> Iterable[str]:
+        yield "\n  ]\n}\n" if page['models'] else "]\n}\n"
+
+
+class HtmlEmitter(CatalogEmitter):
+    """Plain static HTML page, usable without Sphinx, as _static/catalog/<page>.html"""
+
+    name = 'html'
+
+    STYLE = ("body{font-family:sans-serif;max-width:60em;margin:0 auto;padding:1em}"
+             ".model{display:flex;flex-wrap:wrap;gap:1.5em;border-top:1px solid #ccc;padding:1em 0}"
+             ".model img{max-width:400px;width:100%}.model img.view{max-width:24%}"
+             ".model .info{flex:1;min-width:16em}"
+             ".badge{display:inline-block;padding:.1em .5em;border-radius:.8em;color:#fff}"
+             ".badge.ok{background:#198754}.badge.warning{background:#b7791f}"
+             ".badge.error{background:#dc3545}.badge.unchecked{background:#6c757d}")
+
+    def output_file(self, page: Dict) -> Path:
+        return self.docs_dir / '_static' / 'catalog' / (page['output_file'].stem + '.html')
+
+    def _url(self, url: str) -> str:
+        """Make a site-absolute URL (e.g. /_static/rendered/x.png) relative to the pages"""
+        if not url.startswith('/'):
+            return url
+        target = self.docs_dir / url.lstrip('/')
+        return Path(os.path.relpath(target, self.docs_dir / '_static' / 'catalog')).as_posix()
+
+    def begin(self, page: Dict) -> Iterable[str]:
+        title = html.escape(page['title'])
+        yield ("<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+               "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n")
+        yield f"<title>{title}</title>\n<style>{self.STYLE}</style>\n</head>\n<body>\n"
+        yield f"<h1>{title}</h1>\n"
+        if page['description']:
+            yield f"<p>{html.escape(page['description'])}</p>\n"
+        if page.get('bundle'):
+            yield "<p>" + bundle_link_html(page['bundle'], "Download all files of this page (zip)",
+                                           self._url) + "</p>\n"
+
+    def model(self, model: Dict, last: bool) -> Iterable[str]:
+        model_id = html.escape(model['id'])
+        yield f"<section class=\"model\" id=\"{model_id}\">\n<div class=\"image\">\n"
+        yield f"<h2>{model_id}</h2>\n"
+        if model.get('preview'):
+            yield picture_html(model['preview'], model_id, self._url) + "\n"
+        else:
+            yield (f"<img src=\"{html.escape(self._url(model['image']))}\" alt=\"{model_id}\" "
+                   f"loading=\"lazy\">\n")
+        for view in model.get('views') or []:
+            view_class = '' if view['name'] == 'views' else ' class="view"'
+            yield (f"<img{view_class} src=\"{html.escape(self._url(view['image']))}\" "
+                   f"alt=\"{model_id} {html.escape(view['name'])}\" loading=\"lazy\">\n")
+        yield "</div>\n<div class=\"info\">\n"
+        if model['description']:
+            yield f"<p>{html.escape(model['description'])}</p>\n"
+        if model.get('stats'):
+            yield "<h3>Model info</h3>\n<ul>\n"
+            for label, value in mesh_stats_items(model['stats']):
+                yield f"<li>{label}: {html.escape(value)}</li>\n"
+            yield "</ul>\n"
+        quality = model.get('quality')
+        if quality:
+            yield (f"<p>Print check: <span class=\"badge {quality['status']}\">"
+                   f"{QUALITY_LABELS[quality['status']]}</span></p>\n")
+            issues = mesh_quality_issues(quality)
+            if issues:
+                yield "<ul>\n" + "".join(f"<li>{html.escape(issue)}</li>\n"
+                                         for issue in issues) + "</ul>\n"
+        yield "<h3>Downloads</h3>\n<ul>\n"
+        for dl in model['downloads']:
+            modified = (f" <em>(Modified: {html.escape(dl['last_modified'])})</em>"
+                        if dl['last_modified'] else "")
+            yield (f"<li><a href=\"{html.escape(dl['url'])}\">{html.escape(dl['filename'])}</a>"
+                   f"{modified}</li>\n")
+        if model.get('bundle'):
+            yield "<li>" + bundle_link_html(model['bundle'], "Download all files (zip)",
+                                            self._url) + "</li>\n"
+        yield "</ul>\n"
+        yield f"<p><a href=\"{html.escape(model['source_url'])}\">View source files on GitHub</a></p>\n"
+        if model.get('web_model'):
+            viewer = self._url('/_static/viewer.html')
+            yield (f"<p><a href=\"{viewer}?model={html.escape(model['web_model'])}"
+                   f"&amp;lods={model['web_model_lods']}\">Interactive 3D view</a></p>\n")
+        yield "</div>\n</section>\n"
+
+    def end(self, page: Dict) -> Iterable[str]:
+        yield "</body>\n</html>\n"
+
+
+EMITTERS = {emitter.name: emitter for emitter in (MarkdownEmitter, JsonEmitter, HtmlEmitter)}
+OUTPUT_FORMATS = tuple(EMITTERS)
+
+
+def create_emitters(formats: Iterable[str], docs_dir: Path) -> List[CatalogEmitter]:
+    """Create the emitters of the named output formats"""
+    unknown = [name for name in formats if name not in EMITTERS]
+    if unknown:
+        raise ValueError(f"Unknown catalog format(s): {', '.join(unknown)} "
+                         f"(available: {', '.join(OUTPUT_FORMATS)})")
+    return [EMITTERS[name](docs_dir) for name in formats]
+
+
+def prune_outputs(pages: Iterable[Dict], emitters: List[CatalogEmitter], docs_dir: Path) -> int:
+    """
+    Delete the outputs of the pages in formats that are no longer enabled
+
+    Returns:
+    --------
+    int
+        Number of deleted files
+    """
+    enabled = {emitter.name for emitter in emitters}
+    disabled = [emitter(docs_dir) for name, emitter in EMITTERS.items() if name not in enabled]
+    pruned = 0
+    for page in pages:
+        for emitter in disabled:
+            output_file = emitter.output_file(page)
+            if output_file.exists():
+                output_file.unlink()
+                pruned += 1
+    return pruned
+
+
+def emit_page(page: Dict, emitters: List[CatalogEmitter], staging_dir: Path) -> Dict[Path, bool]:
+    """
+    Write a planned catalog page in every format with a single pass over its models
+
+    Fragments are streamed to files in staging_dir, which then replace the
+    published outputs only if their content changed (so unchanged outputs
+    keep their modification time).
+
+    Parameters:
+    -----------
+    page : Dict
+        Planned page, as returned by ModelCatalogGenerator.plan_catalog_page()
+    emitters : List[CatalogEmitter]
+        Output formats to write
+    staging_dir : Path
+        Directory for the files being written
+
+    Returns:
+    --------
+    Dict[Path, bool]
+        Output file of each format, and whether it was (re)written
+    """
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    outputs = [emitter.output_file(page) for emitter in emitters]
+    staged = [staging_dir / f"{emitter.name}-{output.name}"
+              for emitter, output in zip(emitters, outputs)]
+    files = []
+    try:
+        for path in staged:
+            files.append(open(path, 'w', encoding='utf-8', newline='\n'))
+        for emitter, f in zip(emitters, files):
+            f.writelines(emitter.begin(page))
+        models = page['models']
+        for index, model in enumerate(models):
+            last = index == len(models) - 1
+            for emitter, f in zip(emitters, files):
+                f.writelines(emitter.model(model, last))
+        for emitter, f in zip(emitters, files):
+            f.writelines(emitter.end(page))
+    finally:
+        for f in files:
+            f.close()
+    return {output: replace_if_changed(path, output) for path, output in zip(staged, outputs)}
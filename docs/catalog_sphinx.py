@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Sphinx extension that generates the model catalog pages during the build
+
+Runs ModelCatalogGenerator when the builder is initialised, before Sphinx
+looks for source files, so the category pages are generated by
+sphinx-build itself (no separate generate_catalog.py step):
+
+- renders use Sphinx's parallelism: 'sphinx-build -j N' renders in N
+  processes (unless catalog_jobs is set),
+- only the pages whose inputs (model files, catalog.json, git history,
+  generator settings) changed are regenerated, and only those are marked
+  outdated (env-get-outdated), so Sphinx re-reads just them,
+- the render, git and mesh caches of the generator are kept in the Sphinx
+  environment pickle as well as in docs/.catalog-cache, so a build with a
+  saved environment starts warm even if the cache directory was removed.
+
+Enabled in conf.py; the settings are config values that can be changed
+on the command line, e.g. 'sphinx-build -D catalog_render_quality=draft'.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+from sphinx.util import logging
+
+# Bump when the data kept in the environment changes
+ENV_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def restore_caches(env, cache_dir: Path) -> int:
+    """
+    Write the caches kept in the environment back to the cache directory
+
+    Only missing files are restored: files present in the cache directory
+    may be newer (e.g. written by generate_catalog.py).
+
+    Returns:
+    --------
+    int
+        Number of restored cache files
+    """
+    restored = 0
+    for name, text in getattr(env, 'catalog_caches', {}).items():
+        path = cache_dir / name
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8')
+            restored += 1
+    return restored
+
+
+def store_caches(env, cache_dir: Path) -> None:
+    """Keep the JSON caches of the cache directory in the environment"""
+    env.catalog_caches = {path.name: path.read_text(encoding='utf-8')
+                          for path in sorted(cache_dir.glob('*.json'))}
+
+
+def generated_docnames(env, pages: List[Dict]) -> List[str]:
+    """Document names of the generated pages whose inputs changed"""
+    docnames = []
+    for page in pages:
+        if page.get('unchanged'):
+            continue
+        docname = env.path2doc(str(page['output_file']))
+        if docname:
+            docnames.append(docname)
+    return docnames
+
+
+def generate_catalog_pages(app) -> None:
+    """builder-inited: generate the catalog pages"""
+    from generate_catalog import ModelCatalogGenerator
+
+    config = app.config
+    app.env.catalog_outdated = []
+    if not config.catalog_generate:
+        return
+    if config.catalog_jobs is None:
+        jobs = max(app.parallel, 1)
+    else:
+        jobs = int(config.catalog_jobs)  # A string if set with -D
+    # Before the generator loads the caches
+    cache_dir = Path(app.srcdir) / ModelCatalogGenerator.CACHE_DIR_NAME
+    restored = restore_caches(app.env, cache_dir)
+    if restored:
+        logger.info(f"Restored {restored} catalog caches from the environment")
+    generator = ModelCatalogGenerator(
+        Path(app.confdir) / config.catalog_repo_root,
+        app.srcdir,
+        config.catalog_github_url,
+        jobs,
+        True,
+        config.catalog_export_3d,
+        config.catalog_render_backend,
+        config.catalog_formats,
+        config.catalog_render_quality
+    )
+    pages = generator.generate_all()
+    store_caches(app.env, generator.cache_dir)
+    app.env.catalog_outdated = generated_docnames(app.env, pages)
+
+
+def outdated_catalog_pages(app, env, added, changed, removed) -> List[str]:
+    """env-get-outdated: the catalog pages regenerated in this build"""
+    return getattr(env, 'catalog_outdated', [])
+
+
+def setup(app):
+    app.add_config_value('catalog_generate', True, '', bool)
+    app.add_config_value('catalog_repo_root', '..', '', str)
+    app.add_config_value('catalog_github_url', 'https://github.com/PlusToolkit/PlusModelCatalog',
+                         '', str)
+    app.add_config_value('catalog_jobs', None, '', (int, type(None)))
+    app.add_config_value('catalog_render_backend', 'vtk', '', str)
+    app.add_config_value('catalog_render_quality', 'final', '', str)
+    app.add_config_value('catalog_formats', ['markdown'], '', list)
+    app.add_config_value('catalog_export_3d', True, '', bool)
+
+    app.connect('builder-inited', generate_catalog_pages)
+    app.connect('env-get-outdated', outdated_catalog_pages)
+    return {
+        'version': '1.0',
+        'env_version': ENV_VERSION,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Watch the model directories and regenerate affected catalog pages
+
+Changes are picked up with Linux inotify where available, otherwise by
+polling file modification times. Each change is mapped to the category
+pages generated from the changed file, including pages that reference
+models in another category's directory, and only those pages are planned,
+rendered and written again. Unchanged models are served from the render
+cache, so an edit is usually reflected within a second or two.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+# inotify event flags (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+# Changes arriving within this time of each other are handled together,
+# so that e.g. an editor's save sequence triggers a single regeneration
+DEBOUNCE_SECONDS = 0.3
+
+
+def walk_directories(root: Path):
+    """Yield root and all its subdirectories"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as entries:
+                stack.extend(Path(entry.path) for entry in entries
+                             if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            pass
+
+
+class PollingWatcher:
+    """Detect file changes by comparing modification times and sizes"""
+
+    method = 'polling'
+
+    def __init__(self, recursive_roots: List[Path], directories: List[Path] = (),
+                 interval: float = 1.0):
+        self.recursive_roots = list(recursive_roots)
+        self.directories = set(directories)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def watch_directories(self, directories) -> None:
+        """Also watch the files directly in these directories"""
+        self.directories.update(directories)
+        self.snapshot = self.scan()
+
+    def scan(self) -> Dict[Path, tuple]:
+        directories = set(self.directories)
+        for root in self.recursive_roots:
+            directories.update(walk_directories(root))
+        snapshot = {}
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """Block until files change (or timeout expires); return the changed paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval)
+            snapshot = self.scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Detect file changes with Linux inotify (through ctypes, no extra dependencies)"""
+
+    method = 'inotify'
+
+    def __init__(self, recursive_roots: List[Path], directories: List[Path] = ()):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # watch descriptor -> (directory, recursive)
+        self.watched = set()
+        for root in recursive_roots:
+            for directory in walk_directories(root):
+                self._add_watch(directory, True)
+        self.watch_directories(directories)
+
+    def _add_watch(self, directory: Path, recursive: bool) -> None:
+        if directory in self.watched:
+            return
+        import ctypes
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, "inotify watch limit reached "
+                                     "(raise fs.inotify.max_user_watches)")
+            return  # Directory vanished or is not readable
+        self.watches[wd] = (directory, recursive)
+        self.watched.add(directory)
+
+    def watch_directories(self, directories) -> None:
+        """Also watch the files directly in these directories"""
+        for directory in directories:
+            if Path(directory).is_dir():
+                self._add_watch(Path(directory), False)
+
+    def _read_events(self) -> Set[Path]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                name = data[offset:offset + name_length].split(b'\0', 1)[0]
+                offset += name_length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: report every watched directory as changed
+                    changed.update(directory for directory, _ in self.watches.values())
+                    continue
+                if wd not in self.watches:
+                    continue
+                directory, recursive = self.watches[wd]
+                if mask & IN_IGNORED:
+                    del self.watches[wd]
+                    self.watched.discard(directory)
+                    continue
+                path = directory / os.fsdecode(name) if name else directory
+                changed.add(path)
+                if recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Watch new subdirectories; files already in them count as changed
+                    for subdirectory in walk_directories(path):
+                        self._add_watch(subdirectory, True)
+                        try:
+                            changed.update(Path(entry.path) for entry in os.scandir(subdirectory))
+                        except OSError:
+                            pass
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """Block until files change (or timeout expires); return the changed paths"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        return self._read_events()
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(recursive_roots: List[Path], directories: List[Path] = (),
+                   poll_interval: float = 1.0, use_inotify: bool = True):
+    """Create an inotify watcher, or a polling watcher where inotify is not available"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(recursive_roots, directories)
+        except (OSError, AttributeError) as e:
+            # AttributeError: libc without inotify functions (not Linux)
+            print(f"inotify not available ({e}), polling for changes instead")
+    return PollingWatcher(recursive_roots, directories, poll_interval)
+
+
+def page_affected_by(page: Dict, path: Path) -> bool:
+    """
+    Check whether a changed path affects a page
+
+    A page is affected by a change of any of its inputs (its catalog.json,
+    the models and images it lists, including files in other directories),
+    by a directory containing inputs being moved or removed, and by STL
+    files added anywhere below its directory.
+    """
+    inputs = page['inputs']
+    return (path in inputs
+            or (path.suffix.lower() == '.stl' and page['directory'] in path.parents)
+            or any(path in input_path.parents for input_path in inputs))
+
+
+def watch_catalog(generator, pages: List[Dict], poll_interval: float = 1.0,
+                  command: str = None, use_inotify: bool = True) -> None:
+    """
+    Watch the category directories and regenerate affected pages until interrupted
+
+    Parameters:
+    -----------
+    generator : ModelCatalogGenerator
+        Generator that produced pages
+    pages : List[Dict]
+        The generated pages, as returned by generate_all()
+    poll_interval : float
+        Seconds between scans when polling
+    command : str (optional)
+        Shell command run in the docs directory after each regeneration,
+        e.g. an incremental sphinx-build
+    use_inotify : bool
+        Use inotify where available (otherwise always poll)
+    """
+    categories = {output_filename: (category, output_filename)
+                  for category, output_filename in generator.CATEGORY_PAGES}
+    roots = [page['directory'] for page in pages if page['directory'].is_dir()]
+
+    def outside_directories(pages):
+        # Directories of inputs referenced from outside the category directories
+        return {path.parent for page in pages for path in page['inputs']
+                if not any(root == path.parent or root in path.parents for root in roots)}
+
+    watcher = create_watcher(roots, outside_directories(pages), poll_interval, use_inotify)
+    print(f"Watching {len(roots)} category directories for changes ({watcher.method}), "
+          f"press Ctrl+C to stop")
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            # Collect the rest of a burst of changes
+            while True:
+                more = watcher.wait(DEBOUNCE_SECONDS)
+                if not more:
+                    break
+                changed |= more
+
+            changed = {path for path in changed
+                       if any(page_affected_by(page, path) for page in pages)}
+            if not changed:
+                continue
+            stale = [page for page in pages
+                     if any(page_affected_by(page, path) for path in changed)]
+
+            for path in sorted(changed):
+                try:
+                    name = path.relative_to(generator.repo_root)
+                except ValueError:
+                    name = path
+                print(f"Changed: {name}")
+            start = time.perf_counter()
+            regenerated = generator.generate_pages(
+                [categories[page['output_file'].name] for page in stale])
+            for page in regenerated:
+                index = next(i for i, old in enumerate(pages)
+                             if old['output_file'] == page['output_file'])
+                pages[index] = page
+            watcher.watch_directories(outside_directories(regenerated))
+            print(f"Regenerated {', '.join(page['output_file'].name for page in regenerated)} "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+            if command:
+                subprocess.run(command, shell=True, cwd=generator.docs_dir)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        watcher.close()
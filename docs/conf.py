@@ -3,6 +3,9 @@
 import os
 import sys
 
+# The catalog generator modules live next to this file
+sys.path.insert(0, os.path.abspath('.'))
+
 # -- Project information -----------------------------------------------------
 project = 'PlusModelCatalog'
 copyright = '2025, PlusToolkit Team'
@@ -20,6 +23,7 @@ extensions = [
     'myst_parser',
     'sphinx_copybutton',
     'sphinx_design',
+    'catalog_sphinx',
 ]
 
 templates_path = ['_templates']
@@ -52,6 +56,11 @@ html_css_files = [
     'css/custom.css',
 ]
 
+html_js_files = [
+    'js/model-viewer.js',
+    'js/model-search.js',
+]
+
 # -- Options for MyST parser -------------------------------------------------
 myst_enable_extensions = [
     "colon_fence",
@@ -70,6 +79,16 @@ myst_enable_extensions = [
 
 myst_heading_anchors = 3
 
+# -- Options for the catalog_sphinx extension ---------------------------------
+# The catalog pages are generated at the start of every build; override
+# these on the command line with -D, e.g. -D catalog_render_quality=draft
+catalog_repo_root = '..'
+catalog_render_backend = 'vtk'
+catalog_render_quality = 'final'
+catalog_formats = ['markdown']
+catalog_export_3d = True
+catalog_jobs = None  # Render processes; None uses sphinx-build -j
+
 # -- Options for intersphinx extension ---------------------------------------
 intersphinx_mapping = {
     'pluslib': ('https://pluslib.readthedocs.io/en/latest/', None),
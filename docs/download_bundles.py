@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Zip bundles of the downloadable files of the catalog
+
+Every category page gets one zip with all of its files, and every grouped
+model (several 'files' in catalog.json, e.g. the parts of a phantom or a
+marker with its .rom file) one zip with its files, so a complete set is a
+single download.
+
+The archives are written by a minimal zip writer instead of zipfile, for
+two reasons:
+
+- they are deterministic: fixed timestamps and attributes, members in a
+  fixed order, so an unchanged bundle has the same bytes on every build,
+- members whose source file did not change are copied from the previous
+  archive as compressed bytes, without reading or compressing the source
+  again; rebuilding a bundle after a one-file change only compresses that
+  file.
+
+Files are streamed in chunks, so memory use does not depend on their size.
+Bundles larger than 4 GB (which would need the Zip64 extension) are not
+supported.
+"""
+
+import os
+import zlib
+import struct
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from build_trace import span
+from catalog_cache import load_json, replace_if_changed, save_json
+
+# Bump when the archive layout changes, to rebuild all bundles
+BUNDLE_VERSION = 1
+
+ZIP_COMPRESSION_LEVEL = 6
+CHUNK_SIZE = 1 << 20
+
+# All members get this timestamp (the earliest DOS date, 1980-01-01 00:00)
+_DOS_DATE = (1 << 5) | 1                # (year - 1980) << 9 | month << 5 | day
+_DOS_TIME = 0
+_DEFLATED = 8
+_VERSION = 20                            # Zip format 2.0 (deflate)
+_MADE_BY = (3 << 8) | _VERSION           # Unix
+_EXTERNAL_ATTR = 0o100644 << 16          # Regular file, rw-r--r--
+_UTF8_FLAG = 0x800
+
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<4sHHHHIIH')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+_MAX_SIZE = 0xFFFFFFFF
+
+
+def format_file_size(size: int) -> str:
+    """Format a file size in bytes for display (e.g. '2.4 MB')"""
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1000:
+            return f"{size} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} GB"
+
+
+def read_zip_members(zip_file: Path) -> Dict[str, Dict]:
+    """
+    Read the central directory of a zip archive
+
+    Returns:
+    --------
+    Dict[str, Dict]
+        Member name -> 'crc', 'compressed_size', 'size', 'method', 'flags'
+        and 'offset' (of the local header); empty if the archive is missing
+        or unreadable
+    """
+    try:
+        with open(zip_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            file_size = f.tell()
+            # The end record is followed by a comment of at most 64 KB
+            tail_size = min(file_size, _END_RECORD.size + 0xFFFF)
+            f.seek(file_size - tail_size)
+            tail = f.read(tail_size)
+            end = tail.rfind(_END_SIGNATURE)
+            if end < 0:
+                return {}
+            count, directory_size, directory_offset = _END_RECORD.unpack_from(tail, end)[4:7]
+            f.seek(directory_offset)
+            directory = f.read(directory_size)
+    except (OSError, struct.error):
+        return {}
+
+    members = {}
+    position = 0
+    for _ in range(count):
+        (signature, _, _, flags, method, _, _, crc, compressed_size, size, name_length,
+         extra_length, comment_length, _, _, _, offset) = _CENTRAL_HEADER.unpack_from(directory,
+                                                                                     position)
+        if signature != _CENTRAL_SIGNATURE:
+            return {}
+        position += _CENTRAL_HEADER.size
+        name = directory[position:position + name_length].decode(
+            'utf-8' if flags & _UTF8_FLAG else 'cp437')
+        position += name_length + extra_length + comment_length
+        members[name] = {'crc': crc, 'compressed_size': compressed_size, 'size': size,
+                         'method': method, 'flags': flags, 'offset': offset}
+    return members
+
+
+class ZipStreamWriter:
+    """
+    Minimal deterministic zip archive writer
+
+    Members are deflated from source files in chunks, or copied as
+    compressed bytes from another archive. The output file must be seekable:
+    the CRC and sizes of a compressed member are filled into its local
+    header once the member is written.
+    """
+
+    def __init__(self, file, level: int = ZIP_COMPRESSION_LEVEL):
+        self.file = file
+        self.level = level
+        self.members: List[Tuple[bytes, Dict]] = []  # (encoded name, member info)
+
+    def _local_header(self, name: bytes, info: Dict) -> bytes:
+        return _LOCAL_HEADER.pack(_LOCAL_SIGNATURE, _VERSION, info['flags'], info['method'],
+                                  _DOS_TIME, _DOS_DATE, info['crc'], info['compressed_size'],
+                                  info['size'], len(name), 0) + name
+
+    @staticmethod
+    def _encode_name(arcname: str) -> Tuple[bytes, int]:
+        try:
+            return arcname.encode('ascii'), 0
+        except UnicodeEncodeError:
+            return arcname.encode('utf-8'), _UTF8_FLAG
+
+    def add_file(self, arcname: str, source: Path, chunk_size: int = CHUNK_SIZE) -> Dict:
+        """Deflate a file into the archive; returns the member info"""
+        name, flags = self._encode_name(arcname)
+        info = {'crc': 0, 'compressed_size': 0, 'size': 0, 'method': _DEFLATED,
+                'flags': flags, 'offset': self.file.tell()}
+        self.file.write(self._local_header(name, info))
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        crc = size = compressed_size = 0
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                data = compressor.compress(chunk)
+                compressed_size += len(data)
+                self.file.write(data)
+        data = compressor.flush()
+        compressed_size += len(data)
+        self.file.write(data)
+        if max(size, compressed_size, self.file.tell()) > _MAX_SIZE:
+            raise ValueError(f"{arcname}: bundles over 4 GB are not supported")
+
+        info.update(crc=crc, size=size, compressed_size=compressed_size)
+        end = self.file.tell()
+        self.file.seek(info['offset'])
+        self.file.write(self._local_header(name, info))
+        self.file.seek(end)
+        self.members.append((name, info))
+        return info
+
+    def copy_member(self, arcname: str, archive, member: Dict,
+                    chunk_size: int = CHUNK_SIZE) -> Dict:
+        """
+        Copy a compressed member from another archive without recompressing it
+
+        Parameters:
+        -----------
+        arcname : str
+            Name of the member in this archive
+        archive : file
+            The other archive, opened for binary reading
+        member : Dict
+            The member's info, as returned by read_zip_members()
+        """
+        name, flags = self._encode_name(arcname)
+        archive.seek(member['offset'])
+        header = archive.read(_LOCAL_HEADER.size)
+        if header[:4] != _LOCAL_SIGNATURE:
+            raise ValueError(f"{arcname}: no local header in the previous archive")
+        name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+        archive.seek(name_length + extra_length, os.SEEK_CUR)
+
+        info = {'crc': member['crc'], 'compressed_size': member['compressed_size'],
+                'size': member['size'], 'method': member['method'], 'flags': flags,
+                'offset': self.file.tell()}
+        self.file.write(self._local_header(name, info))
+        remaining = member['compressed_size']
+        while remaining:
+            chunk = archive.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError(f"{arcname}: previous archive is truncated")
+            self.file.write(chunk)
+            remaining -= len(chunk)
+        self.members.append((name, info))
+        return info
+
+    def close(self) -> None:
+        """Write the central directory"""
+        directory_offset = self.file.tell()
+        for name, info in self.members:
+            self.file.write(_CENTRAL_HEADER.pack(
+                _CENTRAL_SIGNATURE, _MADE_BY, _VERSION, info['flags'], info['method'],
+                _DOS_TIME, _DOS_DATE, info['crc'], info['compressed_size'], info['size'],
+                len(name), 0, 0, 0, 0, _EXTERNAL_ATTR, info['offset']) + name)
+        directory_size = self.file.tell() - directory_offset
+        self.file.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, len(self.members),
+                                         len(self.members), directory_size, directory_offset, 0))
+
+
+class DownloadBundles:
+    """
+    Zip bundles of catalog files, rebuilt incrementally
+
+    The content digests of the members of every bundle are kept in a JSON
+    sidecar in the cache directory. A bundle whose members are unchanged
+    is not touched at all; otherwise it is rewritten in the staging
+    directory, copying the unchanged members from the previous archive.
+
+    Parameters:
+    -----------
+    cache_file : Path
+        JSON sidecar with the members of every bundle
+    output_dir : Path
+        Directory of the published bundles
+    staging_dir : Path
+        Directory the bundles are written to first
+    digest : Callable[[Path], str]
+        Content digest of a file (e.g. ContentHasher.digest)
+    """
+
+    def __init__(self, cache_file: Path, output_dir: Path, staging_dir: Path,
+                 digest: Callable[[Path], str]):
+        self.cache_file = cache_file
+        self.output_dir = output_dir
+        self.staging_dir = staging_dir
+        self.digest = digest
+        data = load_json(cache_file, {})
+        if data.get('version') != BUNDLE_VERSION:
+            data = {'version': BUNDLE_VERSION, 'bundles': {}}
+        self.bundles = data['bundles']  # bundle name -> [[arcname, digest], ...]
+        self.dirty = False
+        self.unchanged = 0
+        self.written = 0
+        self.copied_members = 0
+        self.compressed_members = 0
+
+    def write(self, name: str, files: List[Tuple[str, Path]]) -> Optional[Path]:
+        """
+        Write a bundle unless it is up to date
+
+        Parameters:
+        -----------
+        name : str
+            Path of the bundle relative to output_dir (e.g. 'tools.zip')
+        files : List[Tuple[str, Path]]
+            (name in the archive, source file) of each member, in order
+
+        Returns:
+        --------
+        Path
+            The bundle, or None if it could not be written
+        """
+        output = self.output_dir / name
+        try:
+            members = [[arcname, self.digest(path)] for arcname, path in files]
+        except OSError as e:
+            print(f"Error reading files of {name}: {e}")
+            return None
+        if self.bundles.get(name) == members and output.exists():
+            self.unchanged += 1
+            return output
+
+        previous = dict(map(tuple, self.bundles.get(name, [])))
+        previous_members = read_zip_members(output) if previous else {}
+        staged = self.staging_dir / ('bundle-' + name.replace('/', '-'))
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with ExitStack() as stack:
+                args = stack.enter_context(span('bundle', bundle=name))
+                f = stack.enter_context(open(staged, 'wb'))
+                archive = stack.enter_context(open(output, 'rb')) if previous_members else None
+                writer = ZipStreamWriter(f)
+                for (arcname, path), (_, digest) in zip(files, members):
+                    if previous.get(arcname) == digest and arcname in previous_members:
+                        writer.copy_member(arcname, archive, previous_members[arcname])
+                        self.copied_members += 1
+                    else:
+                        writer.add_file(arcname, path)
+                        self.compressed_members += 1
+                writer.close()
+                args['bytes'] = f.tell()
+        except (OSError, ValueError) as e:
+            print(f"Error writing {name}: {e}")
+            staged.unlink(missing_ok=True)
+            return None
+        replace_if_changed(staged, output)
+        self.bundles[name] = members
+        self.dirty = True
+        self.written += 1
+        return output
+
+    def prune(self, used_names) -> int:
+        """
+        Delete bundles that are no longer used
+
+        Returns:
+        --------
+        int
+            Number of deleted bundles
+        """
+        keep = set(used_names)
+        pruned = 0
+        if self.output_dir.exists():
+            for path in sorted(self.output_dir.rglob('*.zip')):
+                if path.relative_to(self.output_dir).as_posix() not in keep:
+                    path.unlink()
+                    pruned += 1
+            for directory in sorted(self.output_dir.rglob('*'), reverse=True):
+                if directory.is_dir() and not any(directory.iterdir()):
+                    directory.rmdir()
+        for name in list(self.bundles):
+            if name not in keep:
+                del self.bundles[name]
+                self.dirty = True
+        return pruned
+
+    def save(self) -> None:
+        if self.dirty:
+            save_json(self.cache_file, {'version': BUNDLE_VERSION, 'bundles': self.bundles})
+            self.dirty = False
+
+    def summary(self) -> str:
+        return (f"{self.unchanged} unchanged, {self.written} written "
+                f"({self.copied_members} members reused, {self.compressed_members} compressed)")
@@ -6,48 +6,292 @@ Generate catalog markdown pages from STL model files
 import os
 import sys
 import json
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Optional
-import subprocess
+from typing import List, Dict, Optional, Tuple
+
+from catalog_cache import (ContentHasher, DependencyManifest, GitMetadataIndex, RenderManifest,
+                           file_digest, read_git_head, write_if_changed)
+from build_pipeline import CatalogPipeline
+from build_trace import file_size, span, start_tracing, stop_tracing
+from download_bundles import DownloadBundles
+from catalog_emitters import MarkdownEmitter, create_emitters, emit_page, prune_outputs
+from mesh_quality import MeshQualityIndex
+from mesh_stats import MeshFingerprintIndex, MeshStatsIndex
+from preview_images import PreviewImageIndex
+from repo_index import RepoFileIndex
+from search_index import search_document, write_search_index
+from gltf_export import LOD_GRIDS, export_settings, lod_filename
 
 
 class ModelCatalogGenerator:
     """Generate markdown documentation for 3D model catalog"""
 
-    def __init__(self, repo_root: str, docs_dir: str, github_base_url: str):
+    # Directory of the persistent caches, in the docs directory
+    CACHE_DIR_NAME = '.catalog-cache'
+
+    # Category directories and the catalog page generated for each of them
+    CATEGORY_PAGES = [
+        ('Tools', 'tools.md'),
+        ('TrackingFixtures', 'tracking-fixtures.md'),
+        ('fCalPhantom', 'fcal-phantoms.md'),
+        ('Anatomy', 'anatomy.md'),
+        ('UsNeedleTutor', 'needletutor.md'),
+    ]
+
+    def __init__(self, repo_root: str, docs_dir: str, github_base_url: str,
+                 jobs: int = 1, use_render_cache: bool = True,
+                 export_web_models: bool = True, render_backend: str = 'vtk',
+                 output_formats: List[str] = ('markdown',), render_quality: str = 'final'):
         self.repo_root = Path(repo_root).resolve()
         self.docs_dir = Path(docs_dir).resolve()
         self.github_base_url = github_base_url
+        self.jobs = jobs
         self.rendered_dir = self.docs_dir / '_static' / 'rendered'
         self.rendered_dir.mkdir(parents=True, exist_ok=True)
+        # Default render quality profile; models can choose another one in
+        # catalog.json ("render_quality")
+        self.render_quality = render_quality
+        self.render_kwargs = {'width': 400, 'height': 300, 'backend': render_backend,
+                              'quality': render_quality}
+        self.models_dir = self.docs_dir / '_static' / 'models'
+        self.export_web_models = export_web_models
+        # Output formats of the category pages (see catalog_emitters)
+        self.output_formats = list(output_formats)
+        self.emitters = create_emitters(self.output_formats, self.docs_dir)
+
+        # Persistent caches (not published with the documentation)
+        self.cache_dir = self.docs_dir / self.CACHE_DIR_NAME
+        self.use_render_cache = use_render_cache
+        self.content_hasher = ContentHasher(self.cache_dir / 'content-digests.json')
+        # Rendered images and custom images are content-addressed (see mesh_asset_name)
+        self.render_manifest = RenderManifest(self.cache_dir / 'render-manifest.json',
+                                              self.rendered_dir, '*')
+        self._render_settings = {}  # quality -> render settings
+        self.git_index = GitMetadataIndex(self.repo_root, self.cache_dir / 'git-metadata.json')
+        self.mesh_stats = MeshStatsIndex(self.cache_dir / 'mesh-stats.json')
+        self.mesh_fingerprints = MeshFingerprintIndex(self.cache_dir / 'mesh-fingerprints.json')
+        self.mesh_quality = MeshQualityIndex(self.cache_dir / 'mesh-quality.json')
+        self.model_manifest = RenderManifest(self.cache_dir / 'model-manifest.json',
+                                             self.models_dir, '*.glb')
+        self.dependencies = DependencyManifest(self.cache_dir / 'dependencies.json',
+                                               self.repo_root, self.docs_dir)
+        self._dependency_key = None
+        self._file_index = None
+        # Images and models are generated here first and only replace the
+        # published files if their content changed
+        self.staging_dir = self.cache_dir / 'staging'
+        # Cropped, quantised and resized variants of the preview images for the pages
+        self.previews_dir = self.docs_dir / '_static' / 'previews'
+        self.preview_images = PreviewImageIndex(self.cache_dir / 'preview-images.json',
+                                                self.previews_dir, self.staging_dir)
+        self.planned_previews = set()
+        # Zip bundles of the files of each page and of each grouped model
+        self.bundles_dir = self.docs_dir / '_static' / 'downloads'
+        self.download_bundles = DownloadBundles(self.cache_dir / 'download-bundles.json',
+                                                self.bundles_dir, self.staging_dir,
+                                                self.content_hasher.digest)
+        self.planned_bundles = set()
+
+        # Image work planned while building entries, executed by run_pending_renders()
+        self.pending_renders = {}  # (stl_path, quality) -> [(views, image_path, render_key)]
+        self.pending_copies = []   # (source_image, image_path)
+        self.planned_images = set()
+        self.pending_exports = []  # (stl_path, model_name, output_paths, key)
+        self.planned_models = set()
+        self.failed_models = set()  # Web models whose export failed or wrote no files
+        self.page_images = set()   # Images and web models of the page being planned
+        self.page_models = set()
+        # Downloads of the page being planned whose git date is filled in by
+        # resolve_git_dates(), while the git metadata is loaded concurrently
+        # (see build_pipeline)
+        self.defer_git_dates = False
+        self.page_git_dates = []  # (download entry, file path)
+        # Search records of every generated page, by output filename
+        self.search_documents = {}
+        self.search_dir = self.docs_dir / '_static' / 'search'
+
+    @property
+    def file_index(self) -> RepoFileIndex:
+        """Index of the repository's files, scanned once per generate_pages() call"""
+        if self._file_index is None:
+            with span('scan'):
+                self._file_index = RepoFileIndex(self.repo_root, exclude=[self.docs_dir])
+        return self._file_index
 
     def get_git_last_modified(self, file_path: Path) -> str:
-        """Get last git commit date for a file"""
+        """Get last git commit date for a file (from the repository-wide metadata index)"""
         try:
             # Get relative path from repo root
             rel_path = file_path.relative_to(self.repo_root)
-            result = subprocess.run(
-                ['git', 'log', '-1', '--format=%ad', '--date=short', '--', str(rel_path)],
-                cwd=self.repo_root,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout.strip()
+            last_modified = self.git_index.last_modified(rel_path)
+            if last_modified:
+                return last_modified
         except Exception as e:
             print(f"Git error for {file_path}: {e}")
         return "Unknown"
 
-    def render_stl(self, stl_path: Path, output_path: Path) -> bool:
-        """Render STL file to PNG"""
+    def queue_git_date(self, download: Dict, file_path: Path) -> None:
+        """Set the last-modified date of a download entry, or plan it if git dates are deferred"""
+        if self.defer_git_dates:
+            self.page_git_dates.append((download, file_path))
+        else:
+            download['last_modified'] = self.get_git_last_modified(file_path)
+
+    def resolve_git_dates(self, page: Dict) -> None:
+        """Fill in the dates of the downloads of a page planned by queue_git_date()"""
+        for download, file_path in page.pop('git_dates', []):
+            download['last_modified'] = self.get_git_last_modified(file_path)
+
+    def get_mesh_stats(self, stl_path: Path) -> Optional[Dict]:
+        """Get geometric statistics of an STL file from the mesh index"""
+        try:
+            with span('mesh stats', file=stl_path.name):
+                return self.mesh_stats.get(stl_path, self.content_hasher.digest(stl_path))
+        except Exception as e:
+            print(f"Error indexing {stl_path}: {e}")
+            return None
+
+    def get_mesh_quality(self, stl_path: Path) -> Optional[Dict]:
+        """Get the printability checks of an STL file from the mesh quality index"""
         try:
-            from render_stl import render_stl_to_image
-            render_stl_to_image(str(stl_path), str(output_path), width=400, height=300)
+            with span('mesh quality', file=stl_path.name):
+                return self.mesh_quality.get(stl_path, self.content_hasher.digest(stl_path))
+        except Exception as e:
+            print(f"Error checking {stl_path}: {e}")
+            return None
+
+    def mesh_fingerprint(self, stl_path: Path) -> str:
+        """Geometric fingerprint of an STL file (equal for ASCII and binary exports of a mesh)"""
+        return self.mesh_fingerprints.get(stl_path, self.content_hasher.digest(stl_path))
+
+    def mesh_asset_name(self, stl_path: Path) -> str:
+        """
+        Base name of the images and web models generated from an STL file
+
+        Assets are named after the mesh's geometric fingerprint, so models
+        with the same file name in different directories do not collide and
+        a mesh listed on several pages, or present as both an ASCII and a
+        binary file, is rendered and exported only once.
+        """
+        try:
+            with span('fingerprint', file=stl_path.name):
+                return self.mesh_fingerprint(stl_path)[:16]
+        except Exception as e:
+            print(f"Error fingerprinting {stl_path}: {e}")
+            return stl_path.stem
+
+    def render_stl(self, stl_path: Path, output_path, quality: str = None) -> bool:
+        """
+        Render STL file to PNG
+
+        output_path is an image path, or a list of (views, image_path) tuples
+        rendered from a single load of the mesh (see RenderSession.render_views).
+        quality is the render quality profile, by default self.render_quality.
+        """
+        render_kwargs = dict(self.render_kwargs, quality=quality or self.render_quality)
+        try:
+            if isinstance(output_path, list):
+                from render_stl import create_render_session
+                with create_render_session(**render_kwargs) as session:
+                    session.render_views(stl_path, output_path)
+            else:
+                from render_stl import render_stl_to_image
+                render_stl_to_image(str(stl_path), str(output_path), **render_kwargs)
             return True
         except Exception as e:
             print(f"Error rendering {stl_path}: {e}")
             return False
 
+    def render_key(self, stl_path: Path, views: List[str] = None, quality: str = None) -> str:
+        """Cache key of an image rendered from an STL file: mesh fingerprint plus render settings"""
+        quality = quality or self.render_quality
+        settings = self._render_settings.get(quality)
+        if settings is None:
+            from render_stl import render_settings
+            settings = self._render_settings[quality] = render_settings(
+                **dict(self.render_kwargs, quality=quality))
+        if views:
+            settings = dict(settings, views=views)
+        return RenderManifest.render_key(self.mesh_fingerprint(stl_path), settings)
+
+    def queue_render(self, stl_path: Path, image_path: Path, views: List[str] = None,
+                     quality: str = None) -> None:
+        """
+        Plan rendering of an STL file unless its cached image is current or already planned
+
+        views are the view names to render into the image (side by side if
+        there are several); by default the standard catalog preview. quality
+        is the render quality profile, by default self.render_quality. All
+        images planned for the same STL file and quality are rendered from
+        one load.
+        """
+        quality = quality or self.render_quality
+        self.page_images.add(image_path)
+        if image_path in self.planned_images:
+            return
+        self.planned_images.add(image_path)
+        try:
+            key = self.render_key(stl_path, views, quality)
+        except Exception as e:
+            print(f"Error hashing {stl_path}: {e}")
+            key = None
+        if key and self.use_render_cache and self.render_manifest.is_current(image_path, key):
+            return
+        if views is None:
+            from render_stl import DEFAULT_VIEW
+            views = [DEFAULT_VIEW]
+        self.pending_renders.setdefault((stl_path, quality), []).append((views, image_path, key))
+
+    def queue_web_model(self, stl_path: Path, model_name: str) -> bool:
+        """Plan the .glb export of an STL file unless it is cached; returns False if disabled"""
+        if not self.export_web_models:
+            return False
+        self.page_models.add(model_name)
+        if model_name in self.planned_models:
+            return True
+        self.planned_models.add(model_name)
+        outputs = [self.models_dir / lod_filename(model_name, level)
+                   for level in range(len(LOD_GRIDS) + 1)]
+        try:
+            key = RenderManifest.render_key(self.mesh_fingerprint(stl_path), export_settings())
+        except Exception as e:
+            print(f"Error hashing {stl_path}: {e}")
+            key = None
+        if not (key and self.use_render_cache and self.model_manifest.are_current(outputs, key)):
+            self.pending_exports.append((stl_path, model_name, outputs, key))
+        return True
+
+    def queue_image_copy(self, source_image: Path) -> Path:
+        """
+        Plan publishing a custom preview image
+
+        Returns:
+        --------
+        Path
+            The published image, named after the image's content hash
+        """
+        digest = self.content_hasher.digest(source_image)
+        image_path = self.rendered_dir / f"image-{digest[:16]}{source_image.suffix.lower()}"
+        self.page_images.add(image_path)
+        if image_path not in self.planned_images:
+            self.planned_images.add(image_path)
+            self.pending_copies.append((source_image, image_path))
+        return image_path
+
+    def run_pending_renders(self) -> None:
+        """
+        Render all planned STL files (in parallel if jobs != 1), publish custom
+        images and export the planned web 3D models
+        """
+        CatalogPipeline(self).run_pending()
+        self.content_hasher.save()
+        self.render_manifest.save()
+        self.mesh_stats.save()
+        self.mesh_fingerprints.save()
+        self.mesh_quality.save()
+        self.model_manifest.save()
+
     def find_stl_files(self, directory: Path, recursive: bool = True,
                       include: List[str] = None, exclude: List[str] = None) -> List[Path]:
         """
@@ -69,49 +313,68 @@ class ModelCatalogGenerator:
         List[Path]
             Sorted list of matching STL files
         """
-        # Find both .stl and .STL files (case-insensitive)
-        if recursive:
-            all_files = sorted(list(directory.glob('**/*.stl')) + list(directory.glob('**/*.STL')))
-        else:
-            all_files = sorted(list(directory.glob('*.stl')) + list(directory.glob('*.STL')))
-
-        # Remove duplicates (in case filesystem is case-insensitive)
-        seen = set()
-        unique_files = []
-        for f in all_files:
-            if f not in seen:
-                seen.add(f)
-                unique_files.append(f)
-        all_files = unique_files
-
-        # Apply include filter if specified
-        if include:
-            include_set = set(include)
-            all_files = [f for f in all_files if f.name in include_set]
-
-        # Apply exclude filter if specified
-        if exclude:
-            exclude_set = set(exclude)
-            all_files = [f for f in all_files if f.name not in exclude_set]
+        # Extensions are matched case-insensitively (.stl, .STL, ...)
+        all_files = self.file_index.find(directory, '.stl', recursive)
 
-        return all_files
+        # Apply include (if specified) and exclude filters in one pass
+        include_set = set(include) if include else None
+        exclude_set = set(exclude) if exclude else set()
+        return [f for f in all_files
+                if (include_set is None or f.name in include_set) and f.name not in exclude_set]
 
     def generate_model_entry(self, stl_file: Path, description: str = "",
-                            additional_files: List[Path] = None) -> Dict:
-        """Generate catalog entry for a model"""
+                            additional_files: List[Path] = None,
+                            views: List[str] = None, view_layout: str = 'images',
+                            image: Path = None, quality: str = None) -> Dict:
+        """
+        Generate catalog entry for a model
+
+        views optionally lists extra views to render besides the standard
+        preview (see render_stl.expand_views), either as separate images
+        (view_layout 'images') or as one sprite strip (view_layout 'sprite').
+        They are rendered from the same load of the mesh as the preview.
+        image is an optional custom preview image, used instead of rendering one.
+        quality is the render quality profile of the model's images (see
+        render_stl.RENDER_QUALITY_PROFILES), by default self.render_quality.
+        """
+        from render_stl import DEFAULT_QUALITY, RENDER_QUALITIES
         rel_path = stl_file.relative_to(self.repo_root)
         model_id = stl_file.stem
+        asset_name = self.mesh_asset_name(stl_file)
+        if quality not in RENDER_QUALITIES:
+            if quality is not None:
+                print(f"Unknown render quality '{quality}' of {model_id}, "
+                      f"using '{self.render_quality}'")
+            quality = self.render_quality
+        # Images of other quality profiles than the default one are named after it
+        image_name = asset_name if quality == DEFAULT_QUALITY else f"{asset_name}-{quality}"
+
+        # Render image (or publish the custom one)
+        if image is not None:
+            image_path = self.queue_image_copy(image)
+        else:
+            image_path = self.rendered_dir / f"{image_name}.png"
+            self.queue_render(stl_file, image_path, quality=quality)
+        has_web_model = self.queue_web_model(stl_file, asset_name)
 
-        # Render image
-        image_filename = f"{model_id}.png"
-        image_path = self.rendered_dir / image_filename
-
-        if not image_path.exists():
-            print(f"Rendering {model_id}...")
-            self.render_stl(stl_file, image_path)
-
-        # Get git info
-        last_modified = self.get_git_last_modified(stl_file)
+        view_images = []
+        if views:
+            try:
+                from render_stl import expand_views
+                view_names = expand_views(views)
+            except Exception as e:
+                print(f"Error in views of {model_id}: {e}")
+                view_names = []
+            if view_names and view_layout == 'sprite':
+                views_hash = hashlib.sha256('\n'.join(view_names).encode('utf-8')).hexdigest()
+                view_filename = f"{image_name}_views-{views_hash[:8]}.png"
+                self.queue_render(stl_file, self.rendered_dir / view_filename, view_names, quality)
+                view_images.append({'name': 'views', 'image': f"/_static/rendered/{view_filename}"})
+            else:
+                for view in view_names:
+                    view_filename = f"{image_name}_{view}.png"
+                    self.queue_render(stl_file, self.rendered_dir / view_filename, [view], quality)
+                    view_images.append({'name': view, 'image': f"/_static/rendered/{view_filename}"})
 
         # Build download URLs
         download_files = [stl_file]
@@ -121,61 +384,33 @@ class ModelCatalogGenerator:
         downloads = []
         for f in download_files:
             rel_f = f.relative_to(self.repo_root)
-            downloads.append({
+            download = {
                 'filename': f.name,
                 'url': f"{self.github_base_url}/blob/master/{rel_f}?raw=true",
-                'last_modified': self.get_git_last_modified(f)
-            })
+                'last_modified': None
+            }
+            self.queue_git_date(download, f)
+            downloads.append(download)
 
         return {
             'id': model_id,
             'description': description,
-            'image': f"/_static/rendered/{image_filename}",
+            'image': f"/_static/rendered/{image_path.name}",
             'downloads': downloads,
-            'source_url': f"{self.github_base_url}/tree/master/{rel_path.parent}"
+            'source_url': f"{self.github_base_url}/tree/master/{rel_path.parent}",
+            'download_files': download_files,
+            'stats': self.get_mesh_stats(stl_file),
+            'quality': self.get_mesh_quality(stl_file),
+            'web_model': asset_name if has_web_model else None,
+            'web_model_lods': len(LOD_GRIDS) + 1,
+            'views': view_images
         }
 
     def generate_table_markdown(self, models: List[Dict], title: str,
                                description: str = "") -> str:
         """Generate markdown table for models"""
-        md = f"# {title}\n\n"
-        if description:
-            md += f"{description}\n\n"
-
-        md += "## Models\n\n"
-
-        for model in models:
-            md += f"### {model['id']}\n\n"
-
-            # Image and description in columns
-            md += "::::{grid} 1 1 2 2\n"
-            md += ":gutter: 3\n\n"
-
-            # Image column
-            md += ":::{grid-item}\n"
-            md += f"![{model['id']}]({model['image']})\n"
-            md += ":::\n\n"
-
-            # Info column
-            md += ":::{grid-item}\n"
-            if model['description']:
-                md += f"{model['description']}\n\n"
-
-            md += "**Downloads:**\n\n"
-            for dl in model['downloads']:
-                md += f"- [{dl['filename']}]({dl['url']}) "
-                if dl['last_modified']:
-                    md += f"*(Modified: {dl['last_modified']})*"
-                md += "\n"
-
-            md += f"\n[View source files on GitHub]({model['source_url']})\n"
-            md += ":::\n\n"
-            md += "::::\n\n"
-            # Only add separator if not the last model
-            if model != models[-1]:
-                md += "---\n\n"
-
-        return md
+        page = {'title': title, 'description': description, 'models': models}
+        return "".join(MarkdownEmitter(self.docs_dir).fragments(page))
 
     def load_catalog_json(self, directory: Path) -> Dict:
         """
@@ -186,7 +421,7 @@ class ModelCatalogGenerator:
         Dict with keys: 'title', 'description', 'models', 'exclude_files'
         """
         catalog_file = directory / 'catalog.json'
-        if catalog_file.exists():
+        if self.file_index.exists(catalog_file):
             try:
                 with open(catalog_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -210,6 +445,31 @@ class ModelCatalogGenerator:
         """
         Generate a catalog page with model definitions
 
+        Parameters are the same as for plan_catalog_page().
+        """
+        page = self.plan_catalog_page(directory, title, description, output_filename,
+                                      model_definitions, exclude_files)
+        self.run_pending_renders()
+        self.drop_missing_web_models(page)
+        self.add_page_previews(page)
+        self.preview_images.save()
+        self.add_page_bundles(page)
+        self.download_bundles.save()
+        self.write_catalog_page(page)
+
+    def plan_catalog_page(self,
+                          directory: Path,
+                          title: str = None,
+                          description: str = None,
+                          output_filename: str = None,
+                          model_definitions: Dict = None,
+                          exclude_files: List[str] = None) -> Dict:
+        """
+        Collect the model entries of a catalog page and queue their renders
+
+        Nothing is rendered or written here; call run_pending_renders() and
+        write_catalog_page() afterwards.
+
         Parameters:
         -----------
         directory : Path
@@ -236,7 +496,19 @@ class ModelCatalogGenerator:
         exclude_files : List[str] (optional)
             List of filenames to explicitly exclude from individual entries
             (if None, reads from catalog.json)
+
+        Returns:
+        --------
+        Dict with keys: 'title', 'description', 'models', 'output_file',
+        'directory', 'inputs' (every file the page is generated from:
+        catalog.json, model files including ones referenced from other
+        directories, and custom images), 'directories' (directories searched
+        for models), 'images' and 'web_models' (generated for the page)
         """
+        self.page_images = set()
+        self.page_models = set()
+        self.page_git_dates = []
+
         # Load from catalog.json if parameters not provided
         catalog_data = self.load_catalog_json(directory)
 
@@ -254,6 +526,7 @@ class ModelCatalogGenerator:
         exclude_files = exclude_files or []
         models = []
         exclude_files = exclude_files or []
+        inputs = {directory / 'catalog.json'}
 
         # Track all files that are explicitly specified in model_definitions
         specified_files = set()
@@ -269,7 +542,8 @@ class ModelCatalogGenerator:
             if 'files' in model_info:
                 # Model with explicit file specification (single or grouped)
                 # Resolve paths relative to the directory containing catalog.json
-                file_paths = [(directory / f).resolve() for f in model_info['files']]
+                file_paths = [self.file_index.normalize(directory / f) for f in model_info['files']]
+                inputs.update(file_paths)
 
                 # Find first STL file to use as primary
                 primary_file = None
@@ -284,43 +558,73 @@ class ModelCatalogGenerator:
                         # Non-STL files (like .rom) are always additional
                         additional_files.append(fp)
 
-                if primary_file and primary_file.exists():
+                if primary_file and self.file_index.exists(primary_file):
+                    # Custom image instead of the rendered one, if specified
+                    image_file = None
+                    if 'image' in model_info:
+                        # Resolve image path relative to the directory
+                        image_file = self.file_index.normalize(directory / model_info['image'])
+                        inputs.add(image_file)
+                        if not self.file_index.exists(image_file):
+                            image_file = None
+
                     entry = self.generate_model_entry(
                         primary_file,
                         model_info['description'],
-                        additional_files if additional_files else None
+                        additional_files if additional_files else None,
+                        model_info.get('views'),
+                        model_info.get('view_layout', 'images'),
+                        image_file,
+                        model_info.get('render_quality')
                     )
-
-                    # Override image if custom one is specified
-                    if 'image' in model_info:
-                        # Resolve image path relative to the directory
-                        image_file = (directory / model_info['image']).resolve()
-                        if image_file.exists():
-                            import shutil
-                            dest_image = self.rendered_dir / f"{model_id}.png"
-                            shutil.copy(image_file, dest_image)
-                            entry['image'] = f"/_static/rendered/{model_id}.png"
-
                     entry['id'] = model_id
                     models.append(entry)
 
         # Add individual models from directory that weren't explicitly specified
         for stl_file in self.find_stl_files(directory, recursive=True, exclude=exclude_files):
             if stl_file.name not in specified_files:
+                inputs.add(stl_file)
                 model_id = stl_file.stem
                 # Check if this model has a description without explicit files
+                model_info = {}
                 if model_id in model_definitions and 'files' not in model_definitions[model_id]:
-                    desc = model_definitions[model_id].get('description', "")
-                else:
-                    desc = ""
-                models.append(self.generate_model_entry(stl_file, desc))
+                    model_info = model_definitions[model_id]
+                models.append(self.generate_model_entry(stl_file, model_info.get('description', ""),
+                                                        views=model_info.get('views'),
+                                                        view_layout=model_info.get('view_layout', 'images'),
+                                                        quality=model_info.get('render_quality')))
 
-        # Generate and write markdown
-        markdown = self.generate_table_markdown(models, title, description)
-        output_file = self.docs_dir / 'catalog' / output_filename
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        output_file.write_text(markdown)
-        print(f"Generated {output_file}")
+        return {
+            'title': title,
+            'description': description,
+            'models': models,
+            'output_file': self.docs_dir / 'catalog' / output_filename,
+            'directory': directory,
+            'inputs': sorted(inputs),
+            'directories': self.file_index.directories(directory) or [directory],
+            'images': sorted(self.page_images),
+            'web_models': sorted(self.page_models),
+            'git_dates': self.page_git_dates
+        }
+
+    def write_catalog_page(self, page: Dict) -> List[Path]:
+        """
+        Write a planned catalog page in every enabled output format
+
+        Returns:
+        --------
+        List[Path]
+            The output files of the page
+        """
+        with span('write page') as args:
+            outputs = emit_page(page, self.emitters, self.staging_dir)
+            args['bytes'] = sum(file_size(output_file) or 0 for output_file in outputs)
+        for output_file, written in outputs.items():
+            if written:
+                print(f"Generated {output_file}")
+            else:
+                print(f"Unchanged {output_file}")
+        return list(outputs)
 
     def generate_tools_page(self):
         """Generate tools catalog page"""
@@ -402,6 +706,7 @@ This catalog contains 3D printable models (STL files) for:
 All STL files can be downloaded directly and used with 3D printers. Click on any model to see:
 
 - Rendered preview image
+- Dimensions, print footprint, triangle count, surface area and volume
 - Direct download link
 - Last modification date
 - Link to source files on GitHub
@@ -411,25 +716,290 @@ All STL files can be downloaded directly and used with 3D printers. Click on any
 All models are maintained in the [PlusToolkit/PlusModelCatalog](https://github.com/PlusToolkit/PlusModelCatalog) repository.
 """
         output_file = self.docs_dir / 'catalog' / 'index.md'
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        output_file.write_text(markdown)
-        print(f"Generated {output_file}")
+        if write_if_changed(output_file, markdown):
+            print(f"Generated {output_file}")
+        else:
+            print(f"Unchanged {output_file}")
+
+    def generate_pages(self, category_pages: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Generate catalog pages, rendering only models whose cached images are stale
+
+        Parameters:
+        -----------
+        category_pages : List[Tuple[str, str]]
+            (directory relative to repo_root, output markdown filename) pairs,
+            as in CATEGORY_PAGES
+
+        Returns:
+        --------
+        List[Dict]
+            The generated pages, as returned by plan_catalog_page()
+        """
+        self.planned_images = set()
+        self.planned_models = set()
+        self.failed_models = set()
+        self.planned_previews = set()
+        self.planned_bundles = set()
+        self._file_index = None  # Rescan, files may have changed since the last call
+
+        # Planning, git metadata, rendering and page writing overlap; pages
+        # are still finished in order, so the output does not depend on
+        # which render completes first
+        pages = CatalogPipeline(self).run(category_pages)
+
+        self.preview_images.save()
+        self.download_bundles.save()
+        self.content_hasher.save()
+        self.render_manifest.save()
+        self.mesh_stats.save()
+        self.mesh_fingerprints.save()
+        self.mesh_quality.save()
+        self.model_manifest.save()
+        self.dependencies.save()
+
+        for page in pages:
+            self.search_documents[page['output_file'].name] = page['search']
+        self.write_search_index()
+        return pages
+
+    def plan_page(self, directory: Path, output_filename: str) -> Dict:
+        """Plan a category page, or skip it if none of its inputs changed"""
+        with span(output_filename, 'category'):
+            page = self.skip_unchanged_page(self.repo_root / directory, output_filename)
+            if page is None:
+                page = self.plan_catalog_page(directory=self.repo_root / directory,
+                                              output_filename=output_filename)
+        return page
+
+    def finish_page(self, page: Dict) -> None:
+        """
+        Write a planned page whose images and models are done
+
+        Fills in the deferred git dates of its downloads, drops the 3D view
+        of models whose export failed, creates the preview variants, writes the page in every format and records its
+        dependencies and search records.
+        """
+        if page.get('unchanged'):
+            return
+        self.resolve_git_dates(page)
+        self.drop_missing_web_models(page)
+        with span(page['output_file'].name, 'category'):
+            with span('previews'):
+                self.add_page_previews(page)
+            self.add_page_bundles(page)
+            outputs = self.write_catalog_page(page)
+        page['search'] = self.page_search_documents(page)
+        self.dependencies.record(
+            page['output_file'].name, self.dependency_key(),
+            page['inputs'], page['directories'],
+            outputs + page['images'] + self.web_model_files(page['web_models'])
+            + [self.previews_dir / name for name in page['previews']]
+            + [self.bundles_dir / name for name in page['bundles']],
+            {'images': [p.name for p in page['images']], 'web_models': page['web_models'],
+             'meshes': [self.content_hasher.digest(p) for p in page['inputs']
+                        if p.suffix.lower() == '.stl' and self.file_index.exists(p)],
+             'previews': page['previews'], 'bundles': page['bundles'],
+             'search': page['search']})
+
+    def add_page_previews(self, page: Dict) -> None:
+        """
+        Create the optimised variants of the preview images of a planned page
+
+        Adds 'preview' (fallback image, its size and the srcset variants) to
+        every model entry whose image exists, and 'previews' (file names of
+        all variants) to the page.
+        """
+        page['previews'] = []
+        for model in page['models']:
+            image_path = self.docs_dir / model['image'].lstrip('/')
+            preview = None
+            if image_path.exists():
+                preview = self.preview_images.get(image_path, self.content_hasher.digest(image_path))
+            if preview is None:
+                model['preview'] = None
+                continue
+            model['preview'] = {
+                'image': f"/_static/previews/{preview['image']}",
+                'width': preview['width'],
+                'height': preview['height'],
+                'srcset': [[f"/_static/previews/{name}", width]
+                           for name, width in preview['variants']],
+            }
+            page['previews'].extend(self.preview_images.files(preview))
+        self.planned_previews.update(page['previews'])
+
+    def add_page_bundles(self, page: Dict) -> None:
+        """
+        Write the zip bundles of a planned page
+
+        One bundle holds every file of the page (named by their path in the
+        repository), and each grouped model (several files) gets one with
+        its own files. Adds 'bundle' (URL and size, or None) to the page
+        and to every model entry, and 'bundles' (bundle names) to the page.
+        """
+        stem = page['output_file'].stem
+        page['bundles'] = []
+
+        def write_bundle(name, files):
+            bundle = self.download_bundles.write(name, files)
+            if bundle is None:
+                return None
+            page['bundles'].append(name)
+            return {'url': f"/_static/downloads/{name}", 'size': bundle.stat().st_size}
+
+        page_files = []
+        for model in page['models']:
+            files = model['download_files']
+            page_files.extend(path for path in files if path not in page_files)
+            model['bundle'] = None
+            if len(files) > 1:
+                names = [path.name for path in files]
+                # Files of a group from different directories may share a name
+                arcnames = (names if len(set(names)) == len(names) else
+                            [path.relative_to(self.repo_root).as_posix() for path in files])
+                model['bundle'] = write_bundle(f"{stem}/{model['id']}.zip",
+                                               list(zip(arcnames, files)))
+        page['bundle'] = None
+        if page_files:
+            page['bundle'] = write_bundle(
+                f"{stem}.zip", [(path.relative_to(self.repo_root).as_posix(), path)
+                                for path in page_files])
+        self.planned_bundles.update(page['bundles'])
+
+    def page_search_documents(self, page: Dict) -> List[Dict]:
+        """Search records of the models of a planned page"""
+        page_url = f"catalog/{page['output_file'].stem}.html"
+        return [search_document(model, page['title'], page_url) for model in page['models']]
+
+    def write_search_index(self) -> None:
+        """Write the search index over the models of all pages generated so far"""
+        documents = [document
+                     for _, output_filename in self.CATEGORY_PAGES
+                     for document in self.search_documents.get(output_filename, [])]
+        with span('search index'):
+            written = write_search_index(documents, self.search_dir)
+        print(f"Search index: {len(documents)} models, {written} files updated")
+
+    def dependency_key(self) -> str:
+        """Hash of everything besides the input files that the generated pages depend on"""
+        if self._dependency_key is None:
+            from render_stl import render_settings
+            import mesh_stats
+            import mesh_quality
+            import catalog_emitters
+            import search_index
+            import preview_images
+            import stl_stream
+            import download_bundles
+            settings = {
+                'generator': [file_digest(Path(module)) for module in
+                              (__file__, mesh_stats.__file__, mesh_quality.__file__,
+                               catalog_emitters.__file__,
+                               search_index.__file__, preview_images.__file__,
+                               stl_stream.__file__, download_bundles.__file__)],
+                'formats': self.output_formats,
+                'git_head': read_git_head(self.repo_root),
+                'github_base_url': self.github_base_url,
+                'render': render_settings(**self.render_kwargs),
+                'export': export_settings() if self.export_web_models else None,
+            }
+            self._dependency_key = RenderManifest.render_key('', settings)
+        return self._dependency_key
+
+    def drop_missing_web_models(self, page: Dict) -> None:
+        """
+        Remove the 3D view of the models of a page whose web model was not exported
+
+        Clears 'web_model' of every model whose export failed or whose .glb
+        files are missing, and removes them from the page's 'web_models'.
+        """
+        missing = {name for name in page['web_models']
+                   if name in self.failed_models
+                   or not all(path.exists() for path in self.web_model_files([name]))}
+        if not missing:
+            return
+        for model in page['models']:
+            if model.get('web_model') in missing:
+                model['web_model'] = None
+        page['web_models'] = [name for name in page['web_models'] if name not in missing]
+
+    def web_model_files(self, model_names) -> List[Path]:
+        """The .glb files exported for web models"""
+        return [self.models_dir / lod_filename(model_name, level)
+                for model_name in model_names for level in range(len(LOD_GRIDS) + 1)]
+
+    def skip_unchanged_page(self, directory: Path, output_filename: str) -> Optional[Dict]:
+        """
+        Check the dependency manifest for a page whose inputs did not change
+
+        Returns None if the page must be generated. Otherwise its images and
+        models are kept (not pruned) and a page with the keys 'output_file',
+        'directory', 'inputs', 'search' and 'unchanged' is returned, without
+        searching its directory or reading any model.
+        """
+        if not self.use_render_cache:
+            return None
+        entry = self.dependencies.current_entry(output_filename, self.dependency_key())
+        if entry is None:
+            return None
+        data = entry['data']
+        if 'search' not in data or 'previews' not in data or 'bundles' not in data:
+            return None  # Recorded by an older version
+        self.planned_images.update(self.rendered_dir / name for name in data['images'])
+        self.planned_models.update(data['web_models'])
+        self.planned_previews.update(data['previews'])
+        self.planned_bundles.update(data['bundles'])
+        self.render_manifest.kept += len(data['images'])
+        self.model_manifest.kept += len(data['web_models'])
+        self.mesh_stats.used.update(data['meshes'])
+        self.mesh_fingerprints.used.update(data['meshes'])
+        self.mesh_quality.used.update(data['meshes'])
+        output_file = self.docs_dir / 'catalog' / output_filename
+        print(f"Unchanged {output_file} (no input modified)")
+        return {
+            'output_file': output_file,
+            'directory': directory,
+            'inputs': sorted(self.dependencies.input_paths(entry)),
+            'search': data['search'],
+            'unchanged': True
+        }
 
-    def generate_all(self):
+    def generate_all(self) -> List[Dict]:
         """Generate all catalog pages"""
         print("Generating model catalog documentation...")
 
-        # Generate category pages and track which ones exist
-        self.generate_tools_page()
-        self.generate_tracking_fixtures_page()
-        self.generate_fcal_phantoms_page()
-        self.generate_anatomy_page()
-        self.generate_needletutor_page()
+        with span('generate_pages', 'build'):
+            pages = self.generate_pages(self.CATEGORY_PAGES)
+
+        pruned = prune_outputs(pages, self.emitters, self.docs_dir)
+        if pruned:
+            print(f"Removed {pruned} pages of disabled output formats")
+        pruned = self.render_manifest.prune(self.planned_images)
+        self.render_manifest.save()
+        self.mesh_stats.save(prune=True)
+        self.mesh_fingerprints.save(prune=True)
+        self.mesh_quality.save(prune=True)
+        print(f"Render cache: {self.render_manifest.summary()}, {pruned} orphaned images removed")
+        pruned = self.preview_images.prune(self.planned_previews)
+        self.preview_images.save()
+        print(f"Preview variants: {self.preview_images.summary()}, {pruned} orphaned files removed")
+        pruned = self.download_bundles.prune(self.planned_bundles)
+        self.download_bundles.save()
+        print(f"Download bundles: {self.download_bundles.summary()}, "
+              f"{pruned} orphaned bundles removed")
+        if self.export_web_models:
+            pruned = self.model_manifest.prune(self.web_model_files(self.planned_models))
+            self.model_manifest.save()
+            print(f"3D model cache: {self.model_manifest.summary('exported')}, "
+                  f"{pruned} orphaned files removed")
         print("Done!")
+        return pages
 
 
 def main():
     import argparse
+    from catalog_emitters import OUTPUT_FORMATS
     parser = argparse.ArgumentParser(description='Generate model catalog documentation')
     parser.add_argument('--repo-root', default='..',
                        help='Root directory of PlusModelCatalog repository')
@@ -438,15 +1008,58 @@ def main():
     parser.add_argument('--github-url',
                        default='https://github.com/PlusToolkit/PlusModelCatalog',
                        help='GitHub repository base URL')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Parallel render processes (0 = one per CPU core, default: 1)')
+    parser.add_argument('--force-render', action='store_true',
+                       help='Re-render all preview images, ignoring the render cache')
+    parser.add_argument('--no-3d', action='store_true',
+                       help='Do not export interactive 3D (.glb) models')
+    parser.add_argument('--backend', choices=['vtk', 'numpy'], default='vtk',
+                       help='Rendering backend: vtk (OpenGL) or numpy (no OpenGL needed, default: vtk)')
+    parser.add_argument('--quality', choices=['draft', 'final'], default='final',
+                       help='Render quality: draft (opaque, fastest, for local and PR builds) or '
+                            'final (transparent with depth peeling, default: final)')
+    parser.add_argument('--formats', nargs='+', choices=OUTPUT_FORMATS, default=['markdown'],
+                       help='Output formats of the category pages: markdown (Sphinx pages), '
+                            'json and html (in _static/catalog) (default: markdown)')
+    parser.add_argument('--trace', metavar='FILE',
+                       help='Save a trace of the build stages in Chrome trace-event format '
+                            '(open in chrome://tracing or ui.perfetto.dev)')
+    parser.add_argument('--watch', action='store_true',
+                       help='Keep running and regenerate the pages affected by changed model files')
+    parser.add_argument('--poll', action='store_true',
+                       help='Watch by polling instead of inotify')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                       help='Seconds between scans when polling (default: 1.0)')
+    parser.add_argument('--watch-command',
+                       help='Shell command run in the docs directory after each regeneration, '
+                            'e.g. "sphinx-build -b html . _build/html"')
 
     args = parser.parse_args()
 
     generator = ModelCatalogGenerator(
         args.repo_root,
         args.docs_dir,
-        args.github_url
+        args.github_url,
+        args.jobs,
+        not args.force_render,
+        not args.no_3d,
+        args.backend,
+        args.formats,
+        args.quality
     )
-    generator.generate_all()
+    tracer = start_tracing() if args.trace else None
+    pages = generator.generate_all()
+    if tracer is not None:
+        stop_tracing()
+        tracer.save(args.trace)
+        tracer.print_summary()
+        print(f"Trace saved to {args.trace}")
+
+    if args.watch:
+        from catalog_watch import watch_catalog
+        watch_catalog(generator, pages, args.poll_interval, args.watch_command,
+                      use_inotify=not args.poll)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Export STL models as compact binary glTF (.glb) files for the web viewer
+
+Each model is written as a set of levels of detail (LODs): LOD 0 is the
+full-resolution mesh with coincident vertices welded (for very large STL
+files, the streamed preview mesh of stl_stream), higher LODs are
+decimated by vertex clustering. Vertex positions are quantised to 16 bits
+(KHR_mesh_quantization) and normals are omitted, so viewers shade the
+faces flat, as in the rendered previews.
+"""
+
+import json
+import struct
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from stl_stream import load_preview_mesh, stream_settings
+
+# Bump when the exported files change, to invalidate cached exports
+GLTF_EXPORT_VERSION = 1
+
+# Vertex clustering grid resolution (cells along the longest bounding box
+# side) of each decimated LOD, coarsest last. LOD 0 is never decimated.
+LOD_GRIDS = (160, 48)
+
+# Material matching the colour of the rendered previews
+BASE_COLOR = (0.8, 0.8, 0.9, 1.0)
+
+GLB_MAGIC = 0x46546C67  # 'glTF'
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+
+# Rotation of -90 degrees about X, from Z-up (CAD/STL) to Y-up (glTF)
+Z_UP_TO_Y_UP = [-0.7071067811865476, 0.0, 0.0, 0.7071067811865476]
+
+
+def export_settings() -> Dict:
+    """Return every setting that affects the exported files, for cache keys"""
+    return {
+        'gltf_export_version': GLTF_EXPORT_VERSION,
+        'lod_grids': list(LOD_GRIDS),
+        'base_color': list(BASE_COLOR),
+        'streaming': stream_settings(),
+    }
+
+
+def remove_degenerate_faces(faces: np.ndarray) -> np.ndarray:
+    """Drop faces with repeated vertices and duplicates of the same face"""
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2])
+                  & (faces[:, 0] != faces[:, 2])]
+    if not len(faces):
+        return faces
+    # Faces with the same vertex set are duplicates regardless of winding
+    keys = np.ascontiguousarray(np.sort(faces, axis=1))
+    _, first = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * 3))).ravel(),
+                         return_index=True)
+    return faces[np.sort(first)]
+
+
+def compact(points: np.ndarray, faces: np.ndarray):
+    """Drop points not referenced by any face and renumber the faces"""
+    used, inverse = np.unique(faces, return_inverse=True)
+    return points[used], inverse.reshape(-1, 3)
+
+
+def decimate(points: np.ndarray, faces: np.ndarray, grid: int):
+    """
+    Simplify a mesh by vertex clustering
+
+    Points are snapped to a uniform grid with grid cells along the longest
+    side of the bounding box; all points of a cell are replaced by their
+    mean and faces that collapse are removed.
+    """
+    lo = points.min(axis=0)
+    extent = float((points.max(axis=0) - lo).max())
+    if extent <= 0:
+        return points, faces
+    cell = np.minimum(((points - lo) * (grid / extent)).astype(np.int64), grid - 1)
+    key = (cell[:, 0] * grid + cell[:, 1]) * grid + cell[:, 2]
+    _, cluster = np.unique(key, return_inverse=True)
+    cluster = cluster.ravel()
+
+    counts = np.bincount(cluster)
+    clustered = np.stack([np.bincount(cluster, weights=points[:, axis]) / counts
+                          for axis in range(3)], axis=1)
+    return compact(clustered, remove_degenerate_faces(cluster[faces]))
+
+
+def build_lods(triangles: np.ndarray) -> List:
+    """
+    Weld a triangle soup and build its levels of detail
+
+    Returns:
+    --------
+    List of (points, faces) tuples, full resolution first; empty if the
+    mesh has no non-degenerate triangles
+    """
+    from stl_loader import StlMesh
+    points, faces = StlMesh(triangles, None, True).merged()
+    points = points.astype(np.float64)
+    points, faces = compact(points, remove_degenerate_faces(faces))
+    if not len(faces):
+        return []
+
+    lods = [(points, faces)]
+    for grid in LOD_GRIDS:
+        lod_points, lod_faces = decimate(points, faces, grid)
+        if len(lod_faces):
+            lods.append((lod_points, lod_faces))
+        else:
+            # Too small for the grid: repeat the previous level
+            lods.append(lods[-1])
+    return lods
+
+
+def _pad(data: bytes, pad_byte: bytes = b'\0') -> bytes:
+    return data + pad_byte * (-len(data) % 4)
+
+
+def encode_glb(points: np.ndarray, faces: np.ndarray, name: str = "") -> bytes:
+    """
+    Encode a mesh as a binary glTF file with quantised positions
+
+    Positions are stored as unsigned 16-bit integers; the mesh node's scale
+    and translation map them back to model coordinates (in mm, converted
+    to metres for glTF).
+    """
+    lo = points.min(axis=0) if len(points) else np.zeros(3)
+    extent = (points.max(axis=0) - lo) if len(points) else np.zeros(3)
+    scale = np.where(extent > 0, extent / 65535.0, 1.0)
+    quantised = np.round((points - lo) / scale).astype('<u2')
+
+    index_type = '<u2' if len(points) <= 65535 else '<u4'
+    indices = np.ascontiguousarray(faces, dtype=index_type)
+
+    # Vertex attributes need a 4-byte aligned stride: pad each position to 4 components
+    padded = np.zeros((len(quantised), 4), dtype='<u2')
+    padded[:, :3] = quantised
+    position_bytes = padded.tobytes()
+    index_bytes = _pad(indices.tobytes())
+    binary = position_bytes + index_bytes
+
+    mm_to_m = 0.001
+    document = {
+        'asset': {'version': '2.0', 'generator': 'PlusModelCatalog gltf_export.py'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [
+            {'rotation': Z_UP_TO_Y_UP, 'scale': [mm_to_m] * 3, 'children': [1]},
+            {'name': name, 'mesh': 0,
+             'translation': [float(v) for v in lo],
+             'scale': [float(v) for v in scale]},
+        ],
+        'meshes': [{
+            'name': name,
+            'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1, 'material': 0}],
+        }],
+        'materials': [{
+            'pbrMetallicRoughness': {
+                'baseColorFactor': list(BASE_COLOR),
+                'metallicFactor': 0.0,
+                'roughnessFactor': 0.6,
+            },
+            'doubleSided': True,
+        }],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(position_bytes), 'byteStride': 8,
+             'target': 34962},
+            {'buffer': 0, 'byteOffset': len(position_bytes), 'byteLength': indices.nbytes,
+             'target': 34963},
+        ],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5123, 'count': len(quantised), 'type': 'VEC3',
+             'min': quantised.min(axis=0).tolist() if len(quantised) else [0, 0, 0],
+             'max': quantised.max(axis=0).tolist() if len(quantised) else [0, 0, 0]},
+            {'bufferView': 1, 'componentType': 5123 if index_type == '<u2' else 5125,
+             'count': int(indices.size), 'type': 'SCALAR'},
+        ],
+    }
+
+    json_chunk = _pad(json.dumps(document, separators=(',', ':')).encode('utf-8'), b' ')
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b''.join([
+        struct.pack('<III', GLB_MAGIC, 2, length),
+        struct.pack('<II', len(json_chunk), GLB_CHUNK_JSON), json_chunk,
+        struct.pack('<II', len(binary), GLB_CHUNK_BIN), binary,
+    ])
+
+
+def lod_filename(model_name: str, level: int) -> str:
+    """File name of one level of detail of a model"""
+    return f"{model_name}.lod{level}.glb"
+
+
+def export_stl_to_glb(stl_file, output_dir, model_name: str = None) -> List[Path]:
+    """
+    Export an STL file as a set of .glb levels of detail
+
+    Parameters:
+    -----------
+    stl_file : str
+        Path to input STL file
+    output_dir : str
+        Directory for the .glb files
+    model_name : str
+        Base name of the output files (default: STL file stem)
+
+    Returns:
+    --------
+    List[Path]
+        Written files, full resolution (LOD 0) first; none if the mesh has
+        no triangles to show
+    """
+    stl_file = Path(stl_file)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_name = model_name or stl_file.stem
+
+    lods = build_lods(load_preview_mesh(stl_file).triangles)
+    if not lods:
+        print(f"Skipped export of {stl_file} (no triangles)")
+        return []
+
+    outputs = []
+    for level, (points, faces) in enumerate(lods):
+        output_file = output_dir / lod_filename(model_name, level)
+        output_file.write_bytes(encode_glb(points, faces, model_name))
+        outputs.append(output_file)
+
+    sizes = ", ".join(f"{f.stat().st_size / 1024:.0f} KB" for f in outputs)
+    print(f"Exported {stl_file} -> {output_dir / model_name}.lod*.glb ({sizes})")
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export STL files as binary glTF levels of detail')
+    parser.add_argument('input', help='Input STL file')
+    parser.add_argument('output', help='Output directory')
+    parser.add_argument('--name', help='Base name of output files (default: STL file stem)')
+    args = parser.parse_args()
+    export_stl_to_glb(args.input, args.output, args.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Mesh quality (printability) checks of catalog meshes
+
+Finds the defects that make slicers fail or print wrongly:
+
+- degenerate triangles: repeated vertices or zero area,
+- duplicate triangles: the same three vertices more than once,
+- open boundaries: edges used by only one triangle (the mesh has holes),
+- non-manifold edges: edges shared by more than two triangles,
+- inconsistent winding: neighbouring triangles whose vertex order (and so
+  their normal) disagrees, i.e. flipped triangles,
+- inverted mesh: a closed mesh whose normals all point inwards,
+- flipped stored normals: facet normals in the file that contradict the
+  vertex order.
+
+Everything is done with NumPy sorting and hashing of vertex and edge keys,
+without per-triangle Python loops, so it scales to meshes of millions of
+triangles. Results are cached by STL content hash. Files over the
+streaming threshold (see stl_stream) are not checked: finding open and
+non-manifold edges needs every edge of the mesh in memory at once.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from catalog_cache import MeshIndex
+from stl_loader import load_stl
+from stl_stream import CHUNK_TRIANGLES, is_large_stl
+
+# Bump when the checks change, to invalidate the index
+MESH_QUALITY_VERSION = 2
+
+# Triangles with an area below this fraction of the squared bounding box
+# diagonal count as degenerate
+DEGENERATE_AREA = 1e-12
+
+# Badge status and label of each quality level
+QUALITY_LABELS = {
+    'ok': "Print-ready",
+    'warning': "Minor mesh issues",
+    'error': "Mesh errors",
+    'unchecked': "Not checked",
+}
+
+
+# Odd 64-bit multipliers for hashing vertex and triangle keys
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9],
+                             dtype=np.uint64)
+
+
+def _row_hashes(rows: np.ndarray) -> np.ndarray:
+    """64-bit hashes of the rows of an (n, 3) integer array (wrapping arithmetic)"""
+    rows = rows.astype(np.uint64)
+    return rows[:, 0] * _HASH_MULTIPLIERS[0] ^ rows[:, 1] * _HASH_MULTIPLIERS[1] \
+        ^ rows[:, 2] * _HASH_MULTIPLIERS[2]
+
+
+def weld_vertices(triangles: np.ndarray) -> np.ndarray:
+    """
+    Index the vertices of a triangle soup by exact coordinates
+
+    Vertices are grouped by a 64-bit hash of their coordinate bits, which
+    sorts much faster than the 12-byte coordinates; the grouping is checked
+    against the coordinates and redone exactly in the unlikely case of a
+    hash collision.
+
+    Returns:
+    --------
+    np.ndarray
+        (n, 3) int64 vertex indices of each triangle; corners with identical
+        coordinates share an index
+    """
+    # -0.0 + 0.0 is 0.0, so both zeros get the same bits
+    points = np.ascontiguousarray(np.asarray(triangles, dtype=np.float32).reshape(-1, 3)
+                                  + np.float32(0)).view(np.uint32)
+    _, first, inverse = np.unique(_row_hashes(points), return_index=True, return_inverse=True)
+    if not np.array_equal(points[first[inverse]], points):
+        keys = points.view(np.dtype((np.void, points.dtype.itemsize * 3))).ravel()
+        _, inverse = np.unique(keys, return_inverse=True)
+    return inverse.reshape(-1, 3).astype(np.int64)
+
+
+def _count_duplicate_rows(rows: np.ndarray) -> int:
+    """Number of rows of an (n, 3) integer array equal to an earlier row"""
+    if not len(rows):
+        return 0
+    rows = rows[np.argsort(_row_hashes(rows))]
+    # Equal rows have equal hashes and so end up next to each other
+    return int(np.count_nonzero(np.all(rows[1:] == rows[:-1], axis=1)))
+
+
+def analyse_mesh_quality(triangles: np.ndarray, normals: Optional[np.ndarray] = None) -> Dict:
+    """
+    Check a triangle mesh for defects that affect 3D printing
+
+    Parameters:
+    -----------
+    triangles : np.ndarray
+        (n, 3, 3) array of triangle vertex coordinates
+    normals : np.ndarray (optional)
+        (n, 3) facet normals stored in the file (zero vectors are ignored)
+
+    Returns:
+    --------
+    Dict with keys:
+        'triangles': number of triangles
+        'degenerate_triangles', 'duplicate_triangles': triangle counts
+        'boundary_edges', 'non_manifold_edges', 'inconsistent_edges': edge counts
+        'flipped_normals': stored normals opposite to the vertex order
+        'inverted': closed mesh with inward-pointing normals
+        'watertight': no boundary and no non-manifold edges
+        'status': 'ok', 'warning' (degenerate or duplicate triangles, flipped
+            stored normals) or 'error' (empty, open, non-manifold,
+            inconsistently wound or inverted mesh)
+    """
+    tri = np.asarray(triangles).reshape(-1, 3, 3)
+    count = len(tri)
+    faces = weld_vertices(tri)
+
+    # Degenerate: repeated vertices, or (near) zero area. Computed in
+    # float64 in chunks, to bound the temporary arrays
+    diagonal = (tri.reshape(-1, 3).max(axis=0).astype(np.float64)
+                - tri.reshape(-1, 3).min(axis=0)) if count else np.zeros(3)
+    min_double_area = 2 * DEGENERATE_AREA * float(np.dot(diagonal, diagonal))
+    repeated = ((faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2])
+                | (faces[:, 0] == faces[:, 2]))
+    degenerate = repeated.copy()
+    flipped_normals = 0
+    signed_volume = 0.0
+    for begin in range(0, count, CHUNK_TRIANGLES):
+        chunk = slice(begin, begin + CHUNK_TRIANGLES)
+        a, b, c = np.moveaxis(np.asarray(tri[chunk], dtype=np.float64), 1, 0)
+        cross = np.cross(b - a, c - a)
+        degenerate[chunk] |= np.einsum('ij,ij->i', cross, cross) <= min_double_area ** 2
+        signed_volume += np.einsum('ij,ij->i', a, np.cross(b, c)).sum()
+        if normals is not None:
+            dots = np.einsum('ij,ij->i', np.asarray(normals[chunk], dtype=np.float64), cross)
+            flipped_normals += int(np.count_nonzero((dots < 0) & ~degenerate[chunk]))
+
+    # Duplicates: same vertex set, whatever the order or orientation
+    valid = faces[~repeated]
+    duplicate_triangles = _count_duplicate_rows(np.sort(valid, axis=1))
+
+    # Edges of the non-repeated triangles: each (from, to) vertex pair is
+    # packed into one key, the undirected edge in the high bits and the
+    # direction in the lowest bit, so a single sort groups the uses of an edge
+    start = valid.reshape(-1)
+    end = np.roll(valid, -1, axis=1).reshape(-1)
+    vertex_count = int(faces.max()) + 1 if count else 0
+    keys = (np.minimum(start, end) * vertex_count + np.maximum(start, end)) * 2 + (start < end)
+    keys.sort()
+    edges = keys >> 1
+    group_starts = np.flatnonzero(np.r_[True, edges[1:] != edges[:-1]])
+    uses = np.diff(np.r_[group_starts, len(edges)])
+    boundary_edges = int(np.count_nonzero(uses == 1))
+    non_manifold_edges = int(np.count_nonzero(uses > 2))
+    # A manifold edge is consistently wound if its two triangles traverse it
+    # in opposite directions
+    pairs = group_starts[uses == 2]
+    inconsistent_edges = int(np.count_nonzero((keys[pairs] & 1) == (keys[pairs + 1] & 1)))
+
+    watertight = boundary_edges == 0 and non_manifold_edges == 0
+    inverted = bool(watertight and inconsistent_edges == 0 and count and signed_volume < 0)
+
+    if not count or not watertight or inconsistent_edges or inverted:
+        status = 'error'
+    elif np.any(degenerate) or duplicate_triangles or flipped_normals:
+        status = 'warning'
+    else:
+        status = 'ok'
+    return {
+        'triangles': int(count),
+        'degenerate_triangles': int(np.count_nonzero(degenerate)),
+        'duplicate_triangles': duplicate_triangles,
+        'boundary_edges': boundary_edges,
+        'non_manifold_edges': non_manifold_edges,
+        'inconsistent_edges': inconsistent_edges,
+        'flipped_normals': flipped_normals,
+        'inverted': inverted,
+        'watertight': watertight,
+        'status': status,
+    }
+
+
+class MeshQualityIndex(MeshIndex):
+    """Persistent index of mesh quality checks keyed by STL content hash"""
+
+    version = MESH_QUALITY_VERSION
+
+    def compute(self, stl_path: Path) -> Optional[Dict]:
+        try:
+            if is_large_stl(stl_path):
+                return {'status': 'unchecked', 'reason': "too large to check"}
+            mesh = load_stl(stl_path)
+        except Exception as e:
+            print(f"Error checking mesh quality of {stl_path}: {e}")
+            return {'triangles': 0, 'unreadable': True, 'status': 'error'}
+        return analyse_mesh_quality(mesh.triangles, mesh.normals)
+
+
+def mesh_quality_issues(quality: Dict) -> List[str]:
+    """Describe the defects found by analyse_mesh_quality(), most severe first"""
+    if quality.get('unreadable'):
+        return ["The file cannot be read as an STL mesh"]
+    if quality.get('triangles') == 0:
+        return ["The mesh has no triangles"]
+    if quality['status'] == 'unchecked':
+        return [f"Mesh {quality['reason']}"]
+    issues = []
+    for key, singular, plural in (
+            ('boundary_edges', "open boundary edge", "open boundary edges"),
+            ('non_manifold_edges', "non-manifold edge", "non-manifold edges"),
+            ('inconsistent_edges', "edge between flipped triangles",
+             "edges between flipped triangles"),
+            ('degenerate_triangles', "degenerate triangle", "degenerate triangles"),
+            ('duplicate_triangles', "duplicate triangle", "duplicate triangles"),
+            ('flipped_normals', "stored normal flipped", "stored normals flipped")):
+        count = quality.get(key, 0)
+        if count:
+            issues.append(f"{count:,} {singular if count == 1 else plural}")
+    if quality.get('inverted'):
+        issues.insert(0, "Normals point inwards (inverted mesh)")
+    return issues
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Geometric statistics of catalog meshes
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from catalog_cache import MeshIndex
+from stl_loader import load_stl
+from stl_stream import FINGERPRINT_VERSION, geometry_digest, is_large_stl, stream_stl
+
+# Bump when the computed statistics change, to invalidate the index
+MESH_STATS_VERSION = 1
+
+
+def compute_mesh_stats(triangles: np.ndarray) -> Dict:
+    """
+    Compute geometric statistics of a triangle mesh
+
+    Parameters:
+    -----------
+    triangles : np.ndarray
+        (n, 3, 3) array of triangle vertex coordinates (in mm)
+
+    Returns:
+    --------
+    Dict with keys:
+        'triangles': number of triangles
+        'bounds': [xmin, xmax, ymin, ymax, zmin, zmax]
+        'size': [x, y, z] bounding box extent
+        'surface_area': total triangle area (mm^2)
+        'volume': enclosed volume (mm^3), meaningful for closed meshes only
+        'footprint': [x, y] extent on the print bed (XY plane)
+    """
+    tri = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    if not len(tri):
+        return {'triangles': 0, 'bounds': [0.0] * 6, 'size': [0.0] * 3,
+                'surface_area': 0.0, 'volume': 0.0, 'footprint': [0.0, 0.0]}
+
+    a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+    cross = np.cross(b - a, c - a)
+    surface_area = 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross)).sum()
+    # Sum of signed tetrahedron volumes against the origin (divergence theorem)
+    volume = abs(np.einsum('ij,ij->i', a, np.cross(b, c)).sum()) / 6.0
+
+    points = tri.reshape(-1, 3)
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    size = hi - lo
+    return {
+        'triangles': int(len(tri)),
+        'bounds': [float(lo[0]), float(hi[0]), float(lo[1]), float(hi[1]), float(lo[2]), float(hi[2])],
+        'size': [float(v) for v in size],
+        'surface_area': float(surface_area),
+        'volume': float(volume),
+        'footprint': [float(size[0]), float(size[1])],
+    }
+
+
+class MeshStatsIndex(MeshIndex):
+    """Persistent index of mesh statistics keyed by STL content hash"""
+
+    version = MESH_STATS_VERSION
+
+    def compute(self, stl_path: Path) -> Optional[Dict]:
+        try:
+            if is_large_stl(stl_path):
+                # Computed in one pass over the file, in bounded memory
+                return stream_stl(stl_path)[0]
+            return compute_mesh_stats(load_stl(stl_path).triangles)
+        except Exception as e:
+            print(f"Error computing mesh statistics for {stl_path}: {e}")
+            return None
+
+
+class MeshFingerprintIndex(MeshIndex):
+    """
+    Persistent index of geometric mesh fingerprints keyed by STL content hash
+
+    The fingerprint (stl_stream.geometry_digest) identifies meshes that are
+    geometrically identical although their files differ, e.g. ASCII and
+    binary exports of the same model. Rendered assets are named after it.
+    """
+
+    version = FINGERPRINT_VERSION
+
+    def compute(self, stl_path: Path) -> str:
+        return geometry_digest(stl_path)
+
+
+def mesh_stats_items(stats: Dict) -> List[Tuple[str, str]]:
+    """Return formatted mesh statistics as (label, value) pairs"""
+    size = stats['size']
+    footprint = stats['footprint']
+    return [
+        ("Size", f"{size[0]:.1f} × {size[1]:.1f} × {size[2]:.1f} mm"),
+        ("Print footprint", f"{footprint[0]:.1f} × {footprint[1]:.1f} mm"),
+        ("Triangles", f"{stats['triangles']:,}"),
+        ("Surface area", f"{stats['surface_area'] / 100:,.1f} cm²"),
+        ("Volume", f"{stats['volume'] / 1000:,.1f} cm³"),
+    ]
+
+
+def format_mesh_stats(stats: Dict) -> str:
+    """Format mesh statistics as a markdown list"""
+    return "".join(f"- {label}: {value}\n" for label, value in mesh_stats_items(stats))
+
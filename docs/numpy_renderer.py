@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Headless STL renderer in pure NumPy
+
+Rasterises STL triangles with a vectorised software z-buffer, so previews
+can be rendered without VTK or any OpenGL/OSMesa stack. The output matches
+the VTK renderer (render_stl.RenderSession): the same parallel projection,
+camera angles and framing, the same headlight Lambert/Phong shading, and
+the same quality profiles: translucent surfaces blended front to back like
+VTK's depth peeling, or only the nearest surface for opaque ones, onto a
+transparent background. PNG files are written with Pillow.
+"""
+
+import numpy as np
+from PIL import Image
+
+from stl_stream import load_preview_mesh
+from render_stl import (RENDER_STYLE, DEFAULT_VIEW, AXIS_VIEWS, AXIS_VIEW_LIGHT_POSITION,
+                        TURNTABLE_PREFIX, RENDER_QUALITY_PROFILES, DEFAULT_QUALITY, RenderSession)
+
+# Bump whenever a rendering change alters the output images, so that cached
+# previews are invalidated
+NUMPY_RENDERER_VERSION = 2
+
+# Vertices are snapped to 1/256 pixel, as GPUs do, so that coverage tests
+# are exact and a pixel on an edge shared by two triangles is drawn once
+SUBPIXEL_BITS = 8
+
+# Candidate pixels tested per rasterisation batch, bounds the memory use
+BATCH_PIXELS = 1 << 20
+
+
+def rotate(vector, axis, angle):
+    """Rotate a vector about an axis by angle degrees (right-hand rule)"""
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / np.linalg.norm(axis)
+    vector = np.asarray(vector, dtype=np.float64)
+    theta = np.radians(angle)
+    return (vector * np.cos(theta) + np.cross(axis, vector) * np.sin(theta)
+            + axis * np.dot(axis, vector) * (1.0 - np.cos(theta)))
+
+
+def _orthonormal_basis(view_plane_normal, view_up):
+    """Rows right, up and view plane normal of a camera, as vtkCamera's view transform"""
+    normal = view_plane_normal / np.linalg.norm(view_plane_normal)
+    right = np.cross(view_up, normal)
+    right /= np.linalg.norm(right)
+    return np.array([right, np.cross(normal, right), normal])
+
+
+def view_basis(view=DEFAULT_VIEW):
+    """
+    Camera orientation of a view as a 3x3 matrix
+
+    Applies the same camera motions as render_stl.setup_camera does to a
+    default vtkCamera (at +Z looking at the origin, Y up).
+
+    Returns:
+    --------
+    np.ndarray
+        Rows: the camera's right, up and view plane normal (pointing from
+        the model towards the camera) directions
+    """
+    if view in AXIS_VIEWS:
+        direction, view_up = AXIS_VIEWS[view]
+        return _orthonormal_basis(np.array(direction, dtype=np.float64),
+                                  np.array(view_up, dtype=np.float64))
+
+    position = np.array([0.0, 0.0, 1.0])
+    focal_point = np.zeros(3)
+    view_up = np.array([0.0, 1.0, 0.0])
+
+    # vtkCamera.Roll: rotate the view up about the direction of projection
+    view_up = rotate(view_up, focal_point - position, RENDER_STYLE['camera_roll'])
+    # vtkCamera.Pitch: rotate the focal point about the camera's right axis
+    right = _orthonormal_basis(position - focal_point, view_up)[0]
+    focal_point = position + rotate(focal_point - position, right, RENDER_STYLE['camera_pitch'])
+    # vtkCamera.Yaw: rotate the focal point about the view up
+    focal_point = position + rotate(focal_point - position, view_up, RENDER_STYLE['camera_yaw'])
+    if view.startswith(TURNTABLE_PREFIX):
+        # vtkCamera.Azimuth: rotate the camera position about the view up
+        angle = float(view[len(TURNTABLE_PREFIX):])
+        position = focal_point + rotate(position - focal_point, view_up, angle)
+    elif view != DEFAULT_VIEW:
+        raise ValueError(f"Unknown view '{view}'")
+    return _orthonormal_basis(position - focal_point, view_up)
+
+
+def shade_faces(normals, view=DEFAULT_VIEW):
+    """
+    Flat-shade faces the way VTK's OpenGL mapper does
+
+    Parameters:
+    -----------
+    normals : np.ndarray
+        (n, 3) unit face normals in camera coordinates, facing the camera
+        (two-sided lighting)
+    view : str
+        View name; axis views are lit by an offset camera light instead
+        of the headlight
+
+    Returns:
+    --------
+    np.ndarray
+        (n, 3) RGB colours in [0, 1]
+    """
+    color = np.array(RENDER_STYLE['color'])
+    power = RENDER_STYLE['specular_power']
+    if view in AXIS_VIEWS:
+        # Directional camera light with Phong specular reflection
+        light = -np.array(AXIS_VIEW_LIGHT_POSITION, dtype=np.float64)
+        light /= np.linalg.norm(light)
+        diffuse = np.maximum(0.0, -(normals @ light))
+        reflected_z = light[2] - 2.0 * (normals @ light) * normals[:, 2]
+        specular = np.where(diffuse > 0, np.maximum(0.0, reflected_z) ** power, 0.0)
+    else:
+        # Headlight: light and view direction coincide
+        diffuse = np.maximum(0.0, normals[:, 2])
+        specular = diffuse ** power
+    shade = (RENDER_STYLE['ambient'] + RENDER_STYLE['diffuse'] * diffuse
+             + RENDER_STYLE['specular'] * specular)
+    return np.minimum(1.0, shade[:, None] * color)
+
+
+def rasterize(screen, depth, width, height):
+    """
+    Find the pixels covered by each triangle
+
+    Parameters:
+    -----------
+    screen : np.ndarray
+        (n, 3, 2) vertex positions in pixels, origin at the bottom left
+        corner of the image
+    depth : np.ndarray
+        (n, 3) vertex depths
+    width, height : int
+        Image size
+
+    Returns:
+    --------
+    (pixels, depths, faces)
+        Flat pixel index, interpolated depth and triangle index of every
+        fragment
+    """
+    scale = 1 << SUBPIXEL_BITS
+    fixed = np.round(screen * scale).astype(np.int64)
+    x, y = fixed[..., 0], fixed[..., 1]
+
+    # Orient all triangles counter-clockwise so that edge functions are
+    # positive inside; drop triangles seen edge-on
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+    flip = area < 0
+    x[flip] = x[flip][:, [0, 2, 1]]
+    y[flip] = y[flip][:, [0, 2, 1]]
+    depth = np.where(flip[:, None], depth[:, [0, 2, 1]], depth)
+    area = np.abs(area)
+
+    # Pixel centres inside the bounding box of each triangle
+    half = scale // 2
+    x_first = np.maximum(0, -((half - x.min(axis=1)) // scale))
+    x_last = np.minimum(width - 1, (x.max(axis=1) - half) // scale)
+    y_first = np.maximum(0, -((half - y.min(axis=1)) // scale))
+    y_last = np.minimum(height - 1, (y.max(axis=1) - half) // scale)
+    box_width = x_last - x_first + 1
+    counts = np.where((area > 0) & (box_width > 0) & (y_last >= y_first),
+                      box_width * (y_last - y_first + 1), 0)
+    faces = np.flatnonzero(counts)
+    if not len(faces):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(0), empty
+
+    # Edge i is opposite vertex i. A pixel centre exactly on an edge belongs
+    # to only one of the two triangles sharing it: the one on the side the
+    # edge's normal points to (top-left rule)
+    edges = []
+    for i in range(3):
+        a, b = (i + 1) % 3, (i + 2) % 3
+        dx = x[:, b] - x[:, a]
+        dy = y[:, b] - y[:, a]
+        bias = np.where((dy < 0) | ((dy == 0) & (dx > 0)), 0, 1)
+        edges.append((x[:, a], y[:, a], dx, dy, bias))
+
+    pixels, depths, fragment_faces = [], [], []
+    ends = np.cumsum(counts[faces])
+    batch_starts = np.searchsorted(ends, np.arange(0, ends[-1], BATCH_PIXELS), side='right')
+    for start, stop in zip(batch_starts, list(batch_starts[1:]) + [len(faces)]):
+        batch = faces[start:stop]
+        batch_counts = counts[batch]
+        face = np.repeat(batch, batch_counts)
+        offsets = np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        local = np.arange(len(face)) - offsets
+        px = x_first[face] + local % box_width[face]
+        py = y_first[face] + local // box_width[face]
+        centre_x = px * scale + half
+        centre_y = py * scale + half
+
+        inside = np.ones(len(face), dtype=bool)
+        weights = []
+        for ax, ay, dx, dy, bias in edges:
+            weight = dx[face] * (centre_y - ay[face]) - dy[face] * (centre_x - ax[face])
+            inside &= weight >= bias[face]
+            weights.append(weight)
+
+        face = face[inside]
+        z = sum(weight[inside] * depth[face, i] for i, weight in enumerate(weights)) / area[face]
+        pixels.append(py[inside] * width + px[inside])
+        depths.append(z)
+        fragment_faces.append(face)
+
+    return np.concatenate(pixels), np.concatenate(depths), np.concatenate(fragment_faces)
+
+
+def composite_opaque(pixels, depths, colors, width, height):
+    """
+    Draw the nearest fragment of every pixel into an RGBA image
+
+    A z-buffer pass without sorting, for opaque surfaces; uncovered pixels
+    are transparent. Takes the same arguments as composite().
+    """
+    size = width * height
+    nearest = np.full(size, -np.inf)
+    np.maximum.at(nearest, pixels, depths)
+    visible = depths == nearest[pixels]
+    rgba = np.zeros((size, 4))
+    rgba[:, :3] = RENDER_STYLE['background']
+    # Of fragments at the same depth, the last one is kept
+    rgba[pixels[visible], :3] = colors[visible]
+    rgba[pixels[visible], 3] = 1.0
+    image = np.round(np.clip(rgba, 0.0, 1.0) * 255).astype(np.uint8)
+    return np.flipud(image.reshape(height, width, 4))
+
+
+def composite(pixels, depths, colors, width, height,
+              profile=RENDER_QUALITY_PROFILES[DEFAULT_QUALITY]):
+    """
+    Blend translucent fragments front to back into an RGBA image
+
+    Every surface layer covering a pixel is blended with the opacity of the
+    quality profile, nearest first, like VTK's depth peeling, up to the
+    profile's max_peels layers; what the layers let through shows the
+    background, which becomes transparent in the alpha channel. Opaque
+    profiles only draw the nearest layer (see composite_opaque).
+
+    Parameters:
+    -----------
+    pixels, depths : np.ndarray
+        Flat pixel index and depth (larger is nearer) of every fragment
+    colors : np.ndarray
+        (n, 3) RGB colour of every fragment
+    profile : dict
+        Render quality profile (see render_stl.RENDER_QUALITY_PROFILES)
+
+    Returns:
+    --------
+    np.ndarray
+        (height, width, 4) uint8 image, top row first
+    """
+    opacity = profile['opacity']
+    if opacity >= 1.0:
+        return composite_opaque(pixels, depths, colors, width, height)
+    max_layers = profile['max_peels'] or None
+    size = width * height
+    if len(pixels):
+        # Sort fragments by pixel, nearest first, with a single float key
+        near, far = depths.max(), depths.min()
+        key = pixels + (near - depths) / ((near - far) * (1.0 + 1e-6) or 1.0)
+        order = np.argsort(key)
+        pixels = pixels[order]
+        colors = colors[order]
+        first = np.concatenate(([True], pixels[1:] != pixels[:-1]))
+        index = np.arange(len(pixels))
+        layer = index - np.maximum.accumulate(np.where(first, index, 0))
+        weight = opacity * (1.0 - opacity) ** layer
+        if max_layers:
+            weight[layer >= max_layers] = 0.0
+        layers = np.bincount(pixels, minlength=size)
+    else:
+        weight = np.zeros(0)
+        layers = np.zeros(size, dtype=np.int64)
+    if max_layers:
+        layers = np.minimum(layers, max_layers)
+
+    transmittance = (1.0 - opacity) ** layers
+    rgba = np.empty((size, 4))
+    for channel in range(3):
+        rgba[:, channel] = (np.bincount(pixels, weight * colors[:, channel], minlength=size)
+                            + transmittance * RENDER_STYLE['background'][channel])
+    rgba[:, 3] = 1.0 - transmittance
+    image = np.round(np.clip(rgba, 0.0, 1.0) * 255).astype(np.uint8)
+    return np.flipud(image.reshape(height, width, 4))
+
+
+class NumpyRenderSession(RenderSession):
+    """
+    Render session that rasterises meshes in NumPy instead of OpenGL
+
+    Same interface and framing as the VTK RenderSession (see
+    render_stl.create_render_session); needs neither VTK nor a display.
+    """
+
+    def open(self):
+        self.image = None
+
+    def close(self):
+        pass
+
+    def load(self, stl_file):
+        """Read an STL file (or its decimated preview, if very large) into an (n, 3, 3) triangle array"""
+        return np.asarray(load_preview_mesh(stl_file).triangles, dtype=np.float64)
+
+    def render_polydata(self, triangles, view=DEFAULT_VIEW):
+        """Render a triangle array into the session's image"""
+        basis = view_basis(view)
+        points = triangles.reshape(-1, 3)
+        if len(points):
+            lo, hi = points.min(axis=0), points.max(axis=0)
+        else:
+            lo = hi = np.zeros(3)
+
+        # vtkRenderer.ResetCamera: centre the bounding box, fit its bounding
+        # sphere to the image height
+        radius = np.sqrt(np.sum((hi - lo) ** 2)) / 2 or 0.5
+        parallel_scale = radius / RENDER_STYLE['camera_zoom']
+        pixels_per_unit = self.height / 2 / parallel_scale
+
+        view_points = (triangles - (lo + hi) / 2) @ basis.T
+        screen = view_points[..., :2] * pixels_per_unit + [self.width / 2, self.height / 2]
+
+        normals = np.cross(view_points[:, 1] - view_points[:, 0], view_points[:, 2] - view_points[:, 0])
+        lengths = np.linalg.norm(normals, axis=1)
+        normals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+        normals *= np.where(normals[:, 2] < 0, -1.0, 1.0)[:, None]
+
+        pixels, depths, faces = rasterize(screen, view_points[..., 2], self.width, self.height)
+        colors = shade_faces(normals, view)[faces]
+        self.image = composite(pixels, depths, colors, self.width, self.height, self.profile)
+
+    def capture(self):
+        """Return the last rendered image"""
+        return self.image
+
+    def write_png(self, images, output_image):
+        """Save one image, or several side by side as a sprite strip, to a PNG file"""
+        Image.fromarray(np.concatenate(images, axis=1), 'RGBA').save(str(output_image))
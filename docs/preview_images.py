@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Optimised, responsive variants of the catalog preview images
+
+Rendered previews are full 8-bit RGBA PNGs with a lot of empty (transparent)
+background. For the catalog pages each one is cropped to the bounding box
+of its opaque pixels and saved as a palette-quantised PNG (the fallback
+image), plus WebP variants at several widths for srcset. Images without
+transparency, such as custom photos, get a JPEG fallback instead.
+
+Variants are cached by the content hash of the source image, so an image
+is only processed again when it actually changed.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from build_trace import span
+from catalog_cache import RenderManifest, load_json, replace_if_changed, save_json
+
+# Bump when the produced variants change, to invalidate the cache
+PREVIEW_VERSION = 2
+
+# Widths of the WebP variants (never wider than the cropped image). A variant
+# at the full width of the image is always added, so the widest one matches
+# the width and sizes the fallback image is shown at.
+PREVIEW_WIDTHS = (200, 400)
+
+# Transparent margin kept around the cropped model (pixels)
+CROP_MARGIN = 4
+
+PALETTE_COLORS = 256
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def preview_settings(widths=PREVIEW_WIDTHS) -> Dict:
+    """Settings that affect the variants, part of their cache key"""
+    return {
+        'version': PREVIEW_VERSION,
+        'widths': list(widths),
+        'margin': CROP_MARGIN,
+        'colors': PALETTE_COLORS,
+        'webp_quality': WEBP_QUALITY,
+        'jpeg_quality': JPEG_QUALITY,
+    }
+
+
+def has_transparency(image: Image.Image) -> bool:
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def crop_to_alpha(image: Image.Image, margin: int = CROP_MARGIN) -> Image.Image:
+    """Crop an RGBA image to its non-transparent pixels plus a margin"""
+    bbox = image.getchannel('A').getbbox()
+    if bbox is None:
+        return image  # Fully transparent, nothing to crop to
+    left, top, right, bottom = bbox
+    return image.crop((max(left - margin, 0), max(top - margin, 0),
+                       min(right + margin, image.width), min(bottom + margin, image.height)))
+
+
+def make_preview_variants(source: Path, output_dir: Path,
+                          widths=PREVIEW_WIDTHS) -> Dict:
+    """
+    Create the optimised fallback image and the WebP variants of a preview image
+
+    Parameters:
+    -----------
+    source : Path
+        Preview image (any format Pillow reads)
+    output_dir : Path
+        Directory for the variants, named after the source image stem
+    widths : Sequence[int]
+        Widths of the WebP variants, in addition to the full image width
+
+    Returns:
+    --------
+    Dict with keys:
+        'image': file name of the fallback image
+        'width', 'height': size of the fallback image
+        'variants': [file name, width] of each WebP variant, narrowest first
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = source.stem
+    with Image.open(source) as image:
+        transparent = has_transparency(image)
+        image = image.convert('RGBA' if transparent else 'RGB')
+    if transparent:
+        image = crop_to_alpha(image)
+        fallback = f"{stem}.png"
+        # Fast octree is the quantizer that supports an alpha channel
+        quantized = image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+        quantized.save(output_dir / fallback, optimize=True)
+    else:
+        fallback = f"{stem}.jpg"
+        image.save(output_dir / fallback, quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    variants = []
+    for width in sorted(set(min(w, image.width) for w in widths) | {image.width}):
+        variant = image
+        if width != image.width:
+            height = max(1, round(image.height * width / image.width))
+            variant = image.resize((width, height), Image.Resampling.LANCZOS)
+        name = f"{stem}-{width}w.webp"
+        variant.save(output_dir / name, quality=WEBP_QUALITY)
+        variants.append([name, width])
+
+    return {'image': fallback, 'width': image.width, 'height': image.height,
+            'variants': variants}
+
+
+class PreviewImageIndex:
+    """
+    Cache of the optimised variants of preview images, keyed by source content
+
+    Variants are created in a staging directory and only replace the
+    published files when their content changed.
+    """
+
+    def __init__(self, cache_file: Path, output_dir: Path, staging_dir: Path,
+                 widths=PREVIEW_WIDTHS):
+        self.cache_file = cache_file
+        self.output_dir = output_dir
+        self.staging_dir = staging_dir
+        self.widths = tuple(widths)
+        self.key_settings = preview_settings(self.widths)
+        self.previews = load_json(cache_file, {})  # source name -> key and variants
+        self.hits = 0
+        self.misses = 0
+
+    def files(self, preview: Dict) -> List[str]:
+        """File names of all variants of a preview"""
+        return [preview['image']] + [name for name, _ in preview['variants']]
+
+    def get(self, source: Path, digest: str) -> Optional[Dict]:
+        """
+        Return the variants of a preview image, creating them if needed
+
+        Parameters:
+        -----------
+        source : Path
+            Preview image
+        digest : str
+            Content digest of source
+
+        Returns:
+        --------
+        Dict (as returned by make_preview_variants), or None if the image
+        could not be processed
+        """
+        key = RenderManifest.render_key(digest, self.key_settings)
+        entry = self.previews.get(source.name)
+        if (entry is not None and entry['key'] == key
+                and all((self.output_dir / name).exists() for name in self.files(entry))):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        try:
+            with span('optimise preview', image=source.name):
+                preview = make_preview_variants(source, self.staging_dir, self.widths)
+        except Exception as e:
+            print(f"Error optimising {source.name}: {e}")
+            return None
+        for name in self.files(preview):
+            replace_if_changed(self.staging_dir / name, self.output_dir / name)
+        preview['key'] = key
+        self.previews[source.name] = preview
+        return preview
+
+    def prune(self, used_files) -> int:
+        """
+        Delete variants that are no longer used
+
+        Returns:
+        --------
+        int
+            Number of deleted files
+        """
+        keep = set(used_files)
+        pruned = 0
+        if self.output_dir.exists():
+            for path in self.output_dir.iterdir():
+                if path.is_file() and path.name not in keep:
+                    path.unlink()
+                    pruned += 1
+        for source, preview in list(self.previews.items()):
+            if not all(name in keep for name in self.files(preview)):
+                del self.previews[source]
+        return pruned
+
+    def save(self) -> None:
+        save_json(self.cache_file, self.previews)
+
+    def summary(self) -> str:
+        return f"{self.hits} cached, {self.misses} optimised"
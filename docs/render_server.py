@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Local preview render server (render_stl.py serve)
+
+Renders STL files to PNG with the catalog's render settings from a process
+that stays up, so a preview costs only the render: Python start-up, the VTK
+import and the OpenGL context are paid once. Rendered PNGs are kept in an
+in-memory LRU cache keyed by the STL content hash, the views and the render
+quality, so a repeated request for an unchanged file is answered without
+rendering.
+
+Requests (HTTP on localhost, or on a Unix socket with --socket):
+
+    GET  /render?path=/path/to/model.stl[&views=iso,front][&quality=draft]
+        Render a file readable by the server
+    POST /render[?views=...][&quality=...]
+        Render the STL file sent as the request body
+    GET  /status
+        Render settings and cache statistics as JSON
+
+The PNG response has an X-Render-Cache header ('hit' or 'miss') and the
+render time in X-Render-Seconds. Requests are handled one at a time on the
+thread that owns the render session.
+
+Only .stl files holding a readable, non-empty mesh are rendered (400 for
+other paths, 422 for invalid meshes). The server reads any file it is
+given a path to, so it listens on a loopback address unless started with
+--allow-remote.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import tempfile
+import ipaddress
+import http.server
+import socketserver
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from catalog_cache import file_digest
+from render_stl import (DEFAULT_BACKEND, DEFAULT_QUALITY, DEFAULT_VIEW, RENDER_BACKENDS,
+                        RENDER_QUALITIES, create_render_session, expand_views, render_settings)
+from stl_loader import BINARY_HEADER_SIZE, BINARY_TRIANGLE_DTYPE, is_binary_stl
+from stl_stream import iter_stl_chunks
+
+# Image size of the catalog previews (see ModelCatalogGenerator.render_kwargs)
+CATALOG_WIDTH = 400
+CATALOG_HEIGHT = 300
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_MB = 256
+DEFAULT_MAX_UPLOAD_MB = 1024
+
+CHUNK_SIZE = 1 << 20
+
+# Largest coordinate (mm) of a rendered mesh; other files read as binary
+# STL give values up to 3e38
+MAX_COORDINATE = 1e9
+
+
+def stl_problem(stl_file: Path) -> Optional[str]:
+    """
+    Check that a file holds a mesh worth rendering, in one pass in bounded memory
+
+    Returns:
+    --------
+    str or None
+        Why the file is not a valid STL mesh, or None if it is
+    """
+    try:
+        if is_binary_stl(stl_file):
+            with open(stl_file, 'rb') as f:
+                header = f.read(BINARY_HEADER_SIZE)
+            if len(header) < BINARY_HEADER_SIZE:
+                return "truncated binary STL header"
+            count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+            if os.path.getsize(stl_file) < BINARY_HEADER_SIZE + count * BINARY_TRIANGLE_DTYPE.itemsize:
+                return f"truncated binary STL ({count:,} triangles declared)"
+        triangles = 0
+        for chunk, _ in iter_stl_chunks(stl_file):
+            if not np.isfinite(chunk).all() or np.abs(chunk).max() > MAX_COORDINATE:
+                return "coordinates out of range, not an STL mesh"
+            triangles += len(chunk)
+    except (OSError, ValueError) as e:
+        return str(e)
+    if not triangles:
+        return "no triangles"
+    return None
+
+
+def is_loopback_host(host: str) -> bool:
+    """Whether a listening address only accepts connections from this machine"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback
+                   for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+
+class PngCache:
+    """
+    In-memory LRU cache of rendered PNG images, bounded by their total size
+
+    Parameters:
+    -----------
+    max_bytes : int
+        Least recently used images are dropped beyond this total size
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # key -> PNG bytes, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        png = self.images.get(key)
+        if png is None:
+            self.misses += 1
+            return None
+        self.images.move_to_end(key)
+        self.hits += 1
+        return png
+
+    def put(self, key, png: bytes) -> None:
+        if len(png) > self.max_bytes:
+            return
+        if key in self.images:
+            self.size -= len(self.images.pop(key))
+        self.images[key] = png
+        self.size += len(png)
+        while self.size > self.max_bytes:
+            _, dropped = self.images.popitem(last=False)
+            self.size -= len(dropped)
+
+    def summary(self) -> dict:
+        return {'images': len(self.images), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class PreviewRenderer:
+    """
+    Render session kept open between requests, with a PNG cache
+
+    Parameters:
+    -----------
+    backend : str
+        Rendering backend, 'vtk' or 'numpy'
+    quality : str
+        Default render quality profile of the requests
+    cache_bytes : int
+        Size limit of the PNG cache
+    """
+
+    def __init__(self, backend: str = DEFAULT_BACKEND, quality: str = DEFAULT_QUALITY,
+                 cache_bytes: int = DEFAULT_CACHE_MB << 20):
+        self.render_kwargs = {'width': CATALOG_WIDTH, 'height': CATALOG_HEIGHT,
+                              'backend': backend}
+        self.quality = quality
+        self.cache = PngCache(cache_bytes)
+        self.session = create_render_session(**self.render_kwargs)
+        self.session.open()
+        self.temp_dir = tempfile.TemporaryDirectory(prefix='render-server-')
+        self.digests = {}  # path -> (size, mtime_ns, sha256)
+        self.valid = set()  # Digests of the files checked by stl_problem()
+
+    def close(self) -> None:
+        self.session.close()
+        self.temp_dir.cleanup()
+
+    def digest(self, stl_file: Path) -> str:
+        """Content digest of a file, remembered while its size and mtime are unchanged"""
+        stat = stl_file.stat()
+        entry = self.digests.get(stl_file)
+        if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            return entry[2]
+        sha256 = file_digest(stl_file)
+        self.digests[stl_file] = (stat.st_size, stat.st_mtime_ns, sha256)
+        return sha256
+
+    def check(self, stl_file: Path, digest: str) -> Optional[str]:
+        """stl_problem() of a file, remembering the files found valid"""
+        if digest in self.valid:
+            return None
+        problem = stl_problem(stl_file)
+        if problem is None:
+            self.valid.add(digest)
+        return problem
+
+    def render(self, stl_file: Path, digest: str, views: Tuple[str, ...],
+               quality: str) -> Tuple[bytes, bool]:
+        """
+        Render an STL file, or take the image from the cache
+
+        Parameters:
+        -----------
+        stl_file : Path
+            The STL file
+        digest : str
+            SHA-256 digest of its content
+        views : Tuple[str, ...]
+            View names (see render_stl.expand_views); several views are
+            rendered side by side into one image
+        quality : str
+            Render quality profile
+
+        Returns:
+        --------
+        (png, cached)
+            The PNG image and whether it came from the cache
+        """
+        key = (digest, views, quality)
+        png = self.cache.get(key)
+        if png is not None:
+            return png, True
+        output = Path(self.temp_dir.name) / 'render.png'
+        self.session.set_quality(quality)
+        self.session.render_views(str(stl_file), [(list(views), output)])
+        png = output.read_bytes()
+        self.cache.put(key, png)
+        return png, False
+
+    def status(self) -> dict:
+        return {
+            'settings': render_settings(**dict(self.render_kwargs, quality=self.quality)),
+            'cache': self.cache.summary(),
+        }
+
+
+class RenderRequestHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP requests of the render server; self.server.renderer is the PreviewRenderer"""
+
+    server_version = 'PlusModelCatalogRender/1.0'
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers=None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data) -> None:
+        self.send_body(status, json.dumps(data, indent=1).encode('utf-8'), 'application/json')
+
+    def send_error_json(self, status: int, message: str) -> None:
+        self.send_json(status, {'error': message})
+
+    def render_options(self, query) -> Tuple[Tuple[str, ...], str]:
+        """Views and quality of a request (ValueError if invalid)"""
+        renderer = self.server.renderer
+        specs = [spec for value in query.get('views', []) for spec in value.split(',') if spec]
+        views = tuple(expand_views(specs)) if specs else (DEFAULT_VIEW,)
+        quality = query.get('quality', [renderer.quality])[-1]
+        if quality not in RENDER_QUALITIES:
+            raise ValueError(f"Unknown render quality '{quality}'")
+        return views, quality
+
+    def send_render(self, stl_file: Path, digest: str, views, quality: str) -> None:
+        start = time.perf_counter()
+        problem = self.server.renderer.check(stl_file, digest)
+        if problem:
+            self.send_error_json(422, f"Not a valid STL mesh: {problem}")
+            return
+        try:
+            png, cached = self.server.renderer.render(stl_file, digest, views, quality)
+        except Exception as e:
+            self.send_error_json(500, f"Error rendering {stl_file.name}: {e}")
+            return
+        self.send_body(200, png, 'image/png', {
+            'X-Render-Cache': 'hit' if cached else 'miss',
+            'X-Render-Seconds': f"{time.perf_counter() - start:.3f}",
+            'ETag': f'"{digest[:32]}"',
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/status':
+            self.send_json(200, self.server.renderer.status())
+            return
+        if url.path != '/render':
+            self.send_error_json(404, f"Unknown path {url.path}")
+            return
+        if 'path' not in query:
+            self.send_error_json(400, "Missing 'path' parameter (or POST the STL file)")
+            return
+        try:
+            views, quality = self.render_options(query)
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+        stl_file = Path(query['path'][-1]).expanduser().resolve()
+        if stl_file.suffix.lower() != '.stl':
+            self.send_error_json(400, f"Not an .stl file: {stl_file.name}")
+            return
+        try:
+            digest = self.server.renderer.digest(stl_file)
+        except OSError as e:
+            self.send_error_json(404, f"Cannot read {stl_file}: {e.strerror}")
+            return
+        self.send_render(stl_file, digest, views, quality)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            self.send_error_json(404, f"Unknown path {url.path}")
+            return
+        try:
+            views, quality = self.render_options(parse_qs(url.query))
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError as e:
+            self.send_error_json(400, str(e) or "Missing Content-Length")
+            return
+        if length > self.server.max_upload_bytes:
+            self.send_error_json(413, f"Upload over {self.server.max_upload_bytes >> 20} MB")
+            return
+
+        # The upload is streamed to a file, hashed on the way
+        renderer = self.server.renderer
+        upload = Path(renderer.temp_dir.name) / 'upload.stl'
+        digest = hashlib.sha256()
+        with open(upload, 'wb') as f:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            self.send_error_json(400, "Incomplete upload")
+            return
+        self.send_render(upload, digest.hexdigest(), views, quality)
+
+
+class RenderHTTPServer(http.server.HTTPServer):
+    """Single-threaded HTTP server, so all renders run on the session's thread"""
+
+    def __init__(self, address, renderer: PreviewRenderer, max_upload_bytes: int):
+        self.renderer = renderer
+        self.max_upload_bytes = max_upload_bytes
+        super().__init__(address, RenderRequestHandler)
+
+
+class UnixRenderServer(socketserver.UnixStreamServer):
+    """The render server on a Unix socket"""
+
+    def __init__(self, socket_path: str, renderer: PreviewRenderer, max_upload_bytes: int):
+        self.renderer = renderer
+        self.max_upload_bytes = max_upload_bytes
+        super().__init__(socket_path, RenderRequestHandler)
+
+
+def serve(renderer: PreviewRenderer, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+          socket_path: str = None, max_upload_bytes: int = DEFAULT_MAX_UPLOAD_MB << 20) -> None:
+    """Serve render requests until interrupted"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixRenderServer(socket_path, renderer, max_upload_bytes)
+        print(f"Render server listening on {socket_path}")
+    else:
+        server = RenderHTTPServer((host, port), renderer, max_upload_bytes)
+        print(f"Render server listening on http://{host}:{server.server_port}/")
+        if not is_loopback_host(host):
+            print(f"Warning: {host} is not a loopback address, other machines can render "
+                  f"(and so read) any .stl file this user can read")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        renderer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='render_stl.py serve',
+        description='Serve STL previews rendered with the catalog settings from a warm renderer')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--allow-remote', action='store_true',
+                       help='Allow a --host that is not a loopback address')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                       help=f'Port to listen on, 0 for any free port (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH',
+                       help='Listen on a Unix socket instead of a TCP port')
+    parser.add_argument('--backend', choices=RENDER_BACKENDS, default=DEFAULT_BACKEND,
+                       help='Rendering backend: vtk (OpenGL) or numpy (no OpenGL needed, default: vtk)')
+    parser.add_argument('--quality', choices=RENDER_QUALITIES, default=DEFAULT_QUALITY,
+                       help=f'Default render quality of the requests (default: {DEFAULT_QUALITY})')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB,
+                       help=f'Size of the in-memory PNG cache in MB (default: {DEFAULT_CACHE_MB})')
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                       help=f'Largest accepted STL upload in MB (default: {DEFAULT_MAX_UPLOAD_MB})')
+    args = parser.parse_args(argv)
+    if not args.socket and not args.allow_remote and not is_loopback_host(args.host):
+        parser.error(f"--host {args.host} is not a loopback address; requests can read any "
+                     f".stl file of this user, add --allow-remote to listen on it anyway")
+
+    renderer = PreviewRenderer(args.backend, args.quality, args.cache_mb << 20)
+    serve(renderer, args.host, args.port, args.socket, args.max_upload_mb << 20)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,20 +2,421 @@
 """
 STL Model Renderer using VTK
 Renders STL files to PNG images for documentation
+
+VTK is imported on first use: the 'numpy' backend (numpy_renderer.py)
+renders without VTK or OpenGL.
 """
 
-import vtk
 import sys
 import os
+import time
+import atexit
 import argparse
 from pathlib import Path
 
+from build_trace import file_size, get_tracer, span, start_tracing, stop_tracing
+from stl_stream import load_preview_mesh, stream_settings
+
+# Bump whenever a rendering change alters the output images, so that cached
+# previews are invalidated
+RENDERER_VERSION = 1
+
+# Appearance of rendered models
+RENDER_STYLE = {
+    'color': (0.8, 0.8, 0.9),  # Light blue-gray
+    'specular': 0.3,
+    'specular_power': 20,
+    'ambient': 0.2,
+    'diffuse': 0.8,
+    'background': (1.0, 1.0, 1.0),  # White background (will be made transparent)
+    'camera_roll': 0,
+    'camera_pitch': -20,
+    'camera_yaw': -20,
+    'camera_zoom': 1.0,
+}
+
+# Render quality profiles: how transparency is drawn, the dominant cost of
+# rendering with VTK.
+# - draft: opaque surfaces and no depth peeling, for fast local and PR builds
+# - final: slightly transparent surfaces blended with depth peeling, for
+#   releases. Each peel blends one more surface layer; behind max_peels
+#   layers at most 0.2 ** 4 of the light is left (less than half an 8-bit
+#   step), so further peels cannot change the image. Peeling also stops
+#   when a pass changes fewer than occlusion_ratio of the pixels.
+RENDER_QUALITY_PROFILES = {
+    'draft': {'opacity': 1.0, 'depth_peeling': False, 'max_peels': 0, 'occlusion_ratio': 0.0},
+    'final': {'opacity': 0.8, 'depth_peeling': True, 'max_peels': 4, 'occlusion_ratio': 0.1},
+}
+RENDER_QUALITIES = tuple(RENDER_QUALITY_PROFILES)
+DEFAULT_QUALITY = 'final'
+
+
+def quality_profile(quality):
+    """Return the settings of a render quality profile (see RENDER_QUALITY_PROFILES)"""
+    try:
+        return RENDER_QUALITY_PROFILES[quality]
+    except KeyError:
+        raise ValueError(f"Unknown render quality '{quality}' "
+                         f"(expected one of: {', '.join(RENDER_QUALITIES)})") from None
+
+
+# Name of the standard catalog preview view (camera angles from RENDER_STYLE)
+DEFAULT_VIEW = 'iso'
+
+# Axis-aligned views: camera direction (from the model towards the camera) and view up
+AXIS_VIEWS = {
+    'front': ((0, 0, 1), (0, 1, 0)),
+    'back': ((0, 0, -1), (0, 1, 0)),
+    'right': ((1, 0, 0), (0, 1, 0)),
+    'left': ((-1, 0, 0), (0, 1, 0)),
+    'top': ((0, 1, 0), (0, 0, -1)),
+    'bottom': ((0, -1, 0), (0, 0, 1)),
+}
+AXIS_VIEWS['side'] = AXIS_VIEWS['right']
+
+# Axis views look straight at flat faces, which the default headlight
+# washes out; they are lit from the upper left of the camera instead
+AXIS_VIEW_LIGHT_POSITION = (-1.0, 1.0, 2.0)
+
+TURNTABLE_PREFIX = 'turntable-'
+
+# Rendering backends: 'vtk' renders with OpenGL (offscreen), 'numpy' with a
+# software rasterizer that needs no OpenGL (see numpy_renderer.py)
+RENDER_BACKENDS = ('vtk', 'numpy')
+DEFAULT_BACKEND = 'vtk'
+
+
+def expand_views(view_specs):
+    """
+    Expand a list of view specifications into view names.
+
+    Parameters:
+    -----------
+    view_specs : list of str
+        View names: 'iso' (the standard preview), 'front', 'back', 'left',
+        'right', 'side', 'top', 'bottom', or 'turntable:N' for N frames
+        rotating around the model starting at the standard preview
+
+    Returns:
+    --------
+    list of str
+        View names accepted by RenderSession, e.g. 'turntable-45'
+    """
+    views = []
+    for spec in view_specs:
+        if spec.startswith('turntable'):
+            _, _, count = spec.partition(':')
+            count = int(count or 8)
+            if count < 1:
+                raise ValueError(f"Invalid turntable frame count in view '{spec}'")
+            views.extend(f"{TURNTABLE_PREFIX}{i * 360.0 / count:g}" for i in range(count))
+        elif spec == DEFAULT_VIEW or spec in AXIS_VIEWS:
+            views.append(spec)
+        else:
+            raise ValueError(f"Unknown view '{spec}'")
+    return views
+
+
+def setup_camera(camera, view=DEFAULT_VIEW):
+    """Orient a fresh vtkCamera for the given view name (before ResetCamera)"""
+    camera.ParallelProjectionOn()
+    if view in AXIS_VIEWS:
+        direction, view_up = AXIS_VIEWS[view]
+        camera.SetFocalPoint(0, 0, 0)
+        camera.SetPosition(*direction)
+        camera.SetViewUp(*view_up)
+        return
+
+    camera.Roll(RENDER_STYLE['camera_roll'])
+    camera.Pitch(RENDER_STYLE['camera_pitch'])
+    camera.Yaw(RENDER_STYLE['camera_yaw'])
+    if view.startswith(TURNTABLE_PREFIX):
+        camera.Azimuth(float(view[len(TURNTABLE_PREFIX):]))
+    elif view != DEFAULT_VIEW:
+        raise ValueError(f"Unknown view '{view}'")
+
+
+def render_settings(width=400, height=300, camera_position=None,
+                    camera_focal_point=None, camera_view_up=None, backend=DEFAULT_BACKEND,
+                    quality=DEFAULT_QUALITY):
+    """
+    Return every setting that affects the image rendered by render_stl_to_image.
+
+    Used to build cache keys for rendered images. Takes the same keyword
+    arguments as render_stl_to_image.
+    """
+    settings = {
+        'renderer_version': RENDERER_VERSION,
+        'width': width,
+        'height': height,
+        'camera_position': camera_position,
+        'camera_focal_point': camera_focal_point,
+        'camera_view_up': camera_view_up,
+        'style': RENDER_STYLE,
+        'quality': quality_profile(quality),
+        'streaming': stream_settings(),
+    }
+    if backend == 'vtk':
+        import vtk
+        settings['vtk_version'] = vtk.vtkVersion.GetVTKVersion()
+    elif backend == 'numpy':
+        from numpy_renderer import NUMPY_RENDERER_VERSION
+        settings['backend'] = backend
+        settings['numpy_renderer_version'] = NUMPY_RENDERER_VERSION
+    else:
+        raise ValueError(f"Unknown render backend '{backend}'")
+    return settings
+
+
+class RenderSession:
+    """
+    Offscreen VTK render pipeline reused for rendering many STL files.
+
+    Creating the render window and its OpenGL context is the most expensive
+    part of rendering a small model, so a session creates the window,
+    renderer, actor, mapper, window-to-image filter and PNG writer once and
+    only swaps in the polydata of each mesh. Images are identical to
+    rendering every file in its own pipeline.
+
+    Use as a context manager:
+
+        with RenderSession(width=400, height=300) as session:
+            for stl_file in stl_files:
+                session.render_file(stl_file, output_image)
+
+    Several views of one mesh can be rendered from a single load with
+    render_views(); extra views only cost rasterisation.
+
+    The render quality profile (see RENDER_QUALITY_PROFILES) can be
+    switched between renders with set_quality(), without a new window.
+
+    Per-file timings (load, render and write, in seconds) are kept in
+    the timings list.
+    """
+
+    def __init__(self, width=400, height=300, camera_position=None,
+                 camera_focal_point=None, camera_view_up=None, quality=DEFAULT_QUALITY):
+        self.width = width
+        self.height = height
+        self.camera_position = camera_position
+        self.camera_focal_point = camera_focal_point
+        self.camera_view_up = camera_view_up
+        self.timings = []
+        self.render_window = None
+        self.set_quality(quality)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Create the render pipeline"""
+        import vtk
+
+        # Create mapper
+        self.mapper = vtk.vtkPolyDataMapper()
+
+        # Create actor
+        self.actor = vtk.vtkActor()
+        self.actor.SetMapper(self.mapper)
+
+        # Set actor properties for better visualization
+        self.actor.GetProperty().SetColor(*RENDER_STYLE['color'])
+        self.actor.GetProperty().SetSpecular(RENDER_STYLE['specular'])
+        self.actor.GetProperty().SetSpecularPower(RENDER_STYLE['specular_power'])
+        self.actor.GetProperty().SetAmbient(RENDER_STYLE['ambient'])
+        self.actor.GetProperty().SetDiffuse(RENDER_STYLE['diffuse'])
+
+        # Create renderer
+        self.renderer = vtk.vtkRenderer()
+        self.renderer.AddActor(self.actor)
+        self.renderer.SetBackground(*RENDER_STYLE['background'])
+
+        # Create render window
+        self.render_window = vtk.vtkRenderWindow()
+        self.render_window.SetOffScreenRendering(1)
+        self.render_window.AddRenderer(self.renderer)
+        self.render_window.SetSize(self.width, self.height)
+        self.render_window.SetAlphaBitPlanes(1)  # Enable alpha channel
+        self.render_window.SetMultiSamples(0)  # Disable multi-sampling for transparency
+
+        # Image capture
+        self.window_to_image = vtk.vtkWindowToImageFilter()
+        self.window_to_image.SetInput(self.render_window)
+        self.window_to_image.SetScale(1)
+        self.window_to_image.SetInputBufferTypeToRGBA()  # Include alpha channel
+        self.window_to_image.ReadFrontBufferOff()
+
+        self.writer = vtk.vtkPNGWriter()
+        self.apply_quality()
+
+    def set_quality(self, quality):
+        """Select the render quality profile of the next renders"""
+        self.profile = quality_profile(quality)
+        self.quality = quality
+        if self.render_window is not None:
+            self.apply_quality()
+
+    def apply_quality(self):
+        """Configure the actor and renderer for the current quality profile"""
+        profile = self.profile
+        self.actor.GetProperty().SetOpacity(profile['opacity'])
+        self.renderer.SetUseDepthPeeling(profile['depth_peeling'])
+        self.renderer.SetMaximumNumberOfPeels(profile['max_peels'])
+        self.renderer.SetOcclusionRatio(profile['occlusion_ratio'])
+
+    def close(self):
+        """Release the render window and its OpenGL context"""
+        if self.render_window is not None:
+            self.render_window.Finalize()
+            self.render_window = None
+
+    def load(self, stl_file):
+        """Read an STL file into vtkPolyData"""
+        # Coincident points need not be merged for rendering: the images are
+        # identical to vtkSTLReader's merged output and loading is much faster.
+        # Very large files are streamed into a decimated preview mesh.
+        return load_preview_mesh(stl_file).to_polydata(merge_points=False)
+
+    def render_polydata(self, polydata, view=DEFAULT_VIEW):
+        """Render a mesh into the session's window"""
+        import vtk
+
+        self.mapper.SetInputData(polydata)
+
+        # Fresh camera for every render, so views do not accumulate rotations
+        camera = vtk.vtkCamera()
+        self.renderer.SetActiveCamera(camera)
+        setup_camera(camera, view)
+
+        # Without explicit lights the renderer creates its default headlight
+        self.renderer.RemoveAllLights()
+        if view in AXIS_VIEWS:
+            light = vtk.vtkLight()
+            light.SetLightTypeToCameraLight()
+            light.SetPosition(*AXIS_VIEW_LIGHT_POSITION)
+            light.SetFocalPoint(0, 0, 0)
+            self.renderer.AddLight(light)
+        self.renderer.ResetCamera()
+        camera.Zoom(RENDER_STYLE['camera_zoom'])
+
+        self.renderer.ResetCameraClippingRange()
+
+        # Render
+        self.render_window.Render()
+
+    def capture(self):
+        """Copy the current window content to a vtkImageData"""
+        import vtk
+
+        self.window_to_image.Modified()
+        self.window_to_image.Update()
+        image = vtk.vtkImageData()
+        image.DeepCopy(self.window_to_image.GetOutput())
+        return image
+
+    def write_png(self, images, output_image):
+        """Save one image, or several side by side as a sprite strip, to a PNG file"""
+        import vtk
+
+        if len(images) == 1:
+            self.writer.SetInputData(images[0])
+        else:
+            append = vtk.vtkImageAppend()
+            append.SetAppendAxis(0)
+            for image in images:
+                append.AddInputData(image)
+            append.Update()
+            self.writer.SetInputData(append.GetOutput())
+        self.writer.SetFileName(str(output_image))
+        self.writer.Write()
+
+    def render_views(self, stl_file, outputs):
+        """
+        Render several views of an STL file from a single load.
+
+        Parameters:
+        -----------
+        stl_file : str
+            Path to input STL file
+        outputs : list
+            List of (views, output_image) tuples. views is a list of view
+            names (see expand_views); one view gives a plain image, several
+            views are written side by side into one sprite strip. Each view
+            is rendered once, even if it appears in several outputs.
+
+        Returns:
+        --------
+        dict
+            Time in seconds spent on 'load', 'render' and 'write'
+        """
+        with span(Path(stl_file).name, 'model', bytes=file_size(stl_file)):
+            start = time.perf_counter()
+            with span('parse', bytes=file_size(stl_file)):
+                polydata = self.load(stl_file)
+            timing = {'load': time.perf_counter() - start, 'render': 0.0, 'write': 0.0}
+
+            frames = {}
+            for views, output_image in outputs:
+                for view in views:
+                    if view not in frames:
+                        start = time.perf_counter()
+                        with span('render', view=view):
+                            self.render_polydata(polydata, view)
+                            frames[view] = self.capture()
+                        timing['render'] += time.perf_counter() - start
+                start = time.perf_counter()
+                with span('write', image=Path(output_image).name) as args:
+                    self.write_png([frames[view] for view in views], output_image)
+                    args['bytes'] = file_size(output_image)
+                timing['write'] += time.perf_counter() - start
+
+        self.timings.append((str(stl_file), timing))
+        written = ", ".join(str(output_image) for _, output_image in outputs)
+        print(f"Rendered {stl_file} -> {written} "
+              f"(load {timing['load']:.2f}s, render {timing['render']:.2f}s, write {timing['write']:.2f}s)")
+        return timing
+
+    def render_file(self, stl_file, output_image, view=DEFAULT_VIEW):
+        """
+        Render an STL file to a PNG image.
+
+        Returns:
+        --------
+        dict
+            Time in seconds spent on 'load', 'render' and 'write'
+        """
+        return self.render_views(stl_file, [([view], output_image)])
+
+
+def create_render_session(backend=DEFAULT_BACKEND, **render_kwargs):
+    """
+    Create a render session for a rendering backend.
+
+    Parameters:
+    -----------
+    backend : str
+        'vtk' (OpenGL) or 'numpy' (software rasterizer, no OpenGL needed)
+    **render_kwargs : dict
+        Arguments passed to the session (width, height, camera settings,
+        quality)
+    """
+    if backend == 'vtk':
+        return RenderSession(**render_kwargs)
+    if backend == 'numpy':
+        from numpy_renderer import NumpyRenderSession
+        return NumpyRenderSession(**render_kwargs)
+    raise ValueError(f"Unknown render backend '{backend}'")
+
 
 def render_stl_to_image(stl_file, output_image, width=400, height=300,
                         camera_position=None, camera_focal_point=None,
-                        camera_view_up=None):
+                        camera_view_up=None, backend=DEFAULT_BACKEND, quality=DEFAULT_QUALITY):
     """
-    Render an STL file to a PNG image using VTK.
+    Render an STL file to a PNG image using VTK (or the NumPy rasterizer).
 
     Parameters:
     -----------
@@ -33,77 +434,140 @@ def render_stl_to_image(stl_file, output_image, width=400, height=300,
         Camera focal point (x, y, z). If None, uses model center.
     camera_view_up : tuple
         Camera up vector (x, y, z)
+    backend : str
+        Rendering backend, 'vtk' or 'numpy'
+    quality : str
+        Render quality profile, 'draft' or 'final' (see RENDER_QUALITY_PROFILES)
     """
 
-    # Read STL file
-    reader = vtk.vtkSTLReader()
-    reader.SetFileName(stl_file)
-    reader.Update()
-
-    # Create mapper
-    mapper = vtk.vtkPolyDataMapper()
-    mapper.SetInputConnection(reader.GetOutputPort())
-
-    # Create actor
-    actor = vtk.vtkActor()
-    actor.SetMapper(mapper)
-
-    # Set actor properties for better visualization
-    actor.GetProperty().SetColor(0.8, 0.8, 0.9)  # Light blue-gray
-    actor.GetProperty().SetOpacity(0.8)  # Slightly transparent
-    actor.GetProperty().SetSpecular(0.3)
-    actor.GetProperty().SetSpecularPower(20)
-    actor.GetProperty().SetAmbient(0.2)
-    actor.GetProperty().SetDiffuse(0.8)
-
-    # Create renderer
-    renderer = vtk.vtkRenderer()
-    renderer.AddActor(actor)
-    renderer.SetBackground(1.0, 1.0, 1.0)  # White background (will be made transparent)
-    renderer.UseDepthPeelingOn()
-    renderer.SetMaximumNumberOfPeels(100)
-    renderer.SetOcclusionRatio(0.1)
-
-    # Create render window
-    render_window = vtk.vtkRenderWindow()
-    render_window.SetOffScreenRendering(1)
-    render_window.AddRenderer(renderer)
-    render_window.SetSize(width, height)
-    render_window.SetAlphaBitPlanes(1)  # Enable alpha channel
-    render_window.SetMultiSamples(0)  # Disable multi-sampling for transparency
-
-    # Setup camera
-    camera = renderer.GetActiveCamera()
-    camera.ParallelProjectionOn()
-    camera.Roll(0)
-    camera.Pitch(-20)
-    camera.Yaw(-20)
-    renderer.ResetCamera()
-    camera.Zoom(1.0)
+    with create_render_session(backend, width=width, height=height,
+                               camera_position=camera_position,
+                               camera_focal_point=camera_focal_point,
+                               camera_view_up=camera_view_up, quality=quality) as session:
+        session.render_file(stl_file, output_image)
 
 
-    renderer.ResetCameraClippingRange()
+# Render sessions of this process, by render settings (see _render_task)
+_sessions = {}
 
-    # Render
-    render_window.Render()
 
-    # Save to image
-    window_to_image = vtk.vtkWindowToImageFilter()
-    window_to_image.SetInput(render_window)
-    window_to_image.SetScale(1)
-    window_to_image.SetInputBufferTypeToRGBA()  # Include alpha channel
-    window_to_image.ReadFrontBufferOff()
-    window_to_image.Update()
+def _close_sessions():
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
 
-    writer = vtk.vtkPNGWriter()
-    writer.SetFileName(output_image)
-    writer.SetInputConnection(window_to_image.GetOutputPort())
-    writer.Write()
 
-    print(f"Rendered {stl_file} -> {output_image}")
+atexit.register(_close_sessions)
 
 
-def batch_render_stls(input_dir, output_dir, file_pattern="*.stl", **render_kwargs):
+def _render_task(task):
+    """
+    Render one (stl_file, output, render_kwargs) task, reusing this process's session.
+
+    output is an output image path, or a list of (views, output_image) tuples
+    as taken by RenderSession.render_views. Tasks that only differ in their
+    render quality share a session.
+    """
+    stl_file, output, render_kwargs = task
+    try:
+        render_kwargs = dict(render_kwargs)
+        quality = render_kwargs.pop('quality', DEFAULT_QUALITY)
+        key = tuple(sorted(render_kwargs.items()))
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = create_render_session(**render_kwargs)
+            session.open()
+        session.set_quality(quality)
+        if isinstance(output, (list, tuple)):
+            session.render_views(stl_file, output)
+        else:
+            session.render_file(stl_file, output)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def _traced_render_task(task):
+    """Run _render_task recording its spans; returns (error, trace events)"""
+    tracer = start_tracing()
+    try:
+        return _render_task(task), tracer.events
+    finally:
+        stop_tracing()
+
+
+def run_render_task(task, traced=False):
+    """
+    Render one (stl_file, output, render_kwargs) task (see render_stl_files)
+
+    Reuses the render session of the calling process or thread; call
+    close_render_sessions() from the same thread when done. traced records
+    the spans in a new tracer and returns them, for worker processes.
+
+    Returns:
+    --------
+    (error, events)
+        Error message (or None on success) and the recorded trace events
+    """
+    if traced:
+        return _traced_render_task(task)
+    return _render_task(task), []
+
+
+def close_render_sessions():
+    """Close the render sessions of this process"""
+    _close_sessions()
+
+
+def render_stl_files(tasks, jobs=1):
+    """
+    Render a list of STL files, optionally spread over a process pool.
+
+    Each worker is a freshly spawned process, so every render gets its own
+    VTK/OpenGL context and no GL state is inherited through fork(). Every
+    process keeps one RenderSession per render settings for all its files.
+
+    Parameters:
+    -----------
+    tasks : list
+        List of (stl_file, output, render_kwargs) tuples, where output is
+        an output image path or a list of (views, output_image) tuples
+        (see RenderSession.render_views)
+    jobs : int
+        Number of worker processes. 1 renders serially in this process,
+        0 or None uses one worker per CPU core.
+
+    Returns:
+    --------
+    list
+        Error message (or None on success) for each task, in task order
+    """
+    if not jobs:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(tasks))
+
+    if jobs <= 1:
+        try:
+            return [_render_task(task) for task in tasks]
+        finally:
+            _close_sessions()
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        tracer = get_tracer()
+        if tracer is None:
+            return list(executor.map(_render_task, tasks))
+        # Spans of the workers are sent back with the results
+        errors = []
+        for error, events in executor.map(_traced_render_task, tasks):
+            tracer.add_events(events)
+            errors.append(error)
+        return errors
+
+
+def batch_render_stls(input_dir, output_dir, file_pattern="*.stl", jobs=1, **render_kwargs):
     """
     Batch render all STL files in a directory.
 
@@ -115,6 +579,8 @@ def batch_render_stls(input_dir, output_dir, file_pattern="*.stl", **render_kwar
         Directory for output PNG files
     file_pattern : str
         Glob pattern for STL files
+    jobs : int
+        Number of parallel render processes (0 = one per CPU core)
     **render_kwargs : dict
         Additional arguments passed to render_stl_to_image
     """
@@ -130,32 +596,53 @@ def batch_render_stls(input_dir, output_dir, file_pattern="*.stl", **render_kwar
 
     print(f"Found {len(stl_files)} STL files to render")
 
-    for stl_file in stl_files:
-        output_file = output_path / f"{stl_file.stem}.png"
-        try:
-            render_stl_to_image(str(stl_file), str(output_file), **render_kwargs)
-        except Exception as e:
-            print(f"Error rendering {stl_file}: {e}")
+    tasks = [(str(stl_file), str(output_path / f"{stl_file.stem}.png"), render_kwargs)
+             for stl_file in stl_files]
+    for stl_file, error in zip(stl_files, render_stl_files(tasks, jobs)):
+        if error:
+            print(f"Error rendering {stl_file}: {error}")
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Render STL files to PNG images using VTK')
+    if sys.argv[1:2] == ['serve']:
+        # Long-lived preview server (see render_server.py)
+        from render_server import main as serve_main
+        return serve_main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(description='Render STL files to PNG images using VTK',
+                                     epilog="Run 'render_stl.py serve --help' for the preview "
+                                            "render server")
     parser.add_argument('input', help='Input STL file or directory')
     parser.add_argument('output', help='Output PNG file or directory')
     parser.add_argument('--width', type=int, default=400, help='Image width (default: 400)')
     parser.add_argument('--height', type=int, default=300, help='Image height (default: 300)')
     parser.add_argument('--batch', action='store_true', help='Batch process directory')
     parser.add_argument('--pattern', default='*.stl', help='File pattern for batch mode (default: *.stl)')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Parallel render processes for batch mode (0 = one per CPU core, default: 1)')
     parser.add_argument('--camera-pos', nargs=3, type=float, metavar=('X', 'Y', 'Z'),
                        help='Camera position')
     parser.add_argument('--camera-focal', nargs=3, type=float, metavar=('X', 'Y', 'Z'),
                        help='Camera focal point')
+    parser.add_argument('--backend', choices=RENDER_BACKENDS, default=DEFAULT_BACKEND,
+                       help='Rendering backend: vtk (OpenGL) or numpy (no OpenGL needed, default: vtk)')
+    parser.add_argument('--quality', choices=RENDER_QUALITIES, default=DEFAULT_QUALITY,
+                       help='Render quality: draft (opaque, fastest) or final (transparent with '
+                            'depth peeling, default: final)')
+    parser.add_argument('--trace', metavar='FILE',
+                       help='Save a trace of the rendering stages in Chrome trace-event format '
+                            '(open in chrome://tracing or ui.perfetto.dev)')
+    parser.add_argument('--views', nargs='+', metavar='VIEW',
+                       help='Views to render side by side into the output image: front, back, left, '
+                            'right, side, top, bottom, iso or turntable:N (default: iso)')
 
     args = parser.parse_args()
 
     render_kwargs = {
         'width': args.width,
         'height': args.height,
+        'backend': args.backend,
+        'quality': args.quality,
     }
 
     if args.camera_pos:
@@ -163,10 +650,19 @@ def main():
     if args.camera_focal:
         render_kwargs['camera_focal_point'] = tuple(args.camera_focal)
 
+    tracer = start_tracing() if args.trace else None
     if args.batch:
-        batch_render_stls(args.input, args.output, args.pattern, **render_kwargs)
+        batch_render_stls(args.input, args.output, args.pattern, args.jobs, **render_kwargs)
+    elif args.views:
+        with create_render_session(**render_kwargs) as session:
+            session.render_views(args.input, [(expand_views(args.views), args.output)])
     else:
         render_stl_to_image(args.input, args.output, **render_kwargs)
+    if tracer is not None:
+        stop_tracing()
+        tracer.save(args.trace)
+        tracer.print_summary()
+        print(f"Trace saved to {args.trace}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+In-memory index of the files in the model repository
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List
+
+# Directories never searched for models
+SKIP_DIRECTORIES = {'.git', '__pycache__', 'venv', '.venv', 'node_modules'}
+
+
+class RepoFileIndex:
+    """
+    Every file and directory below a root directory, from a single scan
+
+    The tree is walked once with os.scandir; lookups by directory,
+    lowercased extension and stem, and existence checks of referenced files,
+    are then answered from memory instead of globbing and stat-ing the
+    filesystem again for every category page.
+
+    Paths are absolute and normalised lexically (like os.path.normpath), so
+    references such as 'Tools/../TrackingFixtures/Stylus.stl' match the
+    indexed path of the file.
+    """
+
+    def __init__(self, root: Path, exclude: List[Path] = ()):
+        self.root = Path(os.path.abspath(root))
+        self.exclude = {Path(os.path.abspath(p)) for p in exclude}
+        self.files_by_directory: Dict[Path, List[Path]] = {}
+        self.subdirectories: Dict[Path, List[Path]] = {}
+        self.by_extension: Dict[str, List[Path]] = {}
+        self.by_stem: Dict[str, List[Path]] = {}
+        self.files = set()
+        self._scan()
+
+    def _scan(self) -> None:
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            files = []
+            subdirectories = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        path = Path(entry.path)
+                        if entry.is_dir():
+                            if entry.name not in SKIP_DIRECTORIES and path not in self.exclude:
+                                subdirectories.append(path)
+                        elif entry.is_file():
+                            files.append(path)
+            except OSError:
+                pass
+            files.sort()
+            subdirectories.sort()
+            self.files_by_directory[directory] = files
+            self.subdirectories[directory] = subdirectories
+            stack.extend(subdirectories)
+            for path in files:
+                self.files.add(path)
+                self.by_extension.setdefault(path.suffix.lower(), []).append(path)
+                self.by_stem.setdefault(path.stem, []).append(path)
+
+    @staticmethod
+    def normalize(path) -> Path:
+        """Absolute, lexically normalised form of a path, as used in the index"""
+        return Path(os.path.normpath(os.path.abspath(path)))
+
+    def exists(self, path) -> bool:
+        """Check whether a file exists (as of the scan)"""
+        return self.normalize(path) in self.files
+
+    def directories(self, directory: Path, recursive: bool = True) -> List[Path]:
+        """Return a directory and (recursively) its subdirectories, if it was indexed"""
+        directory = self.normalize(directory)
+        if directory not in self.subdirectories:
+            return []
+        result = [directory]
+        if recursive:
+            index = 0
+            while index < len(result):
+                result.extend(self.subdirectories[result[index]])
+                index += 1
+        return result
+
+    def find(self, directory: Path, extension: str, recursive: bool = True) -> List[Path]:
+        """
+        Find the files with an extension in a directory
+
+        Parameters:
+        -----------
+        directory : Path
+            Directory to search
+        extension : str
+            File extension including the dot, matched case-insensitively
+        recursive : bool
+            Search subdirectories
+
+        Returns:
+        --------
+        List[Path]
+            Sorted list of matching files
+        """
+        extension = extension.lower()
+        return sorted(path
+                      for subdirectory in self.directories(directory, recursive)
+                      for path in self.files_by_directory[subdirectory]
+                      if path.suffix.lower() == extension)
+
+    def with_extension(self, extension: str) -> List[Path]:
+        """All indexed files with an extension (case-insensitive)"""
+        return list(self.by_extension.get(extension.lower(), []))
+
+    def with_stem(self, stem: str) -> List[Path]:
+        """All indexed files with a given name without extension"""
+        return list(self.by_stem.get(stem, []))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Prebuilt search index of the model catalog
+
+The index is written to _static/search and queried in the browser by
+_static/js/model-search.js. It consists of
+
+- manifest.json: index version and the available shards,
+- documents.json: one small record per model (ID, category, page URL,
+  thumbnail, file types, dimensions) that search results are shown from,
+- one shard per first character of the indexed terms: a prefix trie whose
+  nodes hold the postings (document number, weight) of the term ending
+  there, i.e. the inverted index and the prefix trie in one structure.
+
+The search box only downloads the manifest when it is first used and then
+the shards of the characters actually typed, so the pages do not get any
+heavier, and each lookup is a walk down a trie of a few kilobytes.
+"""
+
+import re
+import json
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+
+from catalog_cache import write_if_changed
+
+SEARCH_INDEX_VERSION = 1
+
+# Weight of a term by the field it appears in
+FIELD_WEIGHTS = {
+    'id': 8,
+    'file_type': 4,
+    'filename': 4,
+    'category': 2,
+    'metric': 2,
+    'description': 1,
+}
+
+# Trie key holding the postings of the term ending at a node (terms only
+# contain [a-z0-9], so it cannot clash with a character key)
+POSTINGS_KEY = '$'
+
+# Fields of the records in documents.json, in this order
+RECORD_FIELDS = ('id', 'category', 'url', 'image', 'description', 'file_types', 'size',
+                 'triangles')
+
+_TERM = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase ASCII alphanumeric terms"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return _TERM.findall(text.lower())
+
+
+def section_anchor(title: str) -> str:
+    """HTML id Sphinx gives a section with this title (as docutils.nodes.make_id)"""
+    anchor = '-'.join(tokenize(title))
+    return re.sub(r'^[-0-9]+|-+$', '', anchor)
+
+
+def search_document(model: Dict, category: str, page_url: str) -> Dict:
+    """
+    Build the search record of a catalog model entry
+
+    Parameters:
+    -----------
+    model : Dict
+        Model entry, as returned by ModelCatalogGenerator.generate_model_entry()
+    category : str
+        Title of the catalog page of the model
+    page_url : str
+        URL of the catalog page relative to the documentation root
+
+    Returns:
+    --------
+    Dict
+        JSON-serialisable record with the fields shown in search results and
+        'terms', the indexed terms and their weights
+    """
+    terms = {}
+
+    def add(text, field):
+        for term in tokenize(text):
+            terms[term] = max(terms.get(term, 0), FIELD_WEIGHTS[field])
+
+    # IDs like 'Stylus_100mm' are indexed whole and by their parts
+    add(model['id'], 'id')
+    whole_id = ''.join(tokenize(model['id']))
+    terms[whole_id] = FIELD_WEIGHTS['id']
+    add(category, 'category')
+    add(model.get('description', ''), 'description')
+
+    file_types = []
+    for download in model.get('downloads', []):
+        add(Path(download['filename']).stem, 'filename')
+        file_type = Path(download['filename']).suffix.lstrip('.').lower()
+        if file_type and file_type not in file_types:
+            file_types.append(file_type)
+            add(file_type, 'file_type')
+
+    size = None
+    stats = model.get('stats')
+    if stats:
+        size = [round(value, 1) for value in stats['size']]
+        # Dimensions can be searched for as e.g. '128mm' (or '128')
+        for value in stats['size']:
+            add(f"{round(value)}mm", 'metric')
+
+    return {
+        'id': model['id'],
+        'category': category,
+        'url': f"{page_url}#{section_anchor(model['id'])}",
+        # Smallest variant of the optimised preview as thumbnail, if there is one
+        'image': (model['preview']['srcset'][0][0] if model.get('preview')
+                  else model['image']).lstrip('/'),
+        'description': model.get('description', ''),
+        'file_types': file_types,
+        'size': size,
+        'triangles': stats['triangles'] if stats else None,
+        'terms': terms,
+    }
+
+
+def build_search_index(documents: List[Dict]) -> Dict[str, Dict]:
+    """
+    Build the index files of a list of search records
+
+    Returns:
+    --------
+    Dict[str, Dict]
+        JSON content of each index file by file name
+    """
+    shards = {}
+    for number, document in enumerate(documents):
+        for term, weight in sorted(document['terms'].items()):
+            node = shards.setdefault(term[0], {})
+            for char in term[1:]:
+                node = node.setdefault(char, {})
+            node.setdefault(POSTINGS_KEY, []).append([number, weight])
+
+    records = [{field: document[field] for field in RECORD_FIELDS} for document in documents]
+    files = {f"shard-{char}.json": trie for char, trie in sorted(shards.items())}
+    files['documents.json'] = records
+    files['manifest.json'] = {
+        'version': SEARCH_INDEX_VERSION,
+        'documents': len(records),
+        'shards': {char: f"shard-{char}.json" for char in sorted(shards)},
+    }
+    return files
+
+
+def write_search_index(documents: List[Dict], output_dir: Path) -> int:
+    """
+    Write the search index of a list of search records, removing stale shards
+
+    Only files whose content changed are written.
+
+    Returns:
+    --------
+    int
+        Number of files written
+    """
+    files = build_search_index(documents)
+    written = 0
+    for name, content in files.items():
+        data = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+        if write_if_changed(output_dir / name, data):
+            written += 1
+    for path in output_dir.glob('shard-*.json'):
+        if path.name not in files:
+            path.unlink()
+    return written
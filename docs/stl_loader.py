@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Fast STL loading with NumPy
+
+Binary STL files are memory-mapped as a structured array without copying,
+ASCII STL files are parsed with a vectorised tokenizer. Meshes convert to
+vtkPolyData without per-vertex Python loops.
+"""
+
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+# Layout of one triangle record in a binary STL file
+BINARY_TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+BINARY_HEADER_SIZE = 84
+
+
+class StlMesh:
+    """
+    Triangle soup loaded from an STL file
+
+    Attributes:
+    -----------
+    triangles : np.ndarray
+        (n, 3, 3) float32 array of triangle vertex coordinates. For binary
+        files this is a read-only view into the memory-mapped file.
+    normals : np.ndarray
+        (n, 3) float32 array of facet normals as stored in the file
+    is_binary : bool
+        True if the file was a binary STL
+    name : str
+        Solid name (ASCII) or header text (binary)
+    """
+
+    def __init__(self, triangles, normals, is_binary, name=""):
+        self.triangles = triangles
+        self.normals = normals
+        self.is_binary = is_binary
+        self.name = name
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.triangles)
+
+    def bounds(self):
+        """Return (xmin, xmax, ymin, ymax, zmin, zmax) like vtkPolyData.GetBounds()"""
+        points = self.triangles.reshape(-1, 3)
+        if not len(points):
+            return (0.0, -1.0, 0.0, -1.0, 0.0, -1.0)
+        lo = points.min(axis=0)
+        hi = points.max(axis=0)
+        return (float(lo[0]), float(hi[0]), float(lo[1]), float(hi[1]), float(lo[2]), float(hi[2]))
+
+    def merged(self):
+        """
+        Weld coincident vertices
+
+        Returns:
+        --------
+        (points, faces)
+            (m, 3) float32 unique points and (n, 3) int64 point indices per triangle
+        """
+        points = np.ascontiguousarray(self.triangles.reshape(-1, 3), dtype=np.float32)
+        if not len(points):
+            return points, np.zeros((0, 3), dtype=np.int64)
+
+        # Group exactly equal coordinates (like vtkSTLReader's point merging)
+        # by a stable sort of a hash of the float bit patterns, so that each
+        # group lists its points in file order
+        bits = points.view(np.uint32).astype(np.uint64)
+        hashes = ((bits[:, 0] * np.uint64(0x9E3779B185EBCA87))
+                  ^ (bits[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F))
+                  ^ (bits[:, 2] * np.uint64(0x165667B19E3779F9)))
+        order = np.argsort(hashes, kind='stable')
+        sorted_bits = bits[order]
+        new_point = np.any(sorted_bits[1:] != sorted_bits[:-1], axis=1)
+        if np.any(new_point & (hashes[order[1:]] == hashes[order[:-1]])):
+            # Hash collision between different points: sort by the coordinates themselves
+            order = np.lexsort((bits[:, 2], bits[:, 1], bits[:, 0]))
+            sorted_bits = bits[order]
+            new_point = np.any(sorted_bits[1:] != sorted_bits[:-1], axis=1)
+        group_start = np.concatenate(([True], new_point))
+        group = np.cumsum(group_start) - 1
+
+        # Number unique points in order of first appearance, as vtkSTLReader does
+        first_index = order[group_start]
+        point_order = np.argsort(first_index, kind='stable')
+        rank = np.empty_like(point_order)
+        rank[point_order] = np.arange(len(point_order))
+
+        point_id = np.empty(len(order), dtype=np.int64)
+        point_id[order] = rank[group]
+        return points[first_index[point_order]], point_id.reshape(-1, 3)
+
+    def to_polydata(self, merge_points: bool = True):
+        """
+        Convert the mesh to vtkPolyData
+
+        Parameters:
+        -----------
+        merge_points : bool
+            Weld coincident vertices and drop triangles that become
+            degenerate, matching vtkSTLReader's default behaviour
+        """
+        import vtk
+        from vtk.util import numpy_support
+
+        if merge_points:
+            points, faces = self.merged()
+            keep = ((faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2])
+                    & (faces[:, 0] != faces[:, 2]))
+            faces = faces[keep]
+        else:
+            points = np.ascontiguousarray(self.triangles.reshape(-1, 3))
+            faces = np.arange(len(points), dtype=np.int64).reshape(-1, 3)
+
+        vtk_points = vtk.vtkPoints()
+        vtk_points.SetData(numpy_support.numpy_to_vtk(np.ascontiguousarray(points, dtype=np.float32),
+                                                      deep=True))
+
+        id_dtype = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+        offsets = np.arange(0, 3 * len(faces) + 1, 3, dtype=id_dtype)
+        connectivity = np.ascontiguousarray(faces.ravel(), dtype=id_dtype)
+        cells = vtk.vtkCellArray()
+        cells.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True))
+
+        polydata = vtk.vtkPolyData()
+        polydata.SetPoints(vtk_points)
+        polydata.SetPolys(cells)
+        return polydata
+
+
+def is_binary_stl(stl_file) -> bool:
+    """
+    Detect whether an STL file is binary
+
+    Many exporters write binary files whose 80-byte header starts with
+    "solid", so the header text alone is not reliable. A file is binary if
+    its size matches the triangle count stored after the header.
+    """
+    size = os.path.getsize(stl_file)
+    with open(stl_file, 'rb') as f:
+        header = f.read(BINARY_HEADER_SIZE)
+    if len(header) == BINARY_HEADER_SIZE:
+        count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+        if size == BINARY_HEADER_SIZE + count * BINARY_TRIANGLE_DTYPE.itemsize:
+            return True
+    return not header.lstrip().lower().startswith(b'solid')
+
+
+def load_binary_stl(stl_file) -> StlMesh:
+    """Memory-map a binary STL file"""
+    with open(stl_file, 'rb') as f:
+        header = f.read(BINARY_HEADER_SIZE)
+    if len(header) < BINARY_HEADER_SIZE:
+        raise ValueError(f"{stl_file}: truncated binary STL header")
+    count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+    available = (os.path.getsize(stl_file) - BINARY_HEADER_SIZE) // BINARY_TRIANGLE_DTYPE.itemsize
+    count = min(count, available)
+
+    if count:
+        records = np.memmap(stl_file, dtype=BINARY_TRIANGLE_DTYPE, mode='r',
+                            offset=BINARY_HEADER_SIZE, shape=(count,))
+    else:
+        records = np.zeros(0, dtype=BINARY_TRIANGLE_DTYPE)
+    name = header[:80].split(b'\0', 1)[0].decode('ascii', 'replace').strip()
+    return StlMesh(records['vertices'], records['normal'], True, name)
+
+
+# Maps every letter except 'e' (exponents) and all whitespace to a space, so
+# that only numbers and the lone 'e's of keywords remain
+ASCII_NUMBER_TABLE = bytes(
+    c if (chr(c) in '0123456789+-.e') else 32
+    for c in range(256)
+)
+
+
+def parse_ascii_stl(data: bytes) -> StlMesh:
+    """
+    Parse the content of an ASCII STL file
+
+    Instead of walking the file line by line, the text is reduced to a plain
+    stream of numbers with a few bulk byte operations: 'solid' lines (whose
+    names may contain digits) are blanked, a translation table turns all
+    keyword letters into spaces and the leftover 'e's of the keywords are
+    removed. NumPy then parses the numbers in one C-level pass, 12 values
+    (normal and three vertices) per facet.
+    """
+    first_line = data.lstrip().split(b'\n', 1)[0].strip()
+    name = first_line[5:].strip() if first_line.lower().startswith(b'solid') else b""
+
+    text = bytearray(b' ')
+    text += data.lower()
+    start = text.find(b'solid')
+    while start >= 0:
+        end = text.find(b'\n', start)
+        end = len(text) if end < 0 else end
+        text[start:end] = b' ' * (end - start)
+        start = text.find(b'solid', end)
+    numbers = bytes(text.translate(ASCII_NUMBER_TABLE)) + b' '
+    # Keyword 'e's are separated by at least one space from the next, so two
+    # passes remove them even when adjacent occurrences overlap
+    numbers = numbers.replace(b' e ', b'   ').replace(b' e ', b'   ')
+
+    values = np.zeros(0, dtype=np.float32)
+    if numbers.strip():
+        try:
+            with warnings.catch_warnings():
+                # Unparseable text is detected by the value count check below
+                warnings.simplefilter('ignore', DeprecationWarning)
+                values = np.fromstring(numbers, dtype=np.float32, sep=' ')
+        except ValueError:
+            values = None
+        if values is None or not len(values) or len(values) % 12:
+            raise ValueError("malformed ASCII STL facet data")
+
+    facets = values.reshape(-1, 12)
+    return StlMesh(facets[:, 3:].reshape(-1, 3, 3), facets[:, :3], False,
+                   name.decode('ascii', 'replace'))
+
+
+def load_ascii_stl(stl_file) -> StlMesh:
+    """Parse an ASCII STL file"""
+    return parse_ascii_stl(Path(stl_file).read_bytes())
+
+
+def load_stl(stl_file) -> StlMesh:
+    """Load a binary or ASCII STL file"""
+    if is_binary_stl(stl_file):
+        return load_binary_stl(stl_file)
+    return load_ascii_stl(stl_file)
+
+
+def write_ascii_stl(mesh: StlMesh, stl_file, name: str = "", number_format: str = '.9g') -> None:
+    """
+    Write a mesh as an ASCII STL file
+
+    number_format is the format spec of the numbers; the default, 9
+    significant digits, round-trips float32 exactly.
+    """
+    rows = np.concatenate([mesh.normals[:, None, :], mesh.triangles], axis=1).reshape(-1, 12)
+    number = "{:" + number_format + "}"
+    facet = (f"facet normal {number} {number} {number}\n outer loop\n"
+             + f"  vertex {number} {number} {number}\n" * 3
+             + " endloop\nendfacet\n")
+    with open(stl_file, 'w', encoding='ascii') as f:
+        f.write(f"solid {name}\n")
+        f.writelines(facet.format(*row) for row in rows.tolist())
+        f.write(f"endsolid {name}\n")
+
+
+def write_binary_stl(mesh: StlMesh, stl_file, header: bytes = b"") -> None:
+    """Write a mesh as a binary STL file"""
+    records = np.zeros(mesh.triangle_count, dtype=BINARY_TRIANGLE_DTYPE)
+    records['normal'] = mesh.normals
+    records['vertices'] = mesh.triangles
+    with open(stl_file, 'wb') as f:
+        f.write(header[:80].ljust(80, b'\0'))
+        f.write(np.uint32(mesh.triangle_count).astype('<u4').tobytes())
+        records.tofile(f)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Streaming, memory-bounded processing of very large STL files
+
+load_stl() maps binary files and reads ASCII files whole, so its memory
+use grows with the file. Above STREAMING_THRESHOLD bytes the catalog
+instead reads STL files in fixed-size chunks of triangles and, in a single
+pass, computes
+
+- the mesh statistics (bounds, size, surface area, volume, triangle count),
+  exactly as mesh_stats.compute_mesh_stats() would on the whole mesh,
+- a decimated preview mesh by out-of-core vertex clustering: vertices are
+  snapped to a uniform grid whose cells are merged (the cell size doubled)
+  whenever the preview would exceed its budget, each cell is represented
+  by the mean of its vertices and triangles collapsing inside one cell are
+  dropped. Facet normals of the preview are recomputed from its vertices.
+
+Memory use is bounded by the chunk size and the preview budget, so peak
+RSS stays about the same however large the input file is.
+"""
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+from stl_loader import (BINARY_HEADER_SIZE, BINARY_TRIANGLE_DTYPE, StlMesh, is_binary_stl,
+                        load_stl, parse_ascii_stl)
+
+# Files larger than this (bytes) are streamed instead of loaded whole
+STREAMING_THRESHOLD = 64 << 20
+
+# Triangles per chunk of a binary file, and bytes per chunk of an ASCII file
+CHUNK_TRIANGLES = 1 << 17
+ASCII_CHUNK_BYTES = 4 << 20
+
+# Preview budget: grid cells (vertices) and triangles of the decimated mesh
+PREVIEW_MAX_CELLS = 1 << 17
+PREVIEW_MAX_TRIANGLES = 1 << 18
+
+# Initial grid: cells per bounding box diagonal of the first chunk
+PREVIEW_GRID = 1024
+
+# Bump when geometry_digest() changes
+FINGERPRINT_VERSION = 3
+
+# Significant decimal digits of the coordinates hashed by geometry_digest():
+# the precision of '%e', the shortest format of common ASCII STL writers
+FINGERPRINT_DIGITS = 7
+
+# Cell coordinates are packed into one int64 key, 21 bits per axis
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+
+def stream_settings() -> Dict:
+    """Settings that affect previews rendered from streamed meshes"""
+    return {
+        'threshold': STREAMING_THRESHOLD,
+        'max_cells': PREVIEW_MAX_CELLS,
+        'max_triangles': PREVIEW_MAX_TRIANGLES,
+        'grid': PREVIEW_GRID,
+    }
+
+
+def iter_stl_chunks(stl_file, chunk_triangles: int = CHUNK_TRIANGLES,
+                    ascii_chunk_bytes: int = ASCII_CHUNK_BYTES) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read an STL file in chunks
+
+    Yields:
+    -------
+    (triangles, normals)
+        (n, 3, 3) float32 vertex coordinates and (n, 3) float32 stored facet
+        normals of the next chunk of triangles
+    """
+    if is_binary_stl(stl_file):
+        with open(stl_file, 'rb') as f:
+            header = f.read(BINARY_HEADER_SIZE)
+            count = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+            buffer = np.empty(chunk_triangles, dtype=BINARY_TRIANGLE_DTYPE)
+            while count > 0:
+                size = f.readinto(memoryview(buffer[:min(count, chunk_triangles)]).cast('B'))
+                n = size // BINARY_TRIANGLE_DTYPE.itemsize
+                if not n:
+                    break  # Truncated file
+                count -= n
+                yield buffer['vertices'][:n].copy(), buffer['normal'][:n].copy()
+        return
+
+    # ASCII: parse whole facets, carrying the text after the last 'endfacet'
+    # over to the next chunk
+    with open(stl_file, 'rb') as f:
+        carry = b''
+        while True:
+            block = f.read(ascii_chunk_bytes)
+            data = carry + block
+            if not block:
+                end = len(data)
+            else:
+                end = data.lower().rfind(b'endfacet')
+                end = -1 if end < 0 else end + len(b'endfacet')
+            if end > 0:
+                mesh = parse_ascii_stl(data[:end])
+                carry = data[end:]
+                if mesh.triangle_count:
+                    yield mesh.triangles, mesh.normals
+            else:
+                carry = data
+            if not block:
+                break
+
+
+def canonical_coordinates(values: np.ndarray) -> np.ndarray:
+    """
+    Round coordinates to FINGERPRINT_DIGITS significant decimal digits
+
+    The result is the float32 value an ASCII file would hold had the
+    coordinates been written with that many digits and read back, so the
+    binary original of an ASCII export and the export itself (or another
+    export with more digits) map to the same values.
+
+    Returns:
+    --------
+    np.ndarray
+        float32 array of the same shape (-0.0 is turned into 0.0)
+    """
+    v = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(v)
+    exponent = np.floor(np.log10(np.where(magnitude > 0, magnitude, 1.0)))
+    # log10() can be off by one next to powers of ten
+    exponent += magnitude >= 10.0 ** (exponent + 1)
+    exponent -= (magnitude > 0) & (magnitude < 10.0 ** exponent)
+    shift = FINGERPRINT_DIGITS - 1 - exponent
+    # Scale by exact powers of ten: float32 values times 10**12 or less are
+    # exact in float64, so the rounding is that of the decimal formatting
+    up = 10.0 ** np.maximum(shift, 0)
+    down = 10.0 ** np.maximum(-shift, 0)
+    rounded = np.rint(v * up / down) / up * down
+    return rounded.astype(np.float32) + np.float32(0)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser of a uint64 array (wrapping arithmetic)"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# Seeds of the two triangle hashes of triangle_hashes()
+HASH_SEEDS = (0x9E3779B97F4A7C15, 0xD6E8FEB86659FD93)
+
+
+def _seeded_triangle_hash(words: np.ndarray, seed: int) -> np.ndarray:
+    """64-bit hash of each triangle from its coordinate bits, for one seed"""
+    seed = np.uint64(seed)
+    vertices = _mix64((words[:, :, 0] | (words[:, :, 1] << np.uint64(32))) ^ seed) \
+        ^ _mix64(words[:, :, 2] + seed)
+    # The smallest hash of the three rotations is the canonical one
+    rotations = [_mix64(_mix64(_mix64(vertices[:, r] ^ seed) ^ vertices[:, (r + 1) % 3])
+                        ^ vertices[:, (r + 2) % 3]) for r in range(3)]
+    return np.minimum(np.minimum(rotations[0], rotations[1]), rotations[2])
+
+
+def triangle_hashes(triangles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Two independent 64-bit hashes of each triangle of a chunk
+
+    Both are computed from the canonical coordinates, each with its own seed
+    (HASH_SEEDS), so a collision of one is not a collision of the other.
+    The hashes depend on the canonical coordinates of the vertices and their
+    cyclic order (the winding), not on which vertex is listed first.
+    """
+    words = canonical_coordinates(triangles).reshape(-1, 3, 3).view(np.uint32).astype(np.uint64)
+    first, second = (_seeded_triangle_hash(words, seed) for seed in HASH_SEEDS)
+    return first, second
+
+
+def geometry_digest(stl_file, chunk_triangles: int = CHUNK_TRIANGLES) -> str:
+    """
+    Fingerprint of the geometry of an STL file
+
+    Unlike the file's content hash, it does not depend on the encoding
+    (ASCII or binary), the solid name, header, stored normals, the order of
+    the triangles or the first vertex of each triangle, only on the set of
+    triangles (with their winding) after rounding the coordinates with
+    canonical_coordinates(). Coordinates that differ by less than the
+    precision of '%e' therefore give the same fingerprint.
+
+    The triangle hashes are summed (modulo 2**64), which does not depend on
+    their order, so the fingerprint is computed in one pass in bounded
+    memory instead of sorting the whole triangle list.
+
+    Returns:
+    --------
+    str
+        SHA-256 hex digest
+    """
+    count = 0
+    sums = np.zeros(2, dtype=np.uint64)
+    for triangles, _ in iter_stl_chunks(stl_file, chunk_triangles):
+        count += len(triangles)
+        sums += np.array([hashes.sum(dtype=np.uint64) for hashes in triangle_hashes(triangles)],
+                         dtype=np.uint64)
+    digest = hashlib.sha256(f"stl-geometry-{FINGERPRINT_VERSION}\n{count}\n".encode('ascii'))
+    digest.update(sums.astype('<u8').tobytes())
+    return digest.hexdigest()
+
+
+def facet_normals(triangles: np.ndarray) -> np.ndarray:
+    """Unit facet normals from the vertex order (zero for degenerate triangles)"""
+    tri = np.asarray(triangles, dtype=np.float64)
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals),
+                     where=lengths > 0).astype(np.float32)
+
+
+class StreamingMeshStats:
+    """Mesh statistics accumulated chunk by chunk (see mesh_stats.compute_mesh_stats)"""
+
+    def __init__(self):
+        self.triangles = 0
+        self.lo = np.full(3, np.inf)
+        self.hi = np.full(3, -np.inf)
+        self.area = 0.0
+        self.signed_volume = 0.0
+
+    def add(self, triangles: np.ndarray) -> None:
+        tri = np.asarray(triangles, dtype=np.float64)
+        if not len(tri):
+            return
+        a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+        cross = np.cross(b - a, c - a)
+        self.area += 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross)).sum()
+        self.signed_volume += np.einsum('ij,ij->i', a, np.cross(b, c)).sum()
+        points = tri.reshape(-1, 3)
+        self.lo = np.minimum(self.lo, points.min(axis=0))
+        self.hi = np.maximum(self.hi, points.max(axis=0))
+        self.triangles += len(tri)
+
+    def result(self) -> Dict:
+        if not self.triangles:
+            return {'triangles': 0, 'bounds': [0.0] * 6, 'size': [0.0] * 3,
+                    'surface_area': 0.0, 'volume': 0.0, 'footprint': [0.0, 0.0]}
+        lo, hi = self.lo, self.hi
+        size = hi - lo
+        return {
+            'triangles': int(self.triangles),
+            'bounds': [float(lo[0]), float(hi[0]), float(lo[1]), float(hi[1]),
+                       float(lo[2]), float(hi[2])],
+            'size': [float(v) for v in size],
+            'surface_area': float(self.area),
+            'volume': float(abs(self.signed_volume) / 6.0),
+            'footprint': [float(size[0]), float(size[1])],
+        }
+
+
+class VertexClusterDecimator:
+    """
+    Out-of-core vertex clustering of a triangle stream into a bounded preview mesh
+
+    Grid cells are identified by packed integer keys. The cells (sum and
+    count of their vertices) and the triangles (as triples of cell keys) are
+    kept in sorted/deduplicated NumPy arrays, so memory is bounded by the
+    budget rather than by the input size.
+    """
+
+    def __init__(self, max_cells: int = PREVIEW_MAX_CELLS,
+                 max_triangles: int = PREVIEW_MAX_TRIANGLES, grid: int = PREVIEW_GRID):
+        self.max_cells = max_cells
+        self.max_triangles = max_triangles
+        self.grid = grid
+        self.cell_size = None
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((0, 3))
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.faces = np.zeros((0, 3), dtype=np.int64)
+
+    @staticmethod
+    def _encode(cells: np.ndarray) -> np.ndarray:
+        cells = cells + _KEY_OFFSET
+        return (cells[..., 0] << (2 * _KEY_BITS)) | (cells[..., 1] << _KEY_BITS) | cells[..., 2]
+
+    @staticmethod
+    def _decode(keys: np.ndarray) -> np.ndarray:
+        cells = np.stack([keys >> (2 * _KEY_BITS), keys >> _KEY_BITS, keys], axis=-1) & _KEY_MASK
+        return cells - _KEY_OFFSET
+
+    def _merge_cells(self, keys, sums, counts) -> None:
+        keys, inverse = np.unique(keys, return_inverse=True)
+        self.keys = keys
+        self.sums = np.stack([np.bincount(inverse, sums[:, axis], len(keys))
+                              for axis in range(3)], axis=1)
+        self.counts = np.bincount(inverse, counts, len(keys)).astype(np.int64)
+
+    def _set_faces(self, faces: np.ndarray) -> None:
+        """Keep the non-degenerate, distinct triangles (orientation preserved)"""
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2])
+                      & (faces[:, 0] != faces[:, 2])]
+        # Rotate each triangle to start at its smallest key, so copies compare equal
+        first = np.argmin(faces, axis=1)
+        faces = faces[np.arange(len(faces))[:, None], (first[:, None] + np.arange(3)) % 3]
+        self.faces = np.unique(faces, axis=0) if len(faces) else faces
+
+    def _coarsen(self) -> None:
+        """Double the cell size, merging each 2x2x2 block of cells"""
+        self.cell_size *= 2
+        self._merge_cells(self._encode(self._decode(self.keys) // 2), self.sums, self.counts)
+        self._set_faces(self._encode(self._decode(self.faces) // 2))
+
+    def add(self, triangles: np.ndarray) -> None:
+        """Cluster a chunk of (n, 3, 3) triangles"""
+        points = np.asarray(triangles, dtype=np.float64).reshape(-1, 3)
+        if not len(points):
+            return
+        if self.cell_size is None:
+            diagonal = np.linalg.norm(points.max(axis=0) - points.min(axis=0))
+            self.cell_size = diagonal / self.grid if diagonal > 0 else 1e-3
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        while np.abs(cells).max() >= _KEY_OFFSET:
+            self._coarsen()  # Keys would overflow, e.g. far from the first chunk
+            cells = np.floor(points / self.cell_size).astype(np.int64)
+        keys = self._encode(cells)
+
+        self._merge_cells(np.concatenate([self.keys, keys]),
+                          np.concatenate([self.sums, points]),
+                          np.concatenate([self.counts, np.ones(len(keys), dtype=np.int64)]))
+        self._set_faces(np.concatenate([self.faces, keys.reshape(-1, 3)]))
+        while len(self.keys) > self.max_cells or len(self.faces) > self.max_triangles:
+            self._coarsen()
+
+    def mesh(self, name: str = "") -> StlMesh:
+        """The decimated mesh"""
+        points = self.sums / np.maximum(self.counts, 1)[:, None]
+        triangles = points[np.searchsorted(self.keys, self.faces)].astype(np.float32)
+        return StlMesh(triangles.reshape(-1, 3, 3), facet_normals(triangles), False, name)
+
+
+def stream_stl(stl_file, chunk_triangles: int = CHUNK_TRIANGLES) -> Tuple[Dict, StlMesh]:
+    """
+    Compute the statistics and a decimated preview of an STL file in one pass
+
+    Returns:
+    --------
+    (stats, preview)
+        Statistics as returned by mesh_stats.compute_mesh_stats() for the
+        full mesh, and the decimated preview mesh
+    """
+    stats = StreamingMeshStats()
+    decimator = VertexClusterDecimator()
+    for triangles, _ in iter_stl_chunks(stl_file, chunk_triangles):
+        stats.add(triangles)
+        decimator.add(triangles)
+    return stats.result(), decimator.mesh(Path(stl_file).stem)
+
+
+def is_large_stl(stl_file, threshold: int = STREAMING_THRESHOLD) -> bool:
+    """Check whether an STL file is processed by streaming"""
+    return os.path.getsize(stl_file) > threshold
+
+
+def load_preview_mesh(stl_file, threshold: int = STREAMING_THRESHOLD) -> StlMesh:
+    """
+    Load an STL file for rendering or export
+
+    Files up to threshold bytes are loaded whole; larger files are streamed
+    into a decimated preview mesh.
+    """
+    if is_large_stl(stl_file, threshold):
+        return stream_stl(stl_file)[1]
+    return load_stl(stl_file)
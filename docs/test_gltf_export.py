@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests of the web model export of empty and invalid STL files (run with pytest)
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gltf_export import build_lods, export_stl_to_glb
+from stl_loader import StlMesh, write_binary_stl
+
+
+def write_mesh(stl_file: Path, triangles) -> Path:
+    triangles = np.asarray(triangles, dtype=np.float32).reshape(-1, 3, 3)
+    write_binary_stl(StlMesh(triangles, np.zeros((len(triangles), 3), np.float32), True),
+                     stl_file)
+    return stl_file
+
+
+def test_empty_mesh_is_not_exported(tmp_path):
+    stl_file = write_mesh(tmp_path / 'empty.stl', [])
+    assert build_lods(np.zeros((0, 3, 3), np.float32)) == []
+    assert export_stl_to_glb(stl_file, tmp_path / 'models') == []
+    assert not list((tmp_path / 'models').glob('*.glb'))
+
+
+def test_collapsed_mesh_is_not_exported(tmp_path):
+    stl_file = write_mesh(tmp_path / 'flat.stl', [[[0, 0, 0], [0, 0, 0], [1, 1, 1]]])
+    assert export_stl_to_glb(stl_file, tmp_path / 'models') == []
+
+
+def test_invalid_stl_raises(tmp_path):
+    stl_file = tmp_path / 'invalid.stl'
+    stl_file.write_bytes(b'solid broken\nfacet normal 0 0 1\nendsolid broken\n')
+    with pytest.raises(ValueError):
+        export_stl_to_glb(stl_file, tmp_path / 'models')
+
+
+def test_page_has_no_viewer_for_unexported_model(tmp_path):
+    from generate_catalog import ModelCatalogGenerator
+    repo_root = tmp_path / 'repo'
+    (repo_root / 'Tools').mkdir(parents=True)
+    write_mesh(repo_root / 'Tools' / 'Empty.stl', [])
+    write_mesh(repo_root / 'Tools' / 'Triangle.stl', [[[0, 0, 0], [10, 0, 0], [0, 10, 0]]])
+
+    generator = ModelCatalogGenerator(repo_root, tmp_path / 'docs', 'https://example.org',
+                                      render_backend='numpy')
+    pages = generator.generate_pages([('Tools', 'tools.md')])
+
+    models = {model['id']: model for model in pages[0]['models']}
+    assert models['Empty']['web_model'] is None
+    assert models['Triangle']['web_model'] is not None
+    assert pages[0]['web_models'] == [models['Triangle']['web_model']]
+    page = (tmp_path / 'docs' / 'catalog' / 'tools.md').read_text(encoding='utf-8')
+    assert page.count('<iframe') == 1